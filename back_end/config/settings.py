@@ -10,15 +10,162 @@ class Settings:
     AZURE_ENDPOINT = "https://aharondecode.cognitiveservices.azure.com/"
     AZURE_ANALYZE_URL = AZURE_ENDPOINT + "vision/v3.2/analyze"
     AZURE_PARAMS = {"visualFeatures": "Description,Tags,Objects"}
+    AZURE_VISION_DEADLINE_SECONDS = float(os.getenv("AZURE_VISION_DEADLINE_SECONDS", "15"))
+    AZURE_VISION_RETRIES = int(os.getenv("AZURE_VISION_RETRIES", "1"))
+    # A hedged analysis is a second paid request, so it is opt-in
+    AZURE_VISION_HEDGING_ENABLED = os.getenv("AZURE_VISION_HEDGING_ENABLED", "false").lower() == "true"
+    AZURE_MAX_CONNECTIONS = int(os.getenv("AZURE_MAX_CONNECTIONS", "20"))
+    # Uploads are downscaled to this longest side and re-encoded as JPEG (0 sends the original bytes)
+    AZURE_MAX_IMAGE_DIMENSION = int(os.getenv("AZURE_MAX_IMAGE_DIMENSION", "1024"))
+    AZURE_JPEG_QUALITY = int(os.getenv("AZURE_JPEG_QUALITY", "85"))
+    
+    # Azure analysis cache: exact sha256, then perceptual 256-bit dHash within the Hamming tolerance (below 16 uses the band index)
+    IMAGE_ANALYSIS_CACHE_ENABLED = os.getenv("IMAGE_ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_ANALYSIS_CACHE_PATH = os.getenv("IMAGE_ANALYSIS_CACHE_PATH", "image_analysis_cache/analysis.sqlite3")
+    IMAGE_ANALYSIS_HAMMING_TOLERANCE = int(os.getenv("IMAGE_ANALYSIS_HAMMING_TOLERANCE", "6"))
+    # A perceptual match also needs this intersection-over-union of the two images' dark pixels
+    IMAGE_ANALYSIS_MIN_INK_OVERLAP = float(os.getenv("IMAGE_ANALYSIS_MIN_INK_OVERLAP", "0.85"))
+    IMAGE_ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("IMAGE_ANALYSIS_CACHE_MEMORY_ENTRIES", "500"))
+    IMAGE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_ANALYSIS_CACHE_MAX_ENTRIES", "50000"))
     
     # OpenRouter Configuration  
     OPENROUTER_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+    LLM_MODEL = os.getenv("LLM_MODEL", "meta-llama/llama-3.1-8b-instruct")
+    
+    # LLM providers, tried in order: "local" (llama.cpp / vLLM OpenAI-compatible server), "openrouter"
+    LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "openrouter")
+    LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:8080/v1")
+    LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama-3.1-8b-instruct")
+    LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "not-needed")
+    # "priority" keeps the configured order; "latency" prefers the fastest healthy provider
+    LLM_ROUTING = os.getenv("LLM_ROUTING", "priority")
+    LLM_LATENCY_EWMA_ALPHA = float(os.getenv("LLM_LATENCY_EWMA_ALPHA", "0.3"))
+    LLM_PROVIDER_FAILURE_THRESHOLD = int(os.getenv("LLM_PROVIDER_FAILURE_THRESHOLD", "3"))
+    LLM_PROVIDER_COOLDOWN_SECONDS = int(os.getenv("LLM_PROVIDER_COOLDOWN_SECONDS", "30"))
+    
+    # LLM HTTP connection pool and per-call timeouts (seconds)
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_GAMES_TIMEOUT = float(os.getenv("LLM_GAMES_TIMEOUT", "45"))
+    LLM_DOMAINS_TIMEOUT = float(os.getenv("LLM_DOMAINS_TIMEOUT", "30"))
+    
+    # Outbound-call resilience: retries within the deadline, hedging after p95, circuit breakers
+    LLM_RETRIES = int(os.getenv("LLM_RETRIES", "1"))
+    LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true"
+    RETRY_BACKOFF_BASE_SECONDS = float(os.getenv("RETRY_BACKOFF_BASE_SECONDS", "0.25"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+    
+    # Outbound LLM rate limits; background calls leave the reserve fraction to interactive ones
+    LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "120"))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+    LLM_BACKGROUND_RESERVE_FRACTION = float(os.getenv("LLM_BACKGROUND_RESERVE_FRACTION", "0.3"))
+    
+    # Concurrent per-tag topic generation in /predict
+    LLM_FANOUT_CONCURRENCY = int(os.getenv("LLM_FANOUT_CONCURRENCY", "5"))
+    LLM_FANOUT_DEADLINE_SECONDS = float(os.getenv("LLM_FANOUT_DEADLINE_SECONDS", "20"))
+    # Ask for all subjects' domains in one structured call instead of one call per tag (fewer prompt
+    # tokens, but slower than the concurrent fan-out); subjects the batch response misses are fanned out
+    LLM_BATCH_DOMAIN_PROMPTS = os.getenv("LLM_BATCH_DOMAIN_PROMPTS", "false").lower() == "true"
+    # Generate spelling/drawing, gallery and quiz as three concurrent smaller calls instead of one.
+    # Off by default: sections are written without seeing each other (the quiz can contradict the
+    # gallery) and the incremental streaming of /generate-games/stream only applies to the single call
+    LLM_SPLIT_GAME_GENERATION = os.getenv("LLM_SPLIT_GAME_GENERATION", "false").lower() == "true"
+    
+    # Local LLM response cache (memory + disk); only validated responses are stored
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1000"))
+    LLM_CACHE_MAX_DISK_MB = int(os.getenv("LLM_CACHE_MAX_DISK_MB", "100"))
     
     # Firebase Configuration
     FIREBASE_CREDENTIALS_PATH = "../../my_project.json"
     FIREBASE_STORAGE_BUCKET = "decode-27a57.firebasestorage.app"
     
+    # In-process tier in front of the prediction_cache collection (known misses are cached too)
+    PREDICTION_CACHE_MEMORY_ENTRIES = int(os.getenv("PREDICTION_CACHE_MEMORY_ENTRIES", "2000"))
+    PREDICTION_CACHE_MEMORY_TTL_SECONDS = int(os.getenv("PREDICTION_CACHE_MEMORY_TTL_SECONDS", "600"))
+    PREDICTION_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv("PREDICTION_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+    # Semantic cache keys: labels within this trigram TF-IDF cosine similarity share a cache entry
+    TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.8"))
+    TOPIC_INDEX_MAX_CANDIDATES = int(os.getenv("TOPIC_INDEX_MAX_CANDIDATES", "50"))
+    # Optional JSON object of extra {"label": "canonical label"} synonyms
+    TOPIC_SYNONYMS_PATH = os.getenv("TOPIC_SYNONYMS_PATH", "")
+    # Write-behind of cache access counts (flushed periodically and on shutdown)
+    ACCESS_FLUSH_INTERVAL_SECONDS = float(os.getenv("ACCESS_FLUSH_INTERVAL_SECONDS", "30"))
+    ACCESS_FLUSH_BATCH_SIZE = int(os.getenv("ACCESS_FLUSH_BATCH_SIZE", "500"))
+    # Incremental cache statistics (sharded counters + top-K); reconcile 0 disables the periodic rebuild
+    CACHE_STATS_SHARDS = int(os.getenv("CACHE_STATS_SHARDS", "10"))
+    CACHE_STATS_TOP_K = int(os.getenv("CACHE_STATS_TOP_K", "20"))
+    CACHE_STATS_RECONCILE_HOURS = float(os.getenv("CACHE_STATS_RECONCILE_HOURS", "24"))
+    # Bulk deletes (cache clearing): documents per page, writes per commit (max 500), commits in flight
+    BULK_DELETE_PAGE_SIZE = int(os.getenv("BULK_DELETE_PAGE_SIZE", "2000"))
+    BULK_DELETE_BATCH_SIZE = int(os.getenv("BULK_DELETE_BATCH_SIZE", "500"))
+    BULK_DELETE_PARALLEL_COMMITS = int(os.getenv("BULK_DELETE_PARALLEL_COMMITS", "4"))
+    # Prediction cache bounds: past the max age (days since last access) entries are dropped, then the
+    # lowest decayed-LFU scores above the max entry count; 0 disables either bound
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "5000"))
+    PREDICTION_CACHE_MAX_AGE_DAYS = float(os.getenv("PREDICTION_CACHE_MAX_AGE_DAYS", "90"))
+    CACHE_LFU_HALF_LIFE_DAYS = float(os.getenv("CACHE_LFU_HALF_LIFE_DAYS", "14"))
+    CACHE_MAINTENANCE_INTERVAL_HOURS = float(os.getenv("CACHE_MAINTENANCE_INTERVAL_HOURS", "6"))
+    # Stored payload per entry: strongest tags and most recent example descriptions kept
+    CACHE_COMPACT_MAX_TAGS = int(os.getenv("CACHE_COMPACT_MAX_TAGS", "5"))
+    CACHE_COMPACT_MAX_DESCRIPTIONS = int(os.getenv("CACHE_COMPACT_MAX_DESCRIPTIONS", "3"))
+    # Local snapshot of the most accessed entries, loaded into the memory tier at startup; snapshots
+    # older than the max age are ignored, interval 0 disables periodic dumps
+    CACHE_SNAPSHOT_ENABLED = os.getenv("CACHE_SNAPSHOT_ENABLED", "true").lower() == "true"
+    CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "cache_snapshot/prediction_cache.sqlite3")
+    CACHE_SNAPSHOT_TOP_N = int(os.getenv("CACHE_SNAPSHOT_TOP_N", "500"))
+    CACHE_SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("CACHE_SNAPSHOT_MAX_AGE_HOURS", "24"))
+    CACHE_SNAPSHOT_INTERVAL_MINUTES = float(os.getenv("CACHE_SNAPSHOT_INTERVAL_MINUTES", "30"))
+    
+    # Single-flight game generation (Firestore lease shared across workers)
+    GENERATION_LEASE_SECONDS = int(os.getenv("GENERATION_LEASE_SECONDS", "180"))
+    GENERATION_LEASE_POLL_SECONDS = float(os.getenv("GENERATION_LEASE_POLL_SECONDS", "2"))
+
+    # Image Generation Configuration
+    # Decode profiles: "full" (SD VAE only), "preview" (tiny VAE previews + full final decode),
+    # "fast" (tiny VAE for previews and the final image)
+    IMAGE_DECODE_PROFILE = os.getenv("IMAGE_DECODE_PROFILE", "full")
+    TINY_VAE_MODEL = os.getenv("TINY_VAE_MODEL", "madebyollin/taesd")
+    PREVIEW_EVERY_N_STEPS = int(os.getenv("PREVIEW_EVERY_N_STEPS", "5"))
+    PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "60"))
+    # Precision modes: "auto" (fp16 on GPU, bf16 on AVX512-BF16/AMX CPUs, else fp32), "fp32", "fp16" (GPU), "bf16", "int8"
+    DIFFUSION_PRECISION = os.getenv("DIFFUSION_PRECISION", "auto")
+
+    # OCR Configuration
+    OCR_ACTIVE_MODEL = os.getenv("OCR_ACTIVE_MODEL", "trocr-base-printed")
+    OCR_MODEL_REGISTRY_PATH = os.getenv("OCR_MODEL_REGISTRY_PATH", "")
+    # Default precision for registry entries that do not set their own
+    OCR_PRECISION = os.getenv("OCR_PRECISION", "fp32")
+    # Shared secret for the X-Admin-Key header on /admin/*; those endpoints refuse requests while unset
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
+    # Model Lifecycle (idle eviction + memory budget); 0 disables the TTL / budget
+    MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+    MODEL_EVICTION_INTERVAL_SECONDS = int(os.getenv("MODEL_EVICTION_INTERVAL_SECONDS", "60"))
+    DIFFUSION_IDLE_TTL_SECONDS = int(os.getenv("DIFFUSION_IDLE_TTL_SECONDS", "900"))
+    OCR_IDLE_TTL_SECONDS = int(os.getenv("OCR_IDLE_TTL_SECONDS", "3600"))
+
+    # Resource Governor (per-engine CPU thread budgets)
+    # Thread counts of 0 mean "whatever cores are left over"; affinity is a CPU list like "0-3,6"
+    RESOURCE_GOVERNOR_ENABLED = os.getenv("RESOURCE_GOVERNOR_ENABLED", "true").lower() == "true"
+    OCR_THREADS = int(os.getenv("OCR_THREADS", "2"))
+    OCR_CPU_AFFINITY = os.getenv("OCR_CPU_AFFINITY", "")
+    DIFFUSION_THREADS = int(os.getenv("DIFFUSION_THREADS", "0"))
+    DIFFUSION_CPU_AFFINITY = os.getenv("DIFFUSION_CPU_AFFINITY", "")
+    IMAGE_ENCODE_THREADS = int(os.getenv("IMAGE_ENCODE_THREADS", "1"))
+    IMAGE_ENCODE_CPU_AFFINITY = os.getenv("IMAGE_ENCODE_CPU_AFFINITY", "")
+    # Engines without an affinity list get disjoint core ranges sized by their thread counts
+    RESOURCE_GOVERNOR_AUTO_AFFINITY = os.getenv("RESOURCE_GOVERNOR_AUTO_AFFINITY", "true").lower() == "true"
+    TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+
     # CORS Origins
     CORS_ORIGINS = [
         "http://localhost:5173", 
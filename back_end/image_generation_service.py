@@ -1,23 +1,42 @@
-from diffusers import StableDiffusionPipeline
+from diffusers import StableDiffusionPipeline, AutoencoderTiny
 import torch
+import gc
 import os
+import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+from config.settings import settings
+from utils.precision import resolve_precision, autocast_context, quantize_linear_int8
+from services.model_lifecycle import model_lifecycle, module_size_bytes
+
+DECODE_PROFILES = ("full", "preview", "fast")
 
 class ImageGenerationService:
     def __init__(self):
         self.pipe = None
+        self.tiny_vae = None
         self.device = self.get_device()
+        self.precision = resolve_precision(settings.DIFFUSION_PRECISION, self.device)
+        self.decode_profile = settings.IMAGE_DECODE_PROFILE if settings.IMAGE_DECODE_PROFILE in DECODE_PROFILES else "full"
+        self.decode_stats = {profile: {"images": 0, "decode_time": 0.0} for profile in DECODE_PROFILES}
         
     def get_device(self):
         return "cuda" if torch.cuda.is_available() else "cpu"
     
+    def set_precision(self, precision: str):
+        """Switch precision mode; the pipeline reloads on next use if the mode changed"""
+        resolved = resolve_precision(precision, self.device)
+        if resolved != self.precision:
+            self.cleanup()
+            self.precision = resolved
+        return self.precision
+    
     def load_pipeline(self):
         """Load the Stable Diffusion pipeline"""
         if self.pipe is not None:
             return
             
-        print(f"Loading Stable Diffusion pipeline on {self.device}...")
+        print(f"Loading Stable Diffusion pipeline on {self.device} ({self.precision})...")
         
         # Clear GPU memory
         if torch.cuda.is_available():
@@ -26,10 +45,15 @@ class ImageGenerationService:
         # Load pipeline (exactly like your fast working code)
         self.pipe = StableDiffusionPipeline.from_pretrained(
             "runwayml/stable-diffusion-v1-5",
-            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            torch_dtype=torch.float16 if self.precision == "fp16" else torch.float32,
             use_safetensors=True
         ).to(self.device)
         
+        # bf16 runs under autocast at call time; int8 quantizes the UNet and text encoder linear layers
+        if self.precision == "int8":
+            self.pipe.unet = quantize_linear_int8(self.pipe.unet)
+            self.pipe.text_encoder = quantize_linear_int8(self.pipe.text_encoder)
+        
         # Enable optimizations for faster generation
         self.pipe.enable_attention_slicing()
         
@@ -45,12 +69,88 @@ class ImageGenerationService:
         
         print("✅ Pipeline loaded successfully")
     
-    def generate_images_from_prompts(self, prompts: List[str], topic: str) -> Dict[str, Any]:
+    def load_tiny_vae(self) -> bool:
+        """Load the tiny autoencoder (TAESD) used for previews and fast final decodes"""
+        if self.tiny_vae is not None:
+            return True
+        
+        try:
+            print(f"Loading tiny VAE ({settings.TINY_VAE_MODEL}) on {self.device}...")
+            self.tiny_vae = AutoencoderTiny.from_pretrained(
+                settings.TINY_VAE_MODEL,
+                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
+            ).to(self.device)
+            print("✅ Tiny VAE loaded successfully")
+            return True
+        except Exception as e:
+            print(f"⚠️ Tiny VAE not available, falling back to full VAE decode: {e}")
+            self.tiny_vae = None
+            return False
+    
+    def decode_latents(self, latents, use_tiny_vae: bool = False):
+        """Decode latents to PIL images with either the full SD VAE or the tiny VAE"""
+        vae = self.tiny_vae if use_tiny_vae else self.pipe.vae
+        with torch.no_grad(), autocast_context(self.precision, self.device):
+            images = vae.decode(latents.to(vae.dtype) / vae.config.scaling_factor, return_dict=False)[0]
+        return self.pipe.image_processor.postprocess(images.float(), output_type="pil")
+    
+    def _build_preview_callback(self, progress_callback: Callable[[Dict[str, Any]], None], total_steps: int):
+        """Build a pipeline step callback that emits tiny-VAE preview frames every few steps"""
+        every_n_steps = max(1, settings.PREVIEW_EVERY_N_STEPS)
+        
+        def on_step_end(pipe, step_index, timestep, callback_kwargs):
+            step = step_index + 1
+            if step % every_n_steps == 0 and step < total_steps:
+                try:
+                    start = time.perf_counter()
+                    previews = self.decode_latents(callback_kwargs["latents"], use_tiny_vae=True)
+                    progress_callback({
+                        "type": "progress",
+                        "step": step,
+                        "total_steps": total_steps,
+                        "previews": previews,
+                        "preview_decode_time": round(time.perf_counter() - start, 4)
+                    })
+                except Exception as e:
+                    print(f"⚠️ Preview decode failed at step {step}: {e}")
+            return callback_kwargs
+        
+        return on_step_end
+    
+    def get_decode_stats(self) -> Dict[str, Any]:
+        """Report average decode time per profile and the savings against the full VAE decode"""
+        report = {}
+        for profile, stats in self.decode_stats.items():
+            images = stats["images"]
+            report[profile] = {
+                "images": images,
+                "avg_decode_time": round(stats["decode_time"] / images, 4) if images else None
+            }
+        
+        full_avg = report["full"]["avg_decode_time"]
+        for profile, stats in report.items():
+            if full_avg and stats["avg_decode_time"] is not None:
+                stats["savings_vs_full"] = round(full_avg - stats["avg_decode_time"], 4)
+                stats["savings_pct"] = round(100 * (1 - stats["avg_decode_time"] / full_avg), 1)
+        
+        return {"active_profile": self.decode_profile, "profiles": report}
+    
+    def generate_images_from_prompts(self, prompts: List[str], topic: str,
+                                     progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                     decode_profile: Optional[str] = None) -> Dict[str, Any]:
         """🚀 OPTIMIZED: Generate images without base64 conversion bottleneck"""
         try:
             # Load pipeline if not already loaded
             self.load_pipeline()
             
+            profile = decode_profile if decode_profile in DECODE_PROFILES else self.decode_profile
+            if progress_callback and profile == "full":
+                # Previews need the tiny VAE; the final decode still uses the full VAE
+                profile = "preview"
+            if profile != "full" and not self.load_tiny_vae():
+                profile = "full"
+            print(f"🖼️ Decode profile: {profile}")
+            
             print(f"Using device: {self.device}")
             print(f"🚀 Generating {len(prompts)} images in batch for topic: {topic}")
             
@@ -66,16 +166,33 @@ class ImageGenerationService:
             
             print("Starting batch generation...")
             
+            num_inference_steps = 25  # Slightly faster than 30
+            step_callback = None
+            if progress_callback and profile != "full":
+                step_callback = self._build_preview_callback(progress_callback, num_inference_steps)
+            
             # 🚀 FAST GENERATION (using your exact working code)
-            outputs = self.pipe(
-                prompt=enhanced_prompts,
-                height=512,
-                width=512,
-                num_inference_steps=25,  # Slightly faster than 30
-                guidance_scale=7.5,
-                negative_prompt=negative_prompts,
-                generator=torch.Generator(self.device).manual_seed(42)  # For reproducibility
-            )
+            # Latents are decoded separately so the decode step can be timed and swapped per profile
+            with autocast_context(self.precision, self.device):
+                outputs = self.pipe(
+                    prompt=enhanced_prompts,
+                    height=512,
+                    width=512,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=7.5,
+                    negative_prompt=negative_prompts,
+                    generator=torch.Generator(self.device).manual_seed(42),  # For reproducibility
+                    output_type="latent",
+                    callback_on_step_end=step_callback,
+                    callback_on_step_end_tensor_inputs=["latents"]
+                )
+            
+            decode_start = time.perf_counter()
+            images = self.decode_latents(outputs.images, use_tiny_vae=(profile == "fast"))
+            decode_time = time.perf_counter() - decode_start
+            self.decode_stats[profile]["images"] += len(images)
+            self.decode_stats[profile]["decode_time"] += decode_time
+            print(f"⏱️ Decoded {len(images)} images in {decode_time:.2f}s ({profile} profile)")
             
             # 🚀 OPTIMIZED: Save files only (NO base64 conversion)
             os.makedirs("generated_images", exist_ok=True)
@@ -85,7 +202,7 @@ class ImageGenerationService:
             saved_files = []
             image_data = []
             
-            for i, image in enumerate(outputs.images):
+            for i, image in enumerate(images):
                 # Save to file (FAST - no base64)
                 filename = f"generated_images/{timestamp}_{topic}_{i}.png"
                 image.save(filename)
@@ -114,7 +231,10 @@ class ImageGenerationService:
                 "images": image_data,
                 "total_generated": len(image_data),
                 "saved_files": saved_files,
-                "performance": "optimized"  # Indicator that this is fast mode
+                "performance": "optimized",  # Indicator that this is fast mode
+                "decode_profile": profile,
+                "precision": self.precision,
+                "decode_time": round(decode_time, 4)
             }
             
         except Exception as e:
@@ -144,13 +264,31 @@ class ImageGenerationService:
             print(f"❌ Error converting image to base64: {e}")
             return ""
     
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by the loaded pipeline and tiny VAE"""
+        if self.pipe is None:
+            return 0
+        return module_size_bytes(self.pipe.unet, self.pipe.vae, self.pipe.text_encoder, self.tiny_vae)
+    
     def cleanup(self):
         """Clean up resources"""
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
         if self.pipe is not None:
             del self.pipe
             self.pipe = None
+        if self.tiny_vae is not None:
+            del self.tiny_vae
+            self.tiny_vae = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
 
 # Global instance
-image_service = ImageGenerationService()
\ No newline at end of file
+image_service = ImageGenerationService()
+model_lifecycle.register(
+    "diffusion",
+    load_fn=image_service.load_pipeline,
+    unload_fn=image_service.cleanup,
+    is_loaded_fn=lambda: image_service.pipe is not None,
+    size_fn=image_service.memory_footprint,
+    idle_ttl=settings.DIFFUSION_IDLE_TTL_SECONDS
+)
\ No newline at end of file
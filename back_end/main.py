@@ -1,13 +1,18 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse  # Add this too
+from fastapi.responses import StreamingResponse
 
 import uvicorn
 
+import asyncio
 import base64
+import json
+import secrets
 from functools import partial
+from typing import Optional
 import uvicorn
 
 # Configuration
@@ -24,11 +29,25 @@ from services.azure_service import azure_service
 from services.llama_service import llama_service
 from services.cache_service import cache_service
 from services.game_service import game_service
+from services.resource_governor import resource_governor
+from services.model_lifecycle import model_lifecycle
+from services.llm_cache import llm_cache
+from services.single_flight import single_flight
+from services.llm_providers import llm_providers
+from services.resilience import resilience_service
+from services.llm_scheduler import llm_scheduler
+from services.image_analysis_cache import image_analysis_cache
+from services.access_aggregator import access_aggregator
+from services.cache_stats import cache_stats_service
+from services.bulk_delete import bulk_delete_service
+from services.topic_index import topic_index
+from services.cache_eviction import cache_eviction_service
+from services.cache_snapshot import cache_snapshot_service
 
 # Models
 from models.schemas import (
     GameGenerationRequest, TopicValidationRequest, GenerateDomainsRequest,
-    ImageUploadRequest, LetterCheckRequest
+    ImageUploadRequest, LetterCheckRequest, OCRModelRegistrationRequest
 )
 
 # Utils
@@ -49,6 +68,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def tag_llm_client(request: Request, call_next):
+    """Attribute outbound LLM calls to the calling client for fair scheduling"""
+    client_id = request.headers.get("X-Client-Id") or (request.client.host if request.client else None)
+    with llm_scheduler.context("interactive", client_id):
+        return await call_next(request)
+
 # app.include_router(images_router)
 
 # ----------------------
@@ -76,6 +102,49 @@ except ImportError:
     OCR_AVAILABLE = False
     print("❌ OCR service not available")
 
+# ----------------------
+# Lifecycle Events
+# ----------------------
+@app.on_event("startup")
+async def report_resource_budgets():
+    """Report per-engine CPU thread budgets at startup"""
+    resource_governor.print_report()
+
+@app.on_event("startup")
+async def start_model_eviction():
+    """Start unloading models that sit idle past their TTL"""
+    model_lifecycle.start()
+
+@app.on_event("startup")
+async def load_cache_snapshot():
+    """Warm the prediction cache memory tier from the local snapshot before serving"""
+    await cache_snapshot_service.load()
+
+@app.on_event("startup")
+async def start_access_flush():
+    """Start writing buffered cache access counts to Firestore and the cache maintenance loops"""
+    access_aggregator.start()
+    cache_stats_service.start()
+    cache_eviction_service.start()
+    cache_snapshot_service.start()
+
+@app.on_event("startup")
+async def load_topic_index():
+    """Index existing cache keys in the background for semantic key lookup"""
+    asyncio.create_task(topic_index.load())
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Stop background tasks, engine worker threads and pooled connections"""
+    await access_aggregator.stop()
+    await cache_stats_service.stop()
+    await cache_eviction_service.stop()
+    await cache_snapshot_service.stop()
+    await model_lifecycle.stop()
+    await llama_service.aclose()
+    await azure_service.aclose()
+    resource_governor.shutdown()
+
 # ----------------------
 # API Endpoints
 # ----------------------
@@ -92,7 +161,9 @@ async def root():
         "storage_working": storage_working,
         "image_generation_available": DIFFUSERS_AVAILABLE,
         "ocr_available": OCR_AVAILABLE,
-        "prediction_cache_stats": cache_stats
+        "resource_governor": resource_governor.report(),
+        "prediction_cache_stats": cache_stats,
+        "image_analysis_cache_stats": image_analysis_cache.get_stats()
     }
 
 @app.post("/predict")
@@ -101,9 +172,19 @@ async def predict_image(file: UploadFile = File(...)):
     try:
         print(f"🔍 Analyzing uploaded image: {file.filename}")
         
-        # Analyze image with Azure
-        azure_result = await azure_service.analyze_image(file)
-        tags, description = azure_service.extract_tags_and_description(azure_result)
+        # Reuse the analysis of this image (or a near duplicate) before paying for Azure
+        image_data = await file.read()
+        image_fingerprint = await image_analysis_cache.fingerprint(image_data)
+        cached_analysis = await image_analysis_cache.lookup(image_fingerprint)
+        
+        if cached_analysis:
+            print(f"🖼️ ✅ Image analysis cache hit ({cached_analysis['match']})")
+            azure_result = cached_analysis["azure_result"]
+            tags, description = cached_analysis["tags"], cached_analysis["description"]
+        else:
+            azure_result = await azure_service.analyze_image_bytes(image_data, file.filename)
+            tags, description = azure_service.extract_tags_and_description(azure_result)
+            await image_analysis_cache.store(image_fingerprint, azure_result, tags, description)
         
         # Get primary label
         primary_label = get_primary_label_from_tags(tags, description)
@@ -125,17 +206,28 @@ async def predict_image(file: UploadFile = File(...)):
             print(f"🎯 ✅ Using cached topics for '{primary_label}' ({len(all_domain_topics)} topics)")
             await cache_service.update_cache_access(primary_label)
                 
-        elif llama_service.client and tags:
+        elif llama_service.available and tags:
             # Generate new topics
             print(f"🧠 Generating NEW topics for '{primary_label}' from {len(tags)} detected tags...")
             
             try:
-                # Generate topics from all significant tags
-                all_domain_topics = await generate_all_domain_topics_from_tags(tags, description)
-                
-                # Generate structured domain response
                 tag_names = [tag["name"] for tag in tags]
-                domain_specific_topics = llama_service.generate_domain_topics(description, tag_names, primary_label)
+                if settings.LLM_BATCH_DOMAIN_PROMPTS:
+                    # One call covers every subject; the primary label is normally the top subject
+                    subjects = get_topic_subjects(tags)
+                    tag_subject_count = len(subjects)
+                    if primary_label not in subjects:
+                        subjects.append(primary_label)
+                    results = await generate_domains_for_subjects(subjects, description, tag_names)
+                    all_domain_topics = merge_domain_topics(results[:tag_subject_count])
+                    domain_specific_topics = results[subjects.index(primary_label)]
+                else:
+                    # Generate topics from all significant tags and the structured domain
+                    # response for the primary label concurrently
+                    all_domain_topics, domain_specific_topics = await asyncio.gather(
+                        generate_all_domain_topics_from_tags(tags, description),
+                        llama_service.generate_domain_topics_async(description, tag_names, primary_label)
+                    )
                 
                 print(f"📚 Generated {len(all_domain_topics)} total topics for '{primary_label}'")
                 
@@ -156,6 +248,7 @@ async def predict_image(file: UploadFile = File(...)):
             "all_related_topics": all_domain_topics,
             "flattened_topics": all_domain_topics,
             "cache_hit": cache_hit,
+            "analysis_cache": cached_analysis["match"] if cached_analysis else None,
             "topic_source": "cache" if cache_hit else "generated"
         }
         
@@ -253,6 +346,26 @@ async def generate_games_endpoint(request: GameGenerationRequest):
             "source": "fallback"
         }
 
+@app.post("/generate-games/stream")
+async def generate_games_stream_endpoint(request: GameGenerationRequest):
+    """Generate games as NDJSON, pushing each game to the client as soon as it is generated"""
+    age_group_id = "2" if request.age_group in ["7-11", "5-10"] else request.age_group
+    
+    print(f"🎮 Streaming games for topic: {request.topic} (age group ID: {age_group_id})")
+    
+    async def event_stream():
+        try:
+            async for event in game_service.stream_games_with_images(
+                request.topic, age_group_id, request.domain, request.tags
+            ):
+                event["age_group_id"] = age_group_id
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(f"❌ Error in generate_games_stream_endpoint: {e}")
+            yield json.dumps({"type": "error", "error": str(e), "age_group_id": age_group_id}) + "\n"
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 @app.get("/images/{topic}/{age_group}/{image_index}")
 async def get_image(topic: str, age_group: str, image_index: int):
     """Get image directly from Firebase with direct Storage URL"""
@@ -299,8 +412,8 @@ async def get_image(topic: str, age_group: str, image_index: int):
 @app.post("/get-related-topics")
 async def get_related_topics(request: GenerateDomainsRequest):
     """Generate domain-specific topics based on the primary label from image analysis"""
-    if not llama_service.client:
-        raise HTTPException(status_code=500, detail="OpenRouter client not available")
+    if not llama_service.available:
+        raise HTTPException(status_code=500, detail="No LLM provider available")
 
     try:
         primary_label = request.primary_label
@@ -316,7 +429,7 @@ async def get_related_topics(request: GenerateDomainsRequest):
         
         print(f"🎯 Generating domain-specific topics for primary subject: {primary_label}")
         
-        generated_data = llama_service.generate_domain_topics(request.description, request.tags, primary_label)
+        generated_data = await llama_service.generate_domain_topics_async(request.description, request.tags, primary_label)
         
         if generated_data and "domains" in generated_data:
             print(f"✅ Successfully generated {len(generated_data['domains'])} domain-specific topics for {primary_label}")
@@ -347,7 +460,10 @@ async def check_letter(request: LetterCheckRequest):
     
     try:
         print(f"🔤 Checking letter: expected '{request.expected_letter}'")
-        result = ocr_service.check_letter_match(request.image, request.expected_letter)
+        result = await resource_governor.run(
+            "ocr", model_lifecycle.call, "ocr",
+            ocr_service.check_letter_match, request.image, request.expected_letter
+        )
         if result["success"]:
             print(f"✅ Letter check result: {result['correct']} - Detected: '{result['detected']}'")
         else:
@@ -363,6 +479,134 @@ async def check_letter(request: LetterCheckRequest):
             "expected": request.expected_letter.upper()
         }
 
+# ----------------------
+# Admin Auth (every /admin/* route depends on this)
+# ----------------------
+def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Reject requests without the ADMIN_API_KEY in the X-Admin-Key header"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled: ADMIN_API_KEY is not set")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+# ----------------------
+# OCR Model Admin Endpoints
+# ----------------------
+@app.get("/admin/ocr-models", dependencies=[Depends(require_admin_key)])
+async def list_ocr_models():
+    """List registered OCR models and which one is serving"""
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="OCR service not available")
+    
+    return {"success": True, "models": ocr_service.list_models()}
+
+@app.post("/admin/ocr-models", dependencies=[Depends(require_admin_key)])
+async def register_ocr_model(request: OCRModelRegistrationRequest):
+    """Register a new OCR model entry, optionally loading and activating it"""
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="OCR service not available")
+    
+    try:
+        from ocr_model_registry import OCRModelEntry
+        entry = OCRModelEntry(**request.dict(exclude={"activate"}))
+        # Redefining the active model loads the new definition and swaps it in
+        await asyncio.to_thread(ocr_service.register_model, entry)
+        print(f"📝 Registered OCR model '{entry.name}' ({entry.path})")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error registering OCR model '{request.name}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if request.activate:
+        return await activate_ocr_model(entry.name)
+    return {"success": True, "model": entry.to_dict()}
+
+@app.post("/admin/ocr-models/{name}/load", dependencies=[Depends(require_admin_key)])
+async def load_ocr_model(name: str):
+    """Load an OCR model in the background without activating it"""
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="OCR service not available")
+    
+    try:
+        # Loading runs outside the OCR engine worker so /check-letter keeps being served
+        bundle = await asyncio.to_thread(ocr_service.load_model, name)
+        return {"success": True, "model": name, "load_time": round(bundle.load_time, 2)}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error loading OCR model '{name}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/ocr-models/{name}/activate", dependencies=[Depends(require_admin_key)])
+async def activate_ocr_model(name: str):
+    """Load (if needed) and atomically swap the serving OCR model"""
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="OCR service not available")
+    
+    try:
+        previous = ocr_service.active.entry.name if ocr_service.active else None
+        await asyncio.to_thread(ocr_service.load_model, name)
+        ocr_service.activate_model(name)
+        return {"success": True, "active_model": name, "previous_model": previous}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error activating OCR model '{name}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/admin/ocr-models/{name}", dependencies=[Depends(require_admin_key)])
+async def unload_ocr_model(name: str):
+    """Unload an inactive OCR model to free memory"""
+    if not OCR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="OCR service not available")
+    
+    try:
+        unloaded = ocr_service.unload_model(name)
+        return {"success": True, "model": name, "unloaded": unloaded}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# ----------------------
+# Model Lifecycle Admin Endpoints
+# ----------------------
+@app.get("/admin/models", dependencies=[Depends(require_admin_key)])
+async def get_model_status():
+    """Get model residency, load counts and load durations"""
+    return {"success": True, **model_lifecycle.status()}
+
+@app.post("/admin/models/{name}/load", dependencies=[Depends(require_admin_key)])
+async def preload_model(name: str):
+    """Load a managed model ahead of its next use"""
+    try:
+        await model_lifecycle.ensure_loaded(name)
+        return {"success": True, "model": name, **model_lifecycle.status()["models"][name]}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.delete("/admin/models/{name}", dependencies=[Depends(require_admin_key)])
+async def unload_managed_model(name: str):
+    """Unload a managed model now if it is idle"""
+    try:
+        unloaded = await model_lifecycle.unload(name)
+        return {"success": True, "model": name, "unloaded": unloaded}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/admin/precision", dependencies=[Depends(require_admin_key)])
+async def get_precision_modes():
+    """Report CPU reduced-precision capabilities and the mode each engine runs in"""
+    if not (OCR_AVAILABLE or DIFFUSERS_AVAILABLE):
+        raise HTTPException(status_code=503, detail="No inference engines available")
+    
+    from utils.precision import detect_cpu_capabilities
+    return {
+        "success": True,
+        "cpu_capabilities": detect_cpu_capabilities(),
+        "ocr_precision": ocr_service.active.precision if OCR_AVAILABLE and ocr_service.active else None,
+        "diffusion_precision": image_service.precision if DIFFUSERS_AVAILABLE else None
+    }
+
 @app.get("/cached-topics/{topic_name}")
 async def get_cached_topics_for_topic(topic_name: str):
     """Get cached topics for a specific topic name"""
@@ -370,17 +614,15 @@ async def get_cached_topics_for_topic(topic_name: str):
         raise HTTPException(status_code=500, detail="Firebase not available")
     
     try:
-        cache_key = await cache_service.create_topic_cache_key(topic_name)
+        cache_key = await cache_service.resolve_cache_key(topic_name)
         if not cache_key:
             raise HTTPException(status_code=400, detail="Invalid topic name")
         
         print(f"🔍 Getting cached topics for: '{topic_name}' (key: '{cache_key}')")
         
-        cache_ref = db.collection("prediction_cache").document(cache_key)
-        cache_doc = cache_ref.get()
+        cached_data = await cache_service.get_cached_prediction(cache_key)
         
-        if cache_doc.exists:
-            cached_data = cache_doc.to_dict()
+        if cached_data:
             await cache_service.update_cache_access(topic_name)
             
             return {
@@ -408,6 +650,7 @@ async def get_cache_stats():
     """Get prediction cache statistics"""
     try:
         stats = await cache_service.get_cache_statistics()
+        stats["snapshot"] = cache_snapshot_service.get_stats()
         return {
             "success": True,
             "cache_statistics": stats,
@@ -417,14 +660,82 @@ async def get_cache_stats():
         print(f"❌ Error getting cache stats: {e}")
         return {"success": False, "error": str(e), "cache_statistics": {}}
 
+@app.post("/cache-stats/rebuild")
+async def rebuild_cache_stats():
+    """Recompute the incremental cache statistics from a full scan of prediction_cache"""
+    if not db:
+        raise HTTPException(status_code=500, detail="Firebase not available")
+    try:
+        return await cache_stats_service.rebuild()
+    except Exception as e:
+        print(f"❌ Error rebuilding cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/cache-maintenance")
+async def run_cache_maintenance():
+    """Evict expired and least-used prediction cache entries and compact oversized ones now (admin endpoint)"""
+    if not db:
+        raise HTTPException(status_code=500, detail="Firebase not available")
+    try:
+        return await cache_eviction_service.run()
+    except Exception as e:
+        print(f"❌ Error running cache maintenance: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/cache-snapshot")
+async def dump_cache_snapshot():
+    """Write the local prediction cache snapshot now (admin endpoint)"""
+    try:
+        return await cache_snapshot_service.dump()
+    except Exception as e:
+        print(f"❌ Error writing cache snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cache-maintenance")
+async def get_cache_maintenance():
+    """Eviction bounds and the report of the last maintenance pass"""
+    return {"success": True, **cache_eviction_service.status()}
+
+@app.get("/llm-token-stats")
+async def get_llm_token_stats():
+    """Get LLM token usage, batched-prompt savings and response cache statistics"""
+    return {
+        "success": True,
+        "token_stats": llama_service.get_token_stats(),
+        "response_cache": llm_cache.stats(),
+        "generation_single_flight": single_flight.status()
+    }
+
+@app.get("/llm-providers")
+async def get_llm_providers():
+    """Provider order, health and latency used for LLM routing"""
+    return {"success": True, **llm_providers.status()}
+
+@app.get("/resilience-metrics")
+async def get_resilience_metrics():
+    """Circuit breaker state, retries, hedges and latency per outbound dependency"""
+    return {
+        "success": True,
+        "dependencies": resilience_service.get_metrics(),
+        "azure_uploads": azure_service.get_upload_stats()
+    }
+
+@app.get("/llm-scheduler")
+async def get_llm_scheduler():
+    """Rate-limit bucket levels, queue depth and wait times per priority class"""
+    return {"success": True, **llm_scheduler.status()}
+
 @app.delete("/clear-cache")
-async def clear_prediction_cache():
-    """Clear all prediction cache (admin endpoint)"""
+async def clear_prediction_cache(prefix: Optional[str] = None, older_than_days: Optional[float] = None):
+    """Clear the prediction cache, or the entries matching a key prefix / older than N days (admin endpoint).
+
+    Runs as a background job; poll /clear-cache/jobs/{job_id} for progress.
+    """
     if not db:
         raise HTTPException(status_code=500, detail="Firebase not available")
     
     try:
-        result = await cache_service.clear_cache()
+        result = await cache_service.clear_cache(prefix, older_than_days)
         if result["success"]:
             return result
         else:
@@ -433,6 +744,19 @@ async def clear_prediction_cache():
         print(f"❌ Error clearing cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/clear-cache/jobs")
+async def list_clear_cache_jobs():
+    """Progress of all bulk delete jobs"""
+    return {"success": True, "jobs": bulk_delete_service.list_jobs()}
+
+@app.get("/clear-cache/jobs/{job_id}")
+async def get_clear_cache_job(job_id: str):
+    """Progress of one bulk delete job"""
+    job = bulk_delete_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {"success": True, **job.to_dict()}
+
 @app.post("/upload/")
 async def upload_drawing(request: ImageUploadRequest):
     """Upload drawing"""
@@ -481,7 +805,7 @@ async def get_image_as_base64_endpoint(filename: str):
         from image_generation_service import image_service
         
         file_path = os.path.join("generated_images", filename)
-        base64_data = image_service.get_image_as_base64(file_path)
+        base64_data = await resource_governor.run("image", image_service.get_image_as_base64, file_path)
         
         if not base64_data:
             raise HTTPException(status_code=404, detail="Image not found")
@@ -491,40 +815,71 @@ async def get_image_as_base64_endpoint(filename: str):
         print(f"❌ Error converting image to base64: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/image-generation/decode-stats")
+async def get_decode_stats():
+    """Get per-profile VAE decode timings and savings versus the full decode"""
+    if not DIFFUSERS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image generation service not available")
+
+    return {"success": True, "decode_stats": image_service.get_decode_stats()}
+
 
 # ----------------------
 # Helper Functions for Complex Operations
 # ----------------------
-async def generate_all_domain_topics_from_tags(tags, description):
-    """Generate domain-specific topics for ALL detected tags"""
-    if not tags or not llama_service.client:
-        return []
-    
-    all_topics = []
-    processed_subjects = set()
-    
-    # Get top 5 most confident tags
+def get_topic_subjects(tags):
+    """Pick the distinct subjects of the top 5 most confident tags"""
     sorted_tags = sorted(tags, key=lambda x: x.get("confidence", 0), reverse=True)[:5]
     
+    subjects = []
     for tag in sorted_tags:
         subject = tag.get("name", "").title()
-        if subject and subject not in processed_subjects and len(subject) > 2:
-            processed_subjects.add(subject)
-            
+        if subject and subject not in subjects and len(subject) > 2:
+            subjects.append(subject)
+            print(f"🎯 Generating topics for subject: {subject} (confidence: {tag.get('confidence', 0)}%)")
+    return subjects
+
+async def generate_domains_for_subjects(subjects, description, tags=None):
+    """Generate domain data per subject, in subject order"""
+    if settings.LLM_BATCH_DOMAIN_PROMPTS:
+        domains_by_subject = await llama_service.generate_domain_topics_batch_async(description, subjects, tags)
+        missing = [subject for subject in subjects if subject not in domains_by_subject]
+        if missing:
+            # A malformed batch response only costs the subjects it dropped, retried one call each
+            print(f"🔁 Batched response missed {', '.join(missing)}, generating them individually")
+            domains_by_subject.update(zip(missing, await fan_out_domain_topics(missing, description)))
+        return [domains_by_subject.get(subject) for subject in subjects]
+    
+    return await fan_out_domain_topics(subjects, description)
+
+async def fan_out_domain_topics(subjects, description):
+    """Fan out one call per subject, bounded in concurrency and each capped by the deadline"""
+    semaphore = asyncio.Semaphore(settings.LLM_FANOUT_CONCURRENCY)
+    
+    async def generate_for_subject(subject):
+        async with semaphore:
             try:
-                print(f"🎯 Generating topics for subject: {subject} (confidence: {tag.get('confidence', 0)}%)")
-                
-                domain_data = llama_service.generate_domain_topics(description, [subject], subject)
-                
-                if domain_data and "domains" in domain_data:
-                    for domain in domain_data["domains"]:
-                        domain_topics = domain.get("topics", [])
-                        all_topics.extend(domain_topics)
-                        print(f"  📚 {domain['domain']}: {', '.join(domain_topics)}")
-                
+                return await asyncio.wait_for(
+                    llama_service.generate_domain_topics_async(description, [subject], subject),
+                    timeout=settings.LLM_FANOUT_DEADLINE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                print(f"⏱️ Topic generation for {subject} exceeded {settings.LLM_FANOUT_DEADLINE_SECONDS}s, skipping")
             except Exception as e:
                 print(f"❌ Failed to generate topics for {subject}: {e}")
-                continue
+            return None
+    
+    return await asyncio.gather(*(generate_for_subject(subject) for subject in subjects))
+
+def merge_domain_topics(results):
+    """Flatten per-subject domain data into unique topics, keeping subject (confidence) order"""
+    all_topics = []
+    for domain_data in results:
+        if domain_data and "domains" in domain_data:
+            for domain in domain_data["domains"]:
+                domain_topics = domain.get("topics", [])
+                all_topics.extend(domain_topics)
+                print(f"  📚 {domain.get('domain', 'Unknown')}: {', '.join(domain_topics)}")
     
     # Remove duplicates while preserving order
     unique_topics = []
@@ -533,8 +888,17 @@ async def generate_all_domain_topics_from_tags(tags, description):
         if topic not in seen:
             unique_topics.append(topic)
             seen.add(topic)
+    return unique_topics
+
+async def generate_all_domain_topics_from_tags(tags, description):
+    """Generate domain-specific topics for ALL detected tags"""
+    if not tags or not llama_service.available:
+        return []
+    
+    subjects = get_topic_subjects(tags)
+    unique_topics = merge_domain_topics(await generate_domains_for_subjects(subjects, description))
     
-    print(f"✅ Generated {len(unique_topics)} unique topics from {len(processed_subjects)} subjects")
+    print(f"✅ Generated {len(unique_topics)} unique topics from {len(subjects)} subjects")
     return unique_topics
 
 if __name__ == "__main__":
@@ -37,4 +37,13 @@ class PredictionResponse(BaseModel):
     primary_label: Optional[str]
     all_related_topics: List[str]
     cache_hit: bool
-    topic_source: str
\ No newline at end of file
+    topic_source: str
+
+class OCRModelRegistrationRequest(BaseModel):
+    name: str
+    path: str
+    backend: str = "trocr"
+    precision: str = ""
+    preprocessing: str = "binarize"
+    description: str = ""
+    activate: bool = False
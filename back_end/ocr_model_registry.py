@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, asdict
+from functools import partial
+from typing import Dict, List, Optional
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+SUPPORTED_BACKENDS = ("trocr",)
+SUPPORTED_PRECISIONS = ("", "auto", "fp32", "fp16", "bf16", "int8")
+PREPROCESSING_VARIANTS = ("binarize", "grayscale", "none")
+
+@dataclass
+class OCRModelEntry:
+    name: str
+    path: str
+    backend: str = "trocr"
+    precision: str = ""  # empty = settings.OCR_PRECISION
+    preprocessing: str = "binarize"
+    description: str = ""
+
+    def validate(self):
+        """Reject entries the OCR service cannot run"""
+        if self.backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unsupported OCR backend '{self.backend}' (supported: {', '.join(SUPPORTED_BACKENDS)})")
+        if self.precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"Unsupported precision '{self.precision}' (supported: {', '.join(filter(None, SUPPORTED_PRECISIONS))})")
+        if self.preprocessing not in PREPROCESSING_VARIANTS:
+            raise ValueError(f"Unknown preprocessing variant '{self.preprocessing}' (supported: {', '.join(PREPROCESSING_VARIANTS)})")
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+DEFAULT_ENTRIES = [
+    OCRModelEntry(
+        name="trocr-base-printed",
+        path="microsoft/trocr-base-printed",
+        description="Printed-text TrOCR (original default)"
+    ),
+    OCRModelEntry(
+        name="trocr-small-handwritten",
+        path="microsoft/trocr-small-handwritten",
+        preprocessing="grayscale",
+        description="Small handwritten TrOCR, fastest handwriting model"
+    ),
+    OCRModelEntry(
+        name="trocr-base-handwritten",
+        path="microsoft/trocr-base-handwritten",
+        preprocessing="grayscale",
+        description="Base handwritten TrOCR"
+    ),
+]
+
+class OCRModelRegistry:
+    """Named OCR model entries, seeded with defaults and optionally extended from a JSON file"""
+
+    def __init__(self):
+        self._entries: Dict[str, OCRModelEntry] = {}
+        self._lock = threading.Lock()
+        for entry in DEFAULT_ENTRIES:
+            self.register(entry)
+        if settings.OCR_MODEL_REGISTRY_PATH:
+            self.load_file(settings.OCR_MODEL_REGISTRY_PATH)
+
+    def load_file(self, path: str):
+        """Register entries from a JSON list of {name, path, backend, precision, preprocessing}"""
+        if not os.path.exists(path):
+            print(f"⚠️ OCR model registry file not found: {path}")
+            return
+
+        try:
+            with open(path) as f:
+                for raw_entry in json.load(f):
+                    self.register(OCRModelEntry(**raw_entry))
+            print(f"✅ Loaded OCR model registry from {path}")
+        except Exception as e:
+            print(f"❌ Could not load OCR model registry {path}: {e}")
+
+    def register(self, entry: OCRModelEntry):
+        """Add or replace a registry entry"""
+        entry.validate()
+        with self._lock:
+            self._entries[entry.name] = entry
+
+    def get(self, name: str) -> Optional[OCRModelEntry]:
+        return self._entries.get(name)
+
+    def list(self) -> List[OCRModelEntry]:
+        return list(self._entries.values())
+
+# Create global instance
+ocr_model_registry = OCRModelRegistry()
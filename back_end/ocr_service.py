@@ -2,32 +2,172 @@ import torch
 from PIL import Image
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 import base64
+import gc
 import io
+import threading
+import time
 import numpy as np
 import cv2
+from typing import Dict, List, Optional
+from config.settings import settings
+from ocr_model_registry import ocr_model_registry, OCRModelEntry
+from utils.precision import resolve_precision, autocast_context, quantize_linear_int8
+from services.model_lifecycle import model_lifecycle, module_size_bytes
+
+class LoadedOCRModel:
+    """A registry entry together with its loaded processor and model"""
+    def __init__(self, entry: OCRModelEntry, processor, model, device: str, precision: str, load_time: float):
+        self.entry = entry
+        self.processor = processor
+        self.model = model
+        self.device = device
+        self.precision = precision
+        self.load_time = load_time
+        # Requests currently running inference; unload refuses while any are in flight
+        self.in_flight = 0
 
 class OCRService:
     def __init__(self):
-        print("🔄 Loading TrOCR model...")
+        self.registry = ocr_model_registry
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.loaded: Dict[str, LoadedOCRModel] = {}
+        self.active: Optional[LoadedOCRModel] = None
+        self.active_name = settings.OCR_ACTIVE_MODEL
+        self._load_lock = threading.Lock()
+        # Short-held guard for the loaded dict and in-flight counts; _load_lock is held for whole loads
+        self._bundle_lock = threading.Lock()
+        
         try:
+            self.activate_model(settings.OCR_ACTIVE_MODEL)
+        except Exception as e:
+            print(f"❌ Error loading TrOCR model: {e}")
+            self.active = None
+    
+    @property
+    def processor(self):
+        return self.active.processor if self.active else None
+    
+    @property
+    def model(self):
+        return self.active.model if self.active else None
+    
+    def load_model(self, name: str) -> LoadedOCRModel:
+        """Load a registry entry (once) without changing the active model"""
+        entry = self.registry.get(name)
+        if entry is None:
+            raise ValueError(f"Unknown OCR model: {name}")
+        
+        with self._load_lock:
+            bundle = self.loaded.get(name)
+            if bundle is not None:
+                return bundle
+            
+            print(f"🔄 Loading OCR model '{name}' ({entry.path})...")
+            start = time.perf_counter()
+            
             # Load processor & model
-            self.processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-printed")
-            self.model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-printed")
+            processor = TrOCRProcessor.from_pretrained(entry.path)
+            model = VisionEncoderDecoderModel.from_pretrained(entry.path)
+            model.eval()
+            
+            # bf16 keeps fp32 weights and runs under autocast; int8 quantizes the linear layers
+            precision = resolve_precision(entry.precision or settings.OCR_PRECISION, self.device)
+            if precision == "fp16":
+                model = model.half()
+            elif precision == "int8":
+                model = quantize_linear_int8(model)
             
             # Move to GPU if available
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
-            print(f"✅ TrOCR model loaded successfully on {self.device}")
+            model.to(self.device)
             
-        except Exception as e:
-            print(f"❌ Error loading TrOCR model: {e}")
-            self.processor = None
-            self.model = None
-            self.device = "cpu"
+            bundle = LoadedOCRModel(entry, processor, model, self.device, precision, time.perf_counter() - start)
+            with self._bundle_lock:
+                self.loaded[name] = bundle
+            print(f"✅ OCR model '{name}' loaded on {self.device} ({precision}) in {bundle.load_time:.1f}s")
+            return bundle
     
-    def preprocess_image_for_ocr(self, image_data):
+    def register_model(self, entry: OCRModelEntry):
+        """Add or replace a registry entry, dropping a bundle loaded from a previous definition.
+        
+        When the replaced model is active, the new definition is loaded and swapped in.
+        """
+        self.registry.register(entry)
+        with self._bundle_lock:
+            stale = self.loaded.get(entry.name)
+            if stale is None or stale.entry == entry:
+                return
+            del self.loaded[entry.name]
+        print(f"🔄 OCR model '{entry.name}' was redefined, dropped its loaded bundle")
+        if self.active is stale:
+            self.activate_model(entry.name)
+    
+    def activate_model(self, name: str) -> LoadedOCRModel:
+        """Load a model if needed and make it serve new requests.
+        
+        Requests capture the active bundle once, so in-flight requests finish on the
+        previous model while new ones pick up the swapped-in one.
+        """
+        bundle = self.load_model(name)
+        self.active = bundle
+        self.active_name = name
+        print(f"🔁 Active OCR model: '{name}'")
+        return bundle
+    
+    def unload_model(self, name: str) -> bool:
+        """Drop a loaded model that is not currently active or serving requests"""
+        with self._bundle_lock:
+            if self.active and self.active.entry.name == name:
+                raise ValueError(f"Cannot unload the active OCR model '{name}'")
+            bundle = self.loaded.get(name)
+            if bundle is None:
+                return False
+            if bundle.in_flight:
+                raise ValueError(f"OCR model '{name}' is serving {bundle.in_flight} request(s), try again later")
+            del self.loaded[name]
+        
+        del bundle
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"🗑️ Unloaded OCR model '{name}'")
+        return True
+    
+    def reload_active(self):
+        """Reload the active model after it was released"""
+        self.activate_model(self.active_name)
+    
+    def release_all(self):
+        """Release every loaded model; the active name is kept for the next reload"""
+        with self._load_lock, self._bundle_lock:
+            self.active = None
+            self.loaded.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by all loaded OCR models"""
+        return module_size_bytes(*[bundle.model for bundle in list(self.loaded.values())])
+    
+    def list_models(self) -> List[Dict]:
+        """Describe registry entries with their load and activation state"""
+        models = []
+        for entry in self.registry.list():
+            bundle = self.loaded.get(entry.name)
+            models.append({
+                **entry.to_dict(),
+                "loaded": bundle is not None,
+                "active": self.active is not None and self.active.entry.name == entry.name,
+                "effective_precision": bundle.precision if bundle else None,
+                "load_time": round(bundle.load_time, 2) if bundle else None
+            })
+        return models
+    
+    def preprocess_image_for_ocr(self, image_data, variant: str = "binarize"):
         """
         Preprocess image for better OCR results with TrOCR
+        
+        Variants: "binarize" (Otsu + denoise, suits printed models), "grayscale"
+        (keeps stroke detail for handwritten models) and "none" (raw RGB).
         """
         try:
             # Convert base64 to PIL Image
@@ -40,6 +180,8 @@ class OCRService:
             
             # Open with PIL and convert to RGB
             image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            if variant == "none":
+                return image
             
             # Convert PIL to OpenCV for preprocessing
             img_array = np.array(image)
@@ -48,11 +190,14 @@ class OCRService:
             # Convert to grayscale
             gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
             
-            # Apply Otsu's thresholding for binarization
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # Remove noise
-            denoised = cv2.medianBlur(thresh, 3)
+            if variant == "grayscale":
+                denoised = gray
+            else:
+                # Apply Otsu's thresholding for binarization
+                _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                
+                # Remove noise
+                denoised = cv2.medianBlur(thresh, 3)
             
             # Resize image (TrOCR works better with larger images)
             height, width = denoised.shape
@@ -85,28 +230,33 @@ class OCRService:
                 # Return a blank white image as last resort
                 return Image.new('RGB', (224, 224), 'white')
     
-    def recognize_text(self, image_data):
+    def recognize_text(self, image_data, model_name: Optional[str] = None):
         """
         Use TrOCR to recognize text from image
         """
-        try:
-            if self.model is None or self.processor is None:
+        # Capture the model once so a concurrent swap cannot change it mid-request,
+        # and count the request so the bundle cannot be unloaded under it
+        with self._bundle_lock:
+            bundle = self.loaded.get(model_name) if model_name else self.active
+            if bundle is None:
                 return {"success": False, "error": "TrOCR model not loaded"}
-            
+            bundle.in_flight += 1
+        
+        try:
             print("🔍 Preprocessing image for TrOCR...")
-            processed_image = self.preprocess_image_for_ocr(image_data)
+            processed_image = self.preprocess_image_for_ocr(image_data, bundle.entry.preprocessing)
             
-            print("📤 Processing with TrOCR model...")
+            print(f"📤 Processing with TrOCR model '{bundle.entry.name}'...")
             
             # Process image with TrOCR
-            pixel_values = self.processor(images=processed_image, return_tensors="pt").pixel_values
+            pixel_values = bundle.processor(images=processed_image, return_tensors="pt").pixel_values
             
             # Move to device if using GPU
-            pixel_values = pixel_values.to(self.device)
+            pixel_values = pixel_values.to(bundle.device, dtype=bundle.model.dtype)
             
             # Generate text with better parameters
-            with torch.no_grad():
-                generated_ids = self.model.generate(
+            with torch.no_grad(), autocast_context(bundle.precision, bundle.device):
+                generated_ids = bundle.model.generate(
                     pixel_values,
                     max_length=64,      # Increase max length
                     num_beams=4,        # Use beam search for better results
@@ -116,7 +266,7 @@ class OCRService:
                 )
             
             # Decode the generated text
-            predicted_text = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+            predicted_text = bundle.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
             
             print(f"✅ TrOCR prediction: '{predicted_text}'")
             
@@ -132,19 +282,23 @@ class OCRService:
                 "success": True,
                 "texts": texts,
                 "full_text": predicted_text,
-                "confidence": "high" if predicted_text else "low"
+                "confidence": "high" if predicted_text else "low",
+                "model": bundle.entry.name
             }
             
         except Exception as e:
             print(f"❌ Error in TrOCR: {e}")
             return {"success": False, "error": str(e)}
+        finally:
+            with self._bundle_lock:
+                bundle.in_flight -= 1
     
-    def check_letter_match(self, image_data, expected_letter):
+    def check_letter_match(self, image_data, expected_letter, model_name: Optional[str] = None):
         """
         Check if the drawn letter matches the expected letter using TrOCR
         """
         try:
-            ocr_result = self.recognize_text(image_data)
+            ocr_result = self.recognize_text(image_data, model_name)
             
             if not ocr_result["success"]:
                 return {
@@ -213,7 +367,8 @@ class OCRService:
                 "expected": expected_letter.upper(),
                 "all_detected": detected_texts,
                 "confidence": ocr_result.get("confidence", "medium"),
-                "full_text": full_text
+                "full_text": full_text,
+                "model": ocr_result.get("model")
             }
             
         except Exception as e:
@@ -227,4 +382,12 @@ class OCRService:
             }
 
 # Global OCR service instance
-ocr_service = OCRService()
\ No newline at end of file
+ocr_service = OCRService()
+model_lifecycle.register(
+    "ocr",
+    load_fn=ocr_service.reload_active,
+    unload_fn=ocr_service.release_all,
+    is_loaded_fn=lambda: ocr_service.active is not None,
+    size_fn=ocr_service.memory_footprint,
+    idle_ttl=settings.OCR_IDLE_TTL_SECONDS
+)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Shared helpers for the benchmark scripts in this folder."""
+import base64
+import io
+import os
+import statistics
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw, ImageFont
+from utils.helpers import percentile
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def make_letter_image(letter: str) -> str:
+    """Render a letter as a base64 PNG, like the drawing canvas sends"""
+    image = Image.new("RGB", (256, 256), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((90, 60), letter, fill="black", font=ImageFont.load_default(size=120))
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffered.getvalue()).decode()
+
+def load_letter_samples(samples_dir: str = None) -> List[Tuple[str, str]]:
+    """Load (expected_letter, base64 image) pairs.
+
+    Files in samples_dir must be named "<LETTER>_<anything>.png" (e.g. "A_03.png").
+    Without a directory, one rendered sample per letter is used instead.
+    """
+    if not samples_dir:
+        return [(letter, make_letter_image(letter)) for letter in LETTERS]
+
+    samples = []
+    for filename in sorted(os.listdir(samples_dir)):
+        if not filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        with open(os.path.join(samples_dir, filename), "rb") as f:
+            samples.append((filename[0].upper(), base64.b64encode(f.read()).decode()))
+    return samples
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean in milliseconds"""
+    return {
+        "n": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
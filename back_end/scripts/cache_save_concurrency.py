@@ -0,0 +1,132 @@
+"""
+Check that concurrent prediction cache saves of one topic lose no updates.
+
+Run from back_end/:
+    python -m scripts.cache_save_concurrency --workers 4 --threads 16 --saves 200
+
+Saves run from many threads, spread over several CacheService instances standing in for worker
+processes, against an in-memory Firestore stand-in that implements create() and set(merge=True)
+with field transforms, with simulated network latency per round trip. The check passes when
+exactly one save created the entry, access_count equals the number of successful saves, created_at
+is the creating save's, every description is kept (trimming is the compaction pass's job), and no
+save took more than two round trips.
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import transforms
+
+from services.cache_service import CacheService
+from services.cache_stats import cache_stats_service
+
+class FakeDocument:
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def create(self, data):
+        self.store.round_trip()
+        with self.store.lock:
+            if self.key in self.store.docs:
+                raise AlreadyExists(self.key)
+            self.store.docs[self.key] = apply_merge({}, data)
+
+    def set(self, data, merge=False):
+        self.store.round_trip()
+        with self.store.lock:
+            current = dict(self.store.docs.get(self.key) or {}) if merge else {}
+            self.store.docs[self.key] = apply_merge(current, data)
+
+class FakeCollection:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def document(self, key):
+        return FakeDocument(self.store, f"{self.name}/{key}")
+
+class FakeFirestore:
+    """Just enough of the client for cache saves: create, set(merge=True) and field transforms"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.round_trips = 0
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+def apply_merge(current, data):
+    for field, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            current.pop(field, None)
+        elif isinstance(value, transforms.Increment):
+            current[field] = current.get(field, 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            existing = list(current.get(field) or [])
+            current[field] = existing + [item for item in value.values if item not in existing]
+        elif isinstance(value, dict):
+            current[field] = apply_merge(dict(current.get(field) or {}), value)
+        else:
+            current[field] = value
+    return current
+
+def save(service, index):
+    tags = [{"name": "cat", "confidence": 0.9}, {"name": "animal", "confidence": 0.8}]
+    return asyncio.run(service.save_prediction_to_cache(
+        tags, f"a cat drawing #{index}", "cat", ["whiskers", "tail", "paws"]
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="Simulated worker processes")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--saves", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per simulated round trip")
+    args = parser.parse_args()
+
+    store = FakeFirestore(args.latency)
+    services = [CacheService() for _ in range(args.workers)]
+    for service in services:
+        service.db = store
+    # Statistics writes are not under test; record which saves created the entry instead
+    created = []
+    async def record_save(entry, is_new, topic_count_delta):
+        if is_new:
+            created.append(entry["created_at"])
+    cache_stats_service.record_save = record_save
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda index: save(services[index % args.workers], index), range(args.saves)))
+
+    doc = store.docs.get("prediction_cache/cat") or {}
+    descriptions = doc.get("examples", {}).get("descriptions", [])
+    created_at = doc.get("created_at", "")
+    checks = {
+        "all saves succeeded": all(results),
+        "created exactly once": len(created) == 1,
+        "no lost updates": doc.get("access_count") == sum(results),
+        "every description kept": len(descriptions) == sum(results),
+        "created_at kept from the creating save": created == [created_at],
+        "at most two round trips per save": store.round_trips <= 2 * args.saves,
+    }
+
+    print(f"\n{args.saves} saves from {args.threads} threads on {args.workers} workers: access_count={doc.get('access_count')} "
+          f"created={len(created)} descriptions={len(descriptions)} "
+          f"round_trips={store.round_trips} ({store.round_trips / args.saves:.1f} per save)")
+    for name, passed in checks.items():
+        print(f"  {'✅' if passed else '❌'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measure /check-letter OCR latency while a diffusion job runs.
+
+Run from back_end/:
+    python -m scripts.ocr_latency_under_load --requests 50
+    RESOURCE_GOVERNOR_ENABLED=false python -m scripts.ocr_latency_under_load --requests 50
+
+Compare the p99 of the two runs to see what the per-engine thread budgets buy.
+"""
+import argparse
+import asyncio
+import time
+
+from scripts.bench_utils import LETTERS, make_letter_image, latency_summary
+from services.resource_governor import resource_governor
+from ocr_service import ocr_service
+from image_generation_service import image_service
+
+async def measure_ocr(requests: int):
+    latencies = []
+    for i in range(requests):
+        letter = LETTERS[i % len(LETTERS)]
+        start = time.perf_counter()
+        await resource_governor.run("ocr", ocr_service.check_letter_match, make_letter_image(letter), letter)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summarize(label, latencies):
+    summary = latency_summary(latencies)
+    print(f"{label:>16}: n={summary['n']} p50={summary['p50_ms']}ms "
+          f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms")
+
+async def main(requests: int):
+    resource_governor.print_report()
+
+    # Warm both engines so load time is not counted
+    image_service.load_pipeline()
+    await measure_ocr(2)
+
+    idle = await measure_ocr(requests)
+
+    prompts = ["a tree", "a dog", "a house", "a cat"]
+    diffusion_job = asyncio.create_task(
+        resource_governor.run("diffusion", image_service.generate_images_from_prompts, prompts, "benchmark")
+    )
+    await asyncio.sleep(1)  # let denoising start
+    loaded = await measure_ocr(requests)
+    await diffusion_job
+
+    summarize("idle", idle)
+    summarize("during diffusion", loaded)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
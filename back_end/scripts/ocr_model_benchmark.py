@@ -0,0 +1,70 @@
+"""
+Benchmark every OCR registry entry for letter accuracy and latency.
+
+Run from back_end/:
+    python -m scripts.ocr_model_benchmark --samples path/to/letters --min-accuracy 0.9
+
+Sample files are named "<LETTER>_<anything>.png". Without --samples, rendered letters are used,
+which only makes sense as a smoke test: real children's handwriting is what the accuracy bar is for.
+"""
+import argparse
+import time
+
+from scripts.bench_utils import load_letter_samples, latency_summary
+from ocr_service import ocr_service
+
+def benchmark_model(name: str, samples, repeats: int):
+    """Load one registry entry and score it over the samples"""
+    bundle = ocr_service.load_model(name)
+    ocr_service.check_letter_match(samples[0][1], samples[0][0], model_name=name)  # warm-up
+
+    latencies = []
+    correct = 0
+    for _ in range(repeats):
+        for expected, image in samples:
+            start = time.perf_counter()
+            result = ocr_service.check_letter_match(image, expected, model_name=name)
+            latencies.append(time.perf_counter() - start)
+            correct += 1 if result.get("correct") else 0
+
+    return {
+        "model": name,
+        "load_time_s": round(bundle.load_time, 1),
+        "accuracy": round(correct / (len(samples) * repeats), 3),
+        **latency_summary(latencies)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of labelled letter images")
+    parser.add_argument("--models", nargs="*", help="Registry entries to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    args = parser.parse_args()
+
+    samples = load_letter_samples(args.samples)
+    names = args.models or [entry.name for entry in ocr_service.registry.list()]
+    active = ocr_service.active.entry.name if ocr_service.active else None
+
+    results = []
+    for name in names:
+        print(f"⏱️ Benchmarking '{name}' on {len(samples)} samples...")
+        results.append(benchmark_model(name, samples, args.repeats))
+        if name != active:
+            ocr_service.unload_model(name)
+
+    print(f"\n{'model':<28}{'accuracy':>10}{'mean':>10}{'p95':>10}{'p99':>10}{'load':>8}")
+    for r in results:
+        print(f"{r['model']:<28}{r['accuracy']:>10.3f}{r['mean_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms"
+              f"{r['p99_ms']:>8.0f}ms{r['load_time_s']:>7.1f}s")
+
+    eligible = [r for r in results if r["accuracy"] >= args.min_accuracy]
+    if eligible:
+        best = min(eligible, key=lambda r: r["mean_ms"])
+        print(f"\n✅ Fastest model meeting accuracy >= {args.min_accuracy}: {best['model']}")
+        print(f"   Activate with: POST /admin/ocr-models/{best['model']}/activate")
+    else:
+        print(f"\n❌ No model reached accuracy >= {args.min_accuracy}")
+
+if __name__ == "__main__":
+    main()
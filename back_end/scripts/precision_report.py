@@ -0,0 +1,103 @@
+"""
+Accuracy and latency report for each precision mode of the OCR and diffusion engines.
+
+Run from back_end/:
+    python -m scripts.precision_report --samples path/to/letters
+    python -m scripts.precision_report --skip-diffusion --modes fp32 bf16 int8
+
+OCR accuracy is the letter-match rate over the samples. Diffusion "accuracy" is the drift from
+the fp32 image for the same seed (mean absolute pixel difference and PSNR); lower drift is better.
+"""
+import argparse
+import math
+import time
+import numpy as np
+
+from scripts.bench_utils import load_letter_samples, latency_summary
+from utils.precision import detect_cpu_capabilities, resolve_precision
+from ocr_model_registry import OCRModelEntry
+from ocr_service import ocr_service
+
+def ocr_report(modes, samples):
+    base = ocr_service.active.entry
+    rows = []
+    for mode in modes:
+        name = f"{base.name}@{mode}"
+        ocr_service.registry.register(OCRModelEntry(
+            name=name, path=base.path, backend=base.backend, precision=mode, preprocessing=base.preprocessing
+        ))
+        bundle = ocr_service.load_model(name)
+        ocr_service.check_letter_match(samples[0][1], samples[0][0], model_name=name)  # warm-up
+
+        latencies = []
+        correct = 0
+        for expected, image in samples:
+            start = time.perf_counter()
+            result = ocr_service.check_letter_match(image, expected, model_name=name)
+            latencies.append(time.perf_counter() - start)
+            correct += 1 if result.get("correct") else 0
+
+        rows.append({"mode": mode, "effective": bundle.precision,
+                     "accuracy": round(correct / len(samples), 3), **latency_summary(latencies)})
+        ocr_service.unload_model(name)
+    return rows
+
+def diffusion_report(modes, prompt):
+    from image_generation_service import image_service
+
+    reference = None
+    rows = []
+    for mode in ["fp32"] + [m for m in modes if m != "fp32"]:
+        effective = image_service.set_precision(mode)
+        image_service.load_pipeline()
+        start = time.perf_counter()
+        result = image_service.generate_images_from_prompts([prompt], f"precision_{mode}")
+        elapsed = time.perf_counter() - start
+        if not result.get("success"):
+            rows.append({"mode": mode, "effective": effective, "error": result.get("error")})
+            continue
+
+        from PIL import Image
+        pixels = np.asarray(Image.open(result["saved_files"][0]), dtype=np.float32)
+        if mode == "fp32":
+            reference = pixels
+        row = {"mode": mode, "effective": effective, "seconds": round(elapsed, 1),
+               "mae_vs_fp32": None, "psnr_vs_fp32": None}
+        # Without an fp32 image there is nothing to compare against; never substitute another mode
+        if reference is not None:
+            mae = float(np.abs(pixels - reference).mean())
+            mse = float(((pixels - reference) ** 2).mean())
+            psnr = math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+            row.update({"mae_vs_fp32": round(mae, 2), "psnr_vs_fp32": round(psnr, 1)})
+        rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of labelled letter images")
+    parser.add_argument("--modes", nargs="*", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--prompt", default="a butterfly on a flower")
+    parser.add_argument("--skip-diffusion", action="store_true")
+    args = parser.parse_args()
+
+    print("CPU capabilities:", detect_cpu_capabilities())
+    print("auto resolves to:", resolve_precision("auto", "cpu"))
+
+    print("\nOCR")
+    print(f"{'mode':<8}{'effective':<11}{'accuracy':>10}{'mean':>10}{'p95':>10}")
+    for r in ocr_report(args.modes, load_letter_samples(args.samples)):
+        print(f"{r['mode']:<8}{r['effective']:<11}{r['accuracy']:>10.3f}{r['mean_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms")
+
+    if not args.skip_diffusion:
+        print("\nDiffusion")
+        print(f"{'mode':<8}{'effective':<11}{'seconds':>9}{'MAE':>8}{'PSNR':>8}")
+        for r in diffusion_report(args.modes, args.prompt):
+            if "error" in r:
+                print(f"{r['mode']:<8}{r['effective']:<11} failed: {r['error']}")
+            elif r["mae_vs_fp32"] is None:
+                print(f"{r['mode']:<8}{r['effective']:<11}{r['seconds']:>9.1f}{'n/a':>8}{'n/a':>8}  (no fp32 reference)")
+            else:
+                print(f"{r['mode']:<8}{r['effective']:<11}{r['seconds']:>9.1f}{r['mae_vs_fp32']:>8.2f}{r['psnr_vs_fp32']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
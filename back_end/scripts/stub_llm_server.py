@@ -0,0 +1,128 @@
+"""
+Minimal OpenAI-compatible chat completions server for offline runs.
+
+Answers every prompt with canned JSON that satisfies the game, section and domain
+parsers, after a configurable delay. Supports stream=True (SSE).
+
+Run from back_end/:
+    python -m scripts.stub_llm_server --port 8080 --latency 0.5 --fail-rate 0.1
+
+and point the backend at it:
+    LLM_PROVIDERS=local,openrouter LOCAL_LLM_BASE_URL=http://localhost:8080/v1 uvicorn main:app
+"""
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GAMES = {
+    "spelling": {"word": "SEED", "instructions": "Spell the word related to the topic"},
+    "drawing": {"word": "SEED", "instructions": "Draw each letter of the word"},
+    "gallery": {
+        "image_prompts": [
+            "Stage 1: a seed in soil",
+            "Stage 2: a sprouting seed",
+            "Stage 3: a small seedling",
+            "Stage 4: a young plant"
+        ],
+        "instructions": "Explore the process step by step"
+    },
+    "quiz": {
+        "questions": [
+            {"question": "What happens first?", "options": ["Seed", "Sprout", "Seedling", "Plant"], "correct_answer": "Seed"}
+        ],
+        "instructions": "Answer questions about the process"
+    }
+}
+
+def domains_for(subject: str):
+    return [
+        {"domain": "Science", "topics": [f"How {subject} Works", f"{subject} Parts"]},
+        {"domain": "Nature", "topics": [f"{subject} in Nature", f"{subject} Lifecycle"]},
+        {"domain": "Art", "topics": [f"Drawing {subject}", f"{subject} Colors"]}
+    ]
+
+def canned_response(prompt: str) -> str:
+    """One JSON document that every parser in llama_service accepts"""
+    subjects_line = re.search(r"subjects identified from an image are: (.*)\.", prompt)
+    subjects = re.findall(r'"([^"]+)"', subjects_line.group(1)) if subjects_line else []
+    main_subject = re.search(r'main subject identified from an image is "([^"]+)"', prompt)
+    subject = main_subject.group(1) if main_subject else "Topic"
+
+    return json.dumps({
+        **GAMES,
+        "primary_subject": subject,
+        "domains": domains_for(subject),
+        "subjects": {name: {"domains": domains_for(name)} for name in subjects}
+    })
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self._send_json(503, {"error": {"message": "stub failure"}})
+            return
+
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        content = canned_response(prompt)
+        model = request.get("model", "stub")
+        created = int(time.time())
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i in range(0, len(content), 40):
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + 40]}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._send_json(200, {
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub LLM server on http://127.0.0.1:{args.port}/v1 (latency {args.latency}s, fail rate {args.fail_rate})")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
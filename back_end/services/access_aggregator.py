@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from config.firebase_config import db
+from config.settings import settings
+from services.cache_stats import cache_stats_service
+
+print = partial(print, flush=True)
+
+class AccessAggregator:
+    """Buffers prediction_cache hit counts in memory and writes them behind as batched increments"""
+
+    def __init__(self, collection: str = "prediction_cache"):
+        self.db = db
+        self.collection = collection
+        self.flush_interval = settings.ACCESS_FLUSH_INTERVAL_SECONDS
+        # Firestore batches hold at most 500 writes
+        self.batch_size = min(500, settings.ACCESS_FLUSH_BATCH_SIZE)
+        self.pending: Dict[str, Dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "flushed_hits": 0, "flushes": 0, "writes": 0, "missing_docs": 0, "failures": 0}
+
+    def record(self, cache_key: str, info: Optional[Dict] = None):
+        """Count one hit; no I/O. info is the topic's latest known summary, for the popularity ranking"""
+        entry = self.pending.setdefault(cache_key, {"count": 0, "last_accessed": None, "info": None})
+        entry["count"] += 1
+        entry["last_accessed"] = datetime.now(timezone.utc).isoformat()
+        if info:
+            entry["info"] = info
+        self.stats["recorded"] += 1
+
+    def _requeue(self, items: List[Tuple[str, Dict]]):
+        """Put counts from a failed write back so they go out with the next flush"""
+        for cache_key, entry in items:
+            pending = self.pending.setdefault(cache_key, {"count": 0, "last_accessed": entry["last_accessed"], "info": entry["info"]})
+            pending["count"] += entry["count"]
+            pending["last_accessed"] = max(pending["last_accessed"], entry["last_accessed"])
+
+    def _write_batch(self, items: List[Tuple[str, Dict]]) -> int:
+        """Commit one batch of increments and fold them into the cache statistics; returns documents written"""
+        collection = self.db.collection(self.collection)
+        batch = self.db.batch()
+        for cache_key, entry in items:
+            batch.update(collection.document(cache_key), {
+                "access_count": firestore.Increment(entry["count"]),
+                "last_accessed": entry["last_accessed"]
+            })
+        try:
+            batch.commit()
+            written = items
+        except NotFound:
+            # A document was deleted since its hits were counted; the batch is atomic, so retry one by one
+            written = []
+            for cache_key, entry in items:
+                try:
+                    collection.document(cache_key).update({
+                        "access_count": firestore.Increment(entry["count"]),
+                        "last_accessed": entry["last_accessed"]
+                    })
+                    written.append((cache_key, entry))
+                except NotFound:
+                    self.stats["missing_docs"] += 1
+
+        cache_stats_service.record_hits([
+            {"cache_key": cache_key, "count": entry["count"], "info": entry["info"]} for cache_key, entry in written
+        ])
+        return len(written)
+
+    async def flush(self) -> int:
+        """Write all buffered counts; failed batches are kept for the next flush"""
+        if not self.db:
+            self.pending.clear()
+            return 0
+
+        async with self._flush_lock:
+            if not self.pending:
+                return 0
+            items, self.pending = list(self.pending.items()), {}
+
+            written = 0
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                try:
+                    written += await asyncio.to_thread(self._write_batch, chunk)
+                    self.stats["flushed_hits"] += sum(entry["count"] for _, entry in chunk)
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    self._requeue(chunk)
+                    print(f"⚠️ Access count flush failed, keeping {len(chunk)} keys for retry: {e}")
+
+            self.stats["flushes"] += 1
+            self.stats["writes"] += written
+            if written:
+                print(f"📊 Flushed access counts for {written} cached topics")
+            return written
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic task and flush what is left"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict:
+        return {
+            "pending_keys": len(self.pending),
+            "pending_hits": sum(entry["count"] for entry in self.pending.values()),
+            "flush_interval_seconds": self.flush_interval,
+            "batch_size": self.batch_size,
+            **self.stats
+        }
+
+# Create global instance
+access_aggregator = AccessAggregator()
@@ -1,36 +1,121 @@
-import requests
+import io
+import time
+import httpx
 from fastapi import UploadFile
 from config.settings import settings
+from services.resilience import resilience_service
+from services.resource_governor import resource_governor
 from functools import partial
 
 print = partial(print, flush=True)
 
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+def downscale_for_analysis(image_data: bytes, max_dimension: int, quality: int) -> bytes:
+    """Shrink an upload to the largest size the analysis features benefit from and re-encode as JPEG.
+
+    Azure Vision v3.2 accepts JPEG, PNG, GIF and BMP only, so WebP is not an option. The original
+    bytes are kept when re-encoding would not make the payload smaller.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    if image.format == "JPEG":
+        # DCT-domain downscaling during decode: much cheaper than decoding full size and resizing
+        image.draft("RGB", (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension), Image.BILINEAR)
+    
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality, optimize=True)
+    encoded = buffered.getvalue()
+    return encoded if len(encoded) < len(image_data) else image_data
+
 class AzureVisionService:
     def __init__(self):
         self.api_key = settings.AZURE_VISION_KEY
         self.analyze_url = settings.AZURE_ANALYZE_URL
         self.params = settings.AZURE_PARAMS
+        self.client = None
+        self.upload_stats = {"images": 0, "original_bytes": 0, "uploaded_bytes": 0, "preprocess_seconds": 0.0}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Lazily create the keep-alive pool (it must be created inside the running loop)"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.AZURE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AZURE_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(settings.AZURE_VISION_DEADLINE_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT),
+                headers={"Ocp-Apim-Subscription-Key": self.api_key or ""}
+            )
+        return self.client
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+    
+    async def prepare_upload(self, image_data: bytes) -> bytes:
+        """Downscale and re-encode off the event loop; falls back to the original bytes"""
+        if not PIL_AVAILABLE or not settings.AZURE_MAX_IMAGE_DIMENSION:
+            return image_data
+        
+        start = time.perf_counter()
+        try:
+            prepared = await resource_governor.run(
+                "image", downscale_for_analysis, image_data,
+                settings.AZURE_MAX_IMAGE_DIMENSION, settings.AZURE_JPEG_QUALITY
+            )
+        except Exception as e:
+            print(f"⚠️ Could not downscale upload, sending original: {e}")
+            prepared = image_data
+        
+        self.upload_stats["images"] += 1
+        self.upload_stats["original_bytes"] += len(image_data)
+        self.upload_stats["uploaded_bytes"] += len(prepared)
+        self.upload_stats["preprocess_seconds"] += time.perf_counter() - start
+        return prepared
+    
+    def get_upload_stats(self) -> dict:
+        """Payload reduction from pre-upload downscaling"""
+        stats = self.upload_stats
+        return {
+            **stats,
+            "preprocess_seconds": round(stats["preprocess_seconds"], 3),
+            "bytes_saved_pct": round(100 * (1 - stats["uploaded_bytes"] / stats["original_bytes"]), 1) if stats["original_bytes"] else None
+        }
     
     async def analyze_image(self, file: UploadFile):
         """Analyze image using Azure Computer Vision"""
+        return await self.analyze_image_bytes(await file.read(), file.filename)
+    
+    async def analyze_image_bytes(self, image_data: bytes, filename: str = None):
+        """Analyze already-read image bytes using Azure Computer Vision"""
         try:
-            print(f"🔍 Analyzing image with Azure Vision: {file.filename}")
+            print(f"🔍 Analyzing image with Azure Vision: {filename}")
             
-            image_data = await file.read()
-            headers = {
-                "Ocp-Apim-Subscription-Key": self.api_key,
-                "Content-Type": "application/octet-stream"
-            }
+            image_data = await self.prepare_upload(image_data)
+            client = self._get_client()
             
-            response = requests.post(
-                self.analyze_url, 
-                headers=headers, 
-                params=self.params, 
-                data=image_data
-            )
-            response.raise_for_status()
+            async def post():
+                response = await client.post(
+                    self.analyze_url,
+                    params=self.params,
+                    content=image_data,
+                    headers={"Content-Type": "application/octet-stream"}
+                )
+                response.raise_for_status()
+                return response.json()
             
-            result = response.json()
+            result = await resilience_service.call("azure_vision", post)
             print(f"✅ Azure analysis complete - found {len(result.get('tags', []))} tags")
             return result
             
@@ -0,0 +1,163 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional
+from google.cloud.firestore_v1.field_path import FieldPath
+from config.firebase_config import db
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+# Firestore commits hold at most 500 writes
+MAX_BATCH_WRITES = 500
+
+class BulkDeleteJob:
+    """Progress of one background deletion"""
+    def __init__(self, collection: str, prefix: Optional[str], older_than_days: Optional[float]):
+        self.id = uuid.uuid4().hex[:12]
+        self.collection = collection
+        self.prefix = prefix
+        self.older_than_days = older_than_days
+        self.status = "pending"
+        self.scanned = 0
+        self.deleted = 0
+        self.pages = 0
+        self.commits = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "collection": self.collection,
+            "prefix": self.prefix,
+            "older_than_days": self.older_than_days,
+            "status": self.status,
+            "scanned": self.scanned,
+            "deleted": self.deleted,
+            "pages": self.pages,
+            "commits": self.commits,
+            "elapsed_seconds": round(elapsed, 1),
+            "deleted_per_second": round(self.deleted / elapsed, 1) if elapsed else None,
+            "error": self.error
+        }
+
+class BulkDeleteService:
+    """Deletes Firestore documents in the background: paged id-only queries, 500-write batches, bounded parallel commits"""
+
+    def __init__(self):
+        self.db = db
+        self.page_size = settings.BULK_DELETE_PAGE_SIZE
+        self.batch_size = min(MAX_BATCH_WRITES, settings.BULK_DELETE_BATCH_SIZE)
+        self.parallel_commits = settings.BULK_DELETE_PARALLEL_COMMITS
+        self.jobs: Dict[str, BulkDeleteJob] = {}
+
+    def _query(self, job: BulkDeleteJob, cutoff: Optional[str]):
+        collection = self.db.collection(job.collection)
+        if job.prefix:
+            # Document ids sort lexicographically, so a prefix is a contiguous id range
+            return (collection
+                    .where(FieldPath.document_id(), ">=", collection.document(job.prefix))
+                    .where(FieldPath.document_id(), "<", collection.document(job.prefix + "\uf8ff"))
+                    .order_by(FieldPath.document_id()))
+        if cutoff:
+            return collection.where("created_at", "<", cutoff).order_by("created_at")
+        return collection.order_by(FieldPath.document_id())
+
+    def _fetch_page(self, job: BulkDeleteJob, cutoff: Optional[str], last_doc) -> List:
+        # Only created_at is needed (for age filtering on prefix jobs); skip the rest of each document
+        query = self._query(job, cutoff).select(["created_at"]).limit(self.page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        return list(query.stream())
+
+    def _commit(self, refs: List) -> int:
+        batch = self.db.batch()
+        for ref in refs:
+            batch.delete(ref)
+        batch.commit()
+        return len(refs)
+
+    async def _run(self, job: BulkDeleteJob, on_complete: Optional[Callable[[BulkDeleteJob], Awaitable]]):
+        job.status = "running"
+        cutoff = None
+        if job.older_than_days is not None:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=job.older_than_days)).isoformat()
+        semaphore = asyncio.Semaphore(self.parallel_commits)
+
+        async def commit(refs: List):
+            async with semaphore:
+                job.deleted += await asyncio.to_thread(self._commit, refs)
+                job.commits += 1
+
+        try:
+            last_doc = None
+            while True:
+                page = await asyncio.to_thread(self._fetch_page, job, cutoff, last_doc)
+                if not page:
+                    break
+                job.pages += 1
+                job.scanned += len(page)
+                last_doc = page[-1]
+
+                refs = [
+                    doc.reference for doc in page
+                    # Prefix jobs with an age limit filter age here; two range filters need a composite index
+                    if not (cutoff and job.prefix) or (doc.to_dict() or {}).get("created_at", "") < cutoff
+                ]
+                await asyncio.gather(*(
+                    commit(refs[start:start + self.batch_size]) for start in range(0, len(refs), self.batch_size)
+                ))
+                if len(page) < self.page_size:
+                    break
+
+            job.status = "completed"
+            print(f"✅ Bulk delete {job.id}: removed {job.deleted} documents from {job.collection}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Bulk delete {job.id} failed after {job.deleted} documents: {e}")
+        finally:
+            job.finished_at = time.time()
+            if on_complete:
+                try:
+                    await on_complete(job)
+                except Exception as e:
+                    print(f"⚠️ Bulk delete {job.id} completion hook failed: {e}")
+
+    async def delete_documents(self, collection: str, document_ids: List[str]) -> int:
+        """Delete known documents in batched, bounded-parallel commits; returns the number deleted"""
+        collection_ref = self.db.collection(collection)
+        semaphore = asyncio.Semaphore(self.parallel_commits)
+
+        async def commit(ids: List[str]) -> int:
+            async with semaphore:
+                return await asyncio.to_thread(self._commit, [collection_ref.document(doc_id) for doc_id in ids])
+
+        counts = await asyncio.gather(*(
+            commit(document_ids[start:start + self.batch_size]) for start in range(0, len(document_ids), self.batch_size)
+        ))
+        return sum(counts)
+
+    def start(self, collection: str, prefix: Optional[str] = None, older_than_days: Optional[float] = None,
+              on_complete: Optional[Callable[[BulkDeleteJob], Awaitable]] = None) -> BulkDeleteJob:
+        """Start a background deletion and return its job for progress polling"""
+        job = BulkDeleteJob(collection, prefix, older_than_days)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, on_complete))
+        print(f"🧹 Bulk delete {job.id} started on {collection} (prefix: {prefix or '-'}, older than: {older_than_days or '-'} days)")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BulkDeleteJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda job: job.started_at, reverse=True)]
+
+# Create global instance
+bulk_delete_service = BulkDeleteService()
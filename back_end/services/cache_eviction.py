@@ -0,0 +1,159 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, List, Optional
+from config.firebase_config import db
+from config.settings import settings
+from services.bulk_delete import bulk_delete_service, MAX_BATCH_WRITES
+from services.cache_service import cache_service
+from services.cache_stats import cache_stats_service
+from services.topic_index import topic_index
+
+print = partial(print, flush=True)
+
+def compact_cache_document(data: Dict) -> Optional[Dict]:
+    """Fields to rewrite so a prediction_cache document only keeps what reads use; None when already compact"""
+    max_tags = settings.CACHE_COMPACT_MAX_TAGS
+    max_descriptions = settings.CACHE_COMPACT_MAX_DESCRIPTIONS
+    updates = {}
+
+    tags = data.get("tags") or []
+    if len(tags) > max_tags:
+        updates["tags"] = sorted(tags, key=lambda tag: tag.get("confidence", 0), reverse=True)[:max_tags]
+
+    examples = data.get("examples") or {}
+    descriptions = examples.get("descriptions") or []
+    if len(descriptions) > max_descriptions:
+        # Keep the most recent ones
+        updates["examples.descriptions"] = descriptions[-max_descriptions:]
+
+    description_sample = data.get("description_sample") or ""
+    if len(description_sample) > 200:
+        updates["description_sample"] = description_sample[:200]
+
+    return updates or None
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds from an ISO string or datetime field"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+class CacheEvictionService:
+    """Keeps prediction_cache bounded: drops entries past the max age, then the lowest decayed-LFU scores
+    above the entry cap, and compacts oversized documents"""
+
+    def __init__(self):
+        self.db = db
+        self.max_entries = settings.PREDICTION_CACHE_MAX_ENTRIES
+        self.max_age = settings.PREDICTION_CACHE_MAX_AGE_DAYS * 86400
+        self.half_life = settings.CACHE_LFU_HALF_LIFE_DAYS * 86400
+        self.interval = settings.CACHE_MAINTENANCE_INTERVAL_HOURS * 3600
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict] = None
+
+    def score(self, access_count: int, last_accessed: float, now: float) -> float:
+        """Access count halved for every half-life since the last access"""
+        return access_count * 0.5 ** (max(0.0, now - last_accessed) / self.half_life)
+
+    def _scan(self, report: Dict) -> List[Dict]:
+        """Score every document and queue compaction writes for oversized ones"""
+        now = time.time()
+        entries = []
+        compaction = []
+        for doc in self.db.collection("prediction_cache").stream():
+            data = doc.to_dict() or {}
+            last_accessed = parse_timestamp(data.get("last_accessed")) or parse_timestamp(data.get("created_at")) or 0.0
+            entries.append({
+                "cache_key": doc.id,
+                "age": now - last_accessed,
+                "score": self.score(data.get("access_count", 0), last_accessed, now)
+            })
+            updates = compact_cache_document(data)
+            if updates:
+                compaction.append((doc.reference, updates))
+
+        for start in range(0, len(compaction), MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for ref, updates in compaction[start:start + MAX_BATCH_WRITES]:
+                batch.update(ref, updates)
+            batch.commit()
+        report["scanned"] = len(entries)
+        report["compacted"] = len(compaction)
+        return entries
+
+    def _select_victims(self, entries: List[Dict], report: Dict) -> List[str]:
+        expired = {entry["cache_key"] for entry in entries if self.max_age and entry["age"] > self.max_age}
+        remaining = sorted((entry for entry in entries if entry["cache_key"] not in expired),
+                           key=lambda entry: entry["score"])
+        overflow = len(remaining) - self.max_entries if self.max_entries else 0
+        least_used = [entry["cache_key"] for entry in remaining[:max(0, overflow)]]
+        report["expired"] = len(expired)
+        report["evicted_lfu"] = len(least_used)
+        return list(expired) + least_used
+
+    async def run(self) -> Dict:
+        """One eviction + compaction pass"""
+        if not self.db:
+            return {"success": False, "error": "Firebase not available"}
+
+        async with self._lock:
+            started = time.perf_counter()
+            report = {"started_at": datetime.now(timezone.utc).isoformat()}
+            print("🧽 Running prediction cache eviction and compaction...")
+
+            entries = await asyncio.to_thread(self._scan, report)
+            victims = self._select_victims(entries, report)
+            if victims:
+                report["deleted"] = await bulk_delete_service.delete_documents("prediction_cache", victims)
+                for cache_key in victims:
+                    cache_service.memory.delete(cache_key)
+                    topic_index.remove(cache_key)
+                await cache_stats_service.rebuild()
+            else:
+                report["deleted"] = 0
+
+            report["duration_seconds"] = round(time.perf_counter() - started, 2)
+            self.last_report = report
+            print(f"✅ Cache maintenance: {report['deleted']} evicted, {report['compacted']} compacted of {report['scanned']}")
+            return {"success": True, **report}
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"⚠️ Cache maintenance failed: {e}")
+
+    def start(self):
+        """Start periodic maintenance (disabled when the interval is 0)"""
+        if self._task is None and self.interval and self.db:
+            self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> Dict:
+        return {
+            "max_entries": self.max_entries,
+            "max_age_days": settings.PREDICTION_CACHE_MAX_AGE_DAYS,
+            "lfu_half_life_days": settings.CACHE_LFU_HALF_LIFE_DAYS,
+            "interval_hours": settings.CACHE_MAINTENANCE_INTERVAL_HOURS,
+            "last_report": self.last_report
+        }
+
+# Create global instance
+cache_eviction_service = CacheEvictionService()
@@ -1,16 +1,48 @@
+import asyncio
 import re
 from datetime import datetime, timezone
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 from config.firebase_config import db
+from config.settings import settings
 from utils.helpers import get_primary_label_from_tags
-from typing import List, Dict, Optional
+from utils.ttl_cache import TTLCache
+from services.access_aggregator import access_aggregator
+from services.cache_stats import cache_stats_service
+from services.bulk_delete import bulk_delete_service
+from services.topic_index import topic_index
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 from functools import partial
 
 print = partial(print, flush=True)
 
+_UNCACHED = object()
+
 class CacheService:
     def __init__(self):
         self.db = db
+        # Decoded prediction_cache documents; None marks a known miss (negative entry)
+        self.memory = TTLCache(settings.PREDICTION_CACHE_MEMORY_ENTRIES, settings.PREDICTION_CACHE_MEMORY_TTL_SECONDS)
+        self.negative_ttl = settings.PREDICTION_CACHE_NEGATIVE_TTL_SECONDS
+        self.firestore_reads = 0
+        # Awaited after a clear job finishes, for state derived from the cache (e.g. the local snapshot)
+        self.clear_listeners: List[Callable[[], Awaitable]] = []
+    
+    async def get_cached_prediction(self, cache_key: str) -> Optional[Dict]:
+        """Fetch a prediction_cache document, from memory when possible"""
+        cached_data = self.memory.get(cache_key, _UNCACHED)
+        if cached_data is not _UNCACHED:
+            return cached_data
+        
+        cache_doc = self.db.collection("prediction_cache").document(cache_key).get()
+        self.firestore_reads += 1
+        if cache_doc.exists:
+            cached_data = cache_doc.to_dict()
+            self.memory.set(cache_key, cached_data)
+            return cached_data
+        
+        self.memory.set(cache_key, None, ttl_seconds=self.negative_ttl)
+        return None
     
     async def create_topic_cache_key(self, primary_label: str) -> Optional[str]:
         """Create a cache key based on the primary topic/label"""
@@ -35,6 +67,14 @@ class CacheService:
         print(f"🔑 Created topic-based cache key: '{clean_topic}' from '{primary_label}'")
         return clean_topic
     
+    async def resolve_cache_key(self, primary_label: str) -> Optional[str]:
+        """Cache key for a label, reusing an existing key for plural, synonym or near-identical labels"""
+        literal_key = await self.create_topic_cache_key(primary_label)
+        if not literal_key:
+            return None
+        cache_key, _ = topic_index.resolve(primary_label, literal_key)
+        return cache_key
+    
     async def check_prediction_cache(self, tags: List[Dict], description: str) -> Optional[Dict]:
         """Check if we already have topics generated for this specific topic"""
         if not self.db or not tags:
@@ -43,7 +83,7 @@ class CacheService:
         try:
             # Get primary label from the current prediction
             primary_label = get_primary_label_from_tags(tags, description)
-            cache_key = await self.create_topic_cache_key(primary_label)
+            cache_key = await self.resolve_cache_key(primary_label)
             
             if not cache_key:
                 print("❌ Could not create cache key from primary label")
@@ -52,11 +92,9 @@ class CacheService:
             print(f"🔍 Checking prediction cache for topic: '{primary_label}' (key: '{cache_key}')")
             
             # Check if this topic already has cached results
-            cache_ref = self.db.collection("prediction_cache").document(cache_key)
-            cache_doc = cache_ref.get()
+            cached_data = await self.get_cached_prediction(cache_key)
             
-            if cache_doc.exists:
-                cached_data = cache_doc.to_dict()
+            if cached_data:
                 topic_count = len(cached_data.get('all_topics', []))
                 
                 print(f"🎯 ✅ CACHE HIT! Found cached topics for '{primary_label}':")
@@ -73,6 +111,29 @@ class CacheService:
             print(f"❌ Error checking prediction cache: {e}")
             return None
     
+    def _upsert_prediction(self, cache_ref, cache_data: Dict, description: str) -> bool:
+        """Create the entry, or merge the save into the existing one server-side; returns whether it was created.
+        
+        Existence is decided by the server (create fails with AlreadyExists). A re-save is a single merge
+        write: access_count incremented, the description unioned in, created_at left alone. Trimming the
+        descriptions is left to the maintenance compaction pass. At most two round trips, no read.
+        """
+        try:
+            cache_ref.create(cache_data)
+            return True
+        except AlreadyExists:
+            pass
+        
+        upsert = {field: value for field, value in cache_data.items() if field != "created_at"}
+        upsert["access_count"] = firestore.Increment(1)
+        upsert["examples"] = {"tag_combinations": cache_data["examples"]["tag_combinations"]}
+        if description:
+            upsert["examples"]["descriptions"] = firestore.ArrayUnion([description])
+        if "domain_topics" not in cache_data:
+            upsert["domain_topics"] = firestore.DELETE_FIELD
+        cache_ref.set(upsert, merge=True)
+        return False
+    
     async def save_prediction_to_cache(self, tags: List[Dict], description: str, 
                                      primary_label: str, all_topics: List[str], 
                                      domain_topics: Optional[Dict] = None) -> bool:
@@ -82,7 +143,7 @@ class CacheService:
             return False
         
         try:
-            cache_key = await self.create_topic_cache_key(primary_label)
+            cache_key = await self.resolve_cache_key(primary_label)
             
             if not cache_key:
                 print("❌ Could not create cache key, skipping cache save")
@@ -90,56 +151,58 @@ class CacheService:
             
             print(f"💾 Saving prediction cache for topic: '{primary_label}' (key: '{cache_key}')")
             
-            # Prepare cache data with topic-focused structure
+            now = datetime.now(timezone.utc).isoformat()
+            tags = sorted(tags, key=lambda tag: tag.get("confidence", 0), reverse=True)
             cache_data = {
                 "topic": primary_label,
                 "cache_key": cache_key,
                 "primary_label": primary_label,
                 "description_sample": description[:200] if description else "",
-                "tags": tags,
+                # Only the strongest tags are kept; nothing reads the full list back
+                "tags": tags[:settings.CACHE_COMPACT_MAX_TAGS],
                 "all_topics": all_topics,
                 "topic_count": len(all_topics),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "last_accessed": datetime.now(timezone.utc).isoformat(),
+                "created_at": now,
+                "last_accessed": now,
                 "access_count": 1,
                 "examples": {
                     "descriptions": [description] if description else [],
                     "tag_combinations": [tag.get("name") for tag in tags[:5]]
-                }
+                },
+                "has_structured_domains": bool(domain_topics)
             }
-            
-            # Add structured domain topics if available
             if domain_topics:
                 cache_data["domain_topics"] = domain_topics
-                cache_data["has_structured_domains"] = True
-            else:
-                cache_data["has_structured_domains"] = False
             
-            # Save to Firestore with topic as document ID
+            # What this worker last saw of the entry, for the statistics deltas of a re-save
+            previous = self.memory.get(cache_key)
             cache_ref = self.db.collection("prediction_cache").document(cache_key)
-            
-            # Check if document already exists to merge examples
-            existing_doc = cache_ref.get()
-            if existing_doc.exists:
-                # Update existing document with new examples
-                existing_data = existing_doc.to_dict()
-                
-                # Add new description to examples if different
-                existing_descriptions = existing_data.get("examples", {}).get("descriptions", [])
-                if description and description not in existing_descriptions:
-                    existing_descriptions.append(description)
-                    cache_data["examples"]["descriptions"] = existing_descriptions[:10]
-                
-                # Update access count
-                cache_data["access_count"] = existing_data.get("access_count", 0) + 1
-                cache_data["created_at"] = existing_data.get("created_at", cache_data["created_at"])
-                
-                print(f"🔄 Updating existing cache for '{primary_label}' (total accesses: {cache_data['access_count']})")
+            is_new = await asyncio.to_thread(self._upsert_prediction, cache_ref, cache_data, description)
+            entry = {
+                "cache_key": cache_key,
+                "topic": primary_label,
+                "topic_count": cache_data["topic_count"],
+                "created_at": now
+            }
+            if is_new:
+                print(f"🆕 Created new cache entry for '{primary_label}'")
+                # Write through the memory tier
+                self.memory.set(cache_key, cache_data)
+                entry["access_count"] = 1
+                topic_count_delta = cache_data["topic_count"]
             else:
-                print(f"🆕 Creating new cache entry for '{primary_label}'")
-            
-            # Save/update the document
-            cache_ref.set(cache_data)
+                print(f"🔄 Updated existing cache for '{primary_label}'")
+                # The merged document is only known to the server; the next read fetches it
+                self.memory.delete(cache_key)
+                del entry["created_at"]
+                if isinstance(previous, dict):
+                    entry["access_count"] = previous.get("access_count", 0) + 1
+                    topic_count_delta = cache_data["topic_count"] - previous.get("topic_count", 0)
+                else:
+                    # Unknown here; the periodic statistics rebuild corrects the total
+                    topic_count_delta = 0
+            topic_index.add(cache_key)
+            await cache_stats_service.record_save(entry, is_new=is_new, topic_count_delta=topic_count_delta)
             
             print(f"✅ Successfully cached {len(all_topics)} topics for '{primary_label}'")
             return True
@@ -154,22 +217,30 @@ class CacheService:
             return
         
         try:
-            cache_key = await self.create_topic_cache_key(primary_label)
+            cache_key = await self.resolve_cache_key(primary_label)
             if not cache_key:
                 return
             
-            cache_ref = self.db.collection("prediction_cache").document(cache_key)
-            
-            # Check if document exists first
-            cache_doc = cache_ref.get()
-            if cache_doc.exists:
-                cache_ref.update({
-                    "last_accessed": datetime.now(timezone.utc).isoformat(),
-                    "access_count": firestore.Increment(1)
-                })
-                print(f"📊 Updated access count for topic: '{primary_label}'")
-            else:
+            now = datetime.now(timezone.utc).isoformat()
+            cached_data = self.memory.get(cache_key, _UNCACHED)
+            if cached_data is None:
                 print(f"⚠️ Cache document for '{primary_label}' not found, cannot update access")
+                return
+            
+            info = None
+            if isinstance(cached_data, dict):
+                cached_data["last_accessed"] = now
+                cached_data["access_count"] = cached_data.get("access_count", 0) + 1
+                info = {
+                    "topic": cached_data.get("topic", primary_label),
+                    "access_count": cached_data["access_count"],
+                    "topic_count": cached_data.get("topic_count", 0),
+                    "created_at": cached_data.get("created_at", "")
+                }
+            
+            # Counted in memory and written behind in batches, off the request path
+            access_aggregator.record(cache_key, info)
+            print(f"📊 Recorded access for topic: '{primary_label}'")
                 
         except Exception as e:
             print(f"⚠️ Could not update cache access for '{primary_label}': {e}")
@@ -180,85 +251,52 @@ class CacheService:
             return {"total_cached": 0, "error": "Firebase not available"}
         
         try:
-            cache_collection = self.db.collection("prediction_cache")
-            docs = cache_collection.stream()
-            
-            stats = {
-                "total_cached_topics": 0,
-                "total_generated_topics": 0,
-                "total_cache_hits": 0,
-                "most_popular_topics": [],
-                "recent_topics": []
-            }
-            
-            topic_popularity = []
-            
-            for doc in docs:
-                data = doc.to_dict()
-                topic_name = data.get("topic", doc.id)
-                access_count = data.get("access_count", 0)
-                topic_count = data.get("topic_count", 0)
-                created_at = data.get("created_at", "")
-                
-                stats["total_cached_topics"] += 1
-                stats["total_generated_topics"] += topic_count
-                stats["total_cache_hits"] += access_count
-                
-                topic_popularity.append({
-                    "topic": topic_name,
-                    "access_count": access_count,
-                    "topic_count": topic_count,
-                    "created_at": created_at
-                })
-            
-            # Sort and get top 5 most popular topics
-            topic_popularity.sort(key=lambda x: x["access_count"], reverse=True)
-            stats["most_popular_topics"] = topic_popularity[:5]
-            
-            # Sort by creation date for recent topics
-            topic_popularity.sort(key=lambda x: x["created_at"], reverse=True)
-            stats["recent_topics"] = topic_popularity[:5]
-            
-            # Calculate averages
-            if stats["total_cached_topics"] > 0:
-                stats["average_topics_per_cache"] = round(stats["total_generated_topics"] / stats["total_cached_topics"], 2)
-                stats["average_access_per_topic"] = round(stats["total_cache_hits"] / stats["total_cached_topics"], 2)
-            else:
-                stats["average_topics_per_cache"] = 0
-                stats["average_access_per_topic"] = 0
-            
+            # Incrementally maintained counters; no collection scan
+            stats = await cache_stats_service.get_statistics()
+            stats["memory_tier"] = {**self.memory.stats(), "firestore_reads": self.firestore_reads}
+            stats["access_write_behind"] = access_aggregator.get_stats()
+            stats["topic_index"] = topic_index.get_stats()
             return stats
             
         except Exception as e:
             return {"error": str(e)}
     
-    async def clear_cache(self) -> Dict:
-        """Clear all prediction cache"""
+    async def clear_cache(self, prefix: Optional[str] = None, older_than_days: Optional[float] = None) -> Dict:
+        """Start a background bulk delete of the prediction cache, optionally by key prefix or age"""
         if not self.db:
             return {"success": False, "error": "Firebase not available"}
         
         try:
             print("🧹 Clearing prediction cache...")
-            
-            cache_collection = self.db.collection("prediction_cache")
-            docs = cache_collection.stream()
-            
-            deleted_count = 0
-            for doc in docs:
-                doc.reference.delete()
-                deleted_count += 1
-            
-            print(f"✅ Cleared {deleted_count} cached predictions")
+            job = bulk_delete_service.start(
+                "prediction_cache", prefix=prefix, older_than_days=older_than_days,
+                on_complete=self._after_clear
+            )
             
             return {
                 "success": True,
-                "deleted_count": deleted_count,
-                "message": f"Successfully cleared {deleted_count} cached predictions"
+                "job_id": job.id,
+                "message": f"Clearing cached predictions in the background (job {job.id})"
             }
             
         except Exception as e:
             print(f"❌ Error clearing cache: {e}")
             return {"success": False, "error": str(e)}
+    
+    async def _after_clear(self, job):
+        """Drop memory entries, update the topic index and recount statistics once a clear job finishes"""
+        self.memory.clear()
+        if not job.prefix and job.older_than_days is None:
+            topic_index.clear()
+        elif job.older_than_days is None:
+            topic_index.remove_prefix(job.prefix)
+        else:
+            # Which entries were old enough is only known from Firestore; reload swaps in the new index
+            await topic_index.load()
+        await cache_stats_service.rebuild()
+        for listener in self.clear_listeners:
+            await listener()
+        print(f"✅ Cleared {job.deleted} cached predictions")
 
 # Create global instance
 cache_service = CacheService()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from functools import partial
+from typing import Dict, Optional
+from firebase_admin import firestore
+from config.firebase_config import db
+from config.settings import settings
+from services.cache_service import cache_service
+from services.topic_index import topic_index
+
+print = partial(print, flush=True)
+
+class CacheSnapshotService:
+    """Local sqlite snapshot of the most accessed prediction_cache entries.
+
+    Workers dump it periodically and load it at startup, so a fresh worker serves hot topics
+    from its memory tier instead of sending the first wave of requests to Firestore.
+    """
+
+    def __init__(self):
+        self.db = db
+        self.enabled = settings.CACHE_SNAPSHOT_ENABLED
+        self.path = settings.CACHE_SNAPSHOT_PATH
+        self.top_n = settings.CACHE_SNAPSHOT_TOP_N
+        self.max_age = settings.CACHE_SNAPSHOT_MAX_AGE_HOURS * 3600
+        self.interval = settings.CACHE_SNAPSHOT_INTERVAL_MINUTES * 60
+        self._task: Optional[asyncio.Task] = None
+        self.last_load: Optional[Dict] = None
+        self.last_dump: Optional[Dict] = None
+        cache_service.clear_listeners.append(self.invalidate)
+
+    def age(self) -> Optional[float]:
+        """Seconds since the snapshot file was written, None when there is none"""
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _dump(self) -> Dict:
+        start = time.perf_counter()
+        docs = (self.db.collection("prediction_cache")
+                .order_by("access_count", direction=firestore.Query.DESCENDING)
+                .limit(self.top_n)
+                .stream())
+        rows = [(doc.id, json.dumps(doc.to_dict(), default=str)) for doc in docs]
+
+        # Written next to the live file and swapped in, so concurrent loads never see a partial snapshot
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        # A leftover from a failed dump (or a reused PID) would make CREATE TABLE fail
+        self._remove(temp_path)
+        try:
+            conn = sqlite3.connect(temp_path)
+            try:
+                conn.execute("CREATE TABLE prediction_cache (cache_key TEXT PRIMARY KEY, data TEXT NOT NULL)")
+                conn.executemany("INSERT INTO prediction_cache VALUES (?, ?)", rows)
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(temp_path, self.path)
+        except Exception:
+            self._remove(temp_path)
+            raise
+
+        return {
+            "entries": len(rows),
+            "bytes": os.path.getsize(self.path),
+            "dump_seconds": round(time.perf_counter() - start, 3)
+        }
+
+    async def dump(self) -> Dict:
+        """Write the top-N entries by access count to the snapshot file"""
+        if not self.enabled or not self.db:
+            return {"success": False, "error": "Snapshot disabled or Firebase not available"}
+        self.last_dump = await asyncio.to_thread(self._dump)
+        print(f"📸 Prediction cache snapshot: {self.last_dump['entries']} entries ({self.last_dump['bytes']} bytes)")
+        return {"success": True, **self.last_dump}
+
+    async def invalidate(self):
+        """Replace the snapshot after a cache clear so no worker warms up with deleted entries"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._remove, self.path)
+        if self.db:
+            try:
+                await self.dump()
+            except Exception as e:
+                print(f"⚠️ Prediction cache snapshot failed: {e}")
+
+    def _load(self) -> int:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT cache_key, data FROM prediction_cache").fetchall()
+        finally:
+            conn.close()
+        for cache_key, data in rows:
+            cache_service.memory.set(cache_key, json.loads(data))
+            topic_index.add(cache_key)
+        return len(rows)
+
+    async def load(self) -> Optional[Dict]:
+        """Seed the prediction cache memory tier from the snapshot when it is recent enough"""
+        age = self.age()
+        if not self.enabled or age is None:
+            return None
+        if self.max_age and age > self.max_age:
+            print(f"⚠️ Prediction cache snapshot is {age / 3600:.1f}h old, not loading it")
+            return None
+
+        start = time.perf_counter()
+        try:
+            entries = await asyncio.to_thread(self._load)
+        except Exception as e:
+            print(f"⚠️ Could not load prediction cache snapshot: {e}")
+            return None
+        self.last_load = {
+            "entries": entries,
+            "snapshot_age_seconds": round(age),
+            "load_seconds": round(time.perf_counter() - start, 3)
+        }
+        print(f"📸 Loaded {entries} cached topics from snapshot in {self.last_load['load_seconds']}s")
+        return self.last_load
+
+    async def _dump_loop(self):
+        while True:
+            age = self.age()
+            # Only when missing or stale; another worker may have just written it
+            if age is None or age >= self.interval:
+                try:
+                    await self.dump()
+                except Exception as e:
+                    print(f"⚠️ Prediction cache snapshot failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start periodic snapshots (disabled when the interval is 0)"""
+        if self._task is None and self.enabled and self.interval and self.db:
+            self._task = asyncio.create_task(self._dump_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        age = self.age()
+        return {
+            "enabled": self.enabled,
+            "top_n": self.top_n,
+            "snapshot_age_seconds": round(age) if age is not None else None,
+            "last_load": self.last_load,
+            "last_dump": self.last_dump
+        }
+
+# Create global instance
+cache_snapshot_service = CacheSnapshotService()
@@ -0,0 +1,218 @@
+import asyncio
+import random
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from firebase_admin import firestore
+from config.firebase_config import db
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+COUNTERS = ("total_cached_topics", "total_generated_topics", "total_cache_hits")
+
+def merge_top_k(entries: List[Dict], updates: List[Dict], sort_field: str, k: int) -> List[Dict]:
+    """Merge updated topic entries into a top-K list keyed by cache_key"""
+    by_key = {entry["cache_key"]: entry for entry in entries}
+    for update in updates:
+        by_key[update["cache_key"]] = {**by_key.get(update["cache_key"], {}), **update}
+    missing = "" if sort_field == "created_at" else 0
+    return sorted(by_key.values(), key=lambda entry: entry.get(sort_field) or missing, reverse=True)[:k]
+
+def public_topic(entry: Dict) -> Dict:
+    """A top-K entry as /cache-stats reports it; cache_key is only the merge key"""
+    return {name: value for name, value in entry.items() if name != "cache_key"}
+
+class CacheStatsService:
+    """Prediction cache statistics kept up to date incrementally instead of scanning the collection.
+
+    Totals live in sharded counter documents (cache_meta/prediction_stats/shards/*) so concurrent
+    updates do not contend on one document; the most popular and most recent topics are bounded
+    top-K lists on cache_meta/prediction_stats. rebuild() recomputes everything from a full scan.
+    """
+
+    def __init__(self):
+        self.db = db
+        self.shards = settings.CACHE_STATS_SHARDS
+        self.top_k = settings.CACHE_STATS_TOP_K
+        self.reconcile_interval = settings.CACHE_STATS_RECONCILE_HOURS * 3600
+        self._rebuild_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_rebuild: Optional[Dict] = None
+
+    def _meta_ref(self):
+        return self.db.collection("cache_meta").document("prediction_stats")
+
+    def _increment(self, **deltas):
+        """Add to the counters on one randomly chosen shard"""
+        deltas = {name: firestore.Increment(value) for name, value in deltas.items() if value}
+        if deltas:
+            shard_ref = self._meta_ref().collection("shards").document(str(random.randrange(self.shards)))
+            shard_ref.set(deltas, merge=True)
+
+    def _update_top_k(self, lists: Dict[str, Tuple[str, Callable[[List[Dict]], List[Dict]]]]):
+        """Merge entries into top-K lists in one transaction on the meta document.
+
+        lists maps each list field to (sort field, build_updates); build_updates sees that list's current entries.
+        """
+        meta_ref = self._meta_ref()
+
+        @firestore.transactional
+        def merge(transaction):
+            snapshot = meta_ref.get(transaction=transaction)
+            data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            merged = {}
+            for field, (sort_field, build_updates) in lists.items():
+                current = data.get(field, [])
+                updates = build_updates(current)
+                if updates:
+                    merged[field] = merge_top_k(current, updates, sort_field, self.top_k)
+            if merged:
+                transaction.set(meta_ref, merged, merge=True)
+
+        merge(self.db.transaction())
+
+    def _record_save(self, entry: Dict, is_new: bool, topic_count_delta: int):
+        # Every save adds one to the document's access_count, which total_cache_hits sums
+        self._increment(total_cached_topics=1 if is_new else 0, total_generated_topics=topic_count_delta,
+                        total_cache_hits=1)
+
+        def build_updates(current: List[Dict]) -> List[Dict]:
+            ranked = next((ranked for ranked in current if ranked["cache_key"] == entry["cache_key"]), None)
+            if ranked is not None:
+                return [{**ranked, **entry, "access_count": ranked.get("access_count", 0) + 1}]
+            # A re-save whose absolute access_count this worker does not know cannot be ranked yet
+            return [entry] if "access_count" in entry else []
+
+        # Both lists in one transaction, so a save touches the meta document once
+        lists = {"most_popular_topics": ("access_count", build_updates)}
+        if is_new:
+            lists["recent_topics"] = ("created_at", lambda current: [entry])
+        self._update_top_k(lists)
+
+    def _record_hits(self, hits: List[Dict]):
+        """hits: [{"cache_key", "count", "info"}] where info carries the topic's absolute access_count when known"""
+        self._increment(total_cache_hits=sum(hit["count"] for hit in hits))
+
+        def build_updates(current: List[Dict]) -> List[Dict]:
+            popular = {entry["cache_key"]: entry for entry in current}
+            updates = []
+            for hit in hits:
+                info = hit.get("info") or {}
+                if hit["cache_key"] in popular:
+                    entry = popular[hit["cache_key"]]
+                    updates.append({**entry, "access_count": entry.get("access_count", 0) + hit["count"]})
+                elif "access_count" in info:
+                    # Not ranked yet: use the absolute count seen when the hit was served
+                    updates.append({"cache_key": hit["cache_key"], **info})
+            return updates
+
+        self._update_top_k({"most_popular_topics": ("access_count", build_updates)})
+
+    async def record_save(self, entry: Dict, is_new: bool, topic_count_delta: int):
+        """Account for a saved prediction_cache document"""
+        if not self.db:
+            return
+        try:
+            await asyncio.to_thread(self._record_save, entry, is_new, topic_count_delta)
+        except Exception as e:
+            print(f"⚠️ Could not update cache statistics: {e}")
+
+    def record_hits(self, hits: List[Dict]):
+        """Account for flushed access counts (called from the write-behind worker thread)"""
+        if not self.db or not hits:
+            return
+        try:
+            self._record_hits(hits)
+        except Exception as e:
+            print(f"⚠️ Could not update cache statistics: {e}")
+
+    def _read(self) -> Optional[Dict]:
+        meta = self._meta_ref().get()
+        if not meta.exists:
+            return None
+
+        totals = dict.fromkeys(COUNTERS, 0)
+        for shard in self._meta_ref().collection("shards").stream():
+            for name, value in (shard.to_dict() or {}).items():
+                if name in totals:
+                    totals[name] += value
+        meta_data = meta.to_dict()
+        return {
+            **totals,
+            "most_popular_topics": [public_topic(entry) for entry in meta_data.get("most_popular_topics", [])[:5]],
+            "recent_topics": [public_topic(entry) for entry in meta_data.get("recent_topics", [])[:5]],
+            "rebuilt_at": meta_data.get("rebuilt_at")
+        }
+
+    async def get_statistics(self) -> Dict:
+        """Totals and top topics at constant cost (1 + shard count reads); rebuilds once if never built"""
+        stats = await asyncio.to_thread(self._read)
+        if stats is None:
+            await self.rebuild()
+            stats = await asyncio.to_thread(self._read) or dict.fromkeys(COUNTERS, 0)
+
+        cached = stats.get("total_cached_topics", 0)
+        stats["average_topics_per_cache"] = round(stats["total_generated_topics"] / cached, 2) if cached else 0
+        stats["average_access_per_topic"] = round(stats["total_cache_hits"] / cached, 2) if cached else 0
+        return stats
+
+    def _rebuild(self) -> Dict:
+        totals = dict.fromkeys(COUNTERS, 0)
+        topics = []
+        for doc in self.db.collection("prediction_cache").stream():
+            data = doc.to_dict()
+            totals["total_cached_topics"] += 1
+            totals["total_generated_topics"] += data.get("topic_count", 0)
+            totals["total_cache_hits"] += data.get("access_count", 0)
+            topics.append({
+                "cache_key": doc.id,
+                "topic": data.get("topic", doc.id),
+                "access_count": data.get("access_count", 0),
+                "topic_count": data.get("topic_count", 0),
+                "created_at": data.get("created_at", "")
+            })
+
+        batch = self.db.batch()
+        shards_ref = self._meta_ref().collection("shards")
+        for shard in range(self.shards):
+            batch.set(shards_ref.document(str(shard)), totals if shard == 0 else dict.fromkeys(COUNTERS, 0))
+        batch.set(self._meta_ref(), {
+            "most_popular_topics": merge_top_k([], topics, "access_count", self.top_k),
+            "recent_topics": merge_top_k([], topics, "created_at", self.top_k),
+            "rebuilt_at": firestore.SERVER_TIMESTAMP
+        })
+        batch.commit()
+        return totals
+
+    async def rebuild(self) -> Dict:
+        """Recompute counters and top-K lists from a full scan of prediction_cache"""
+        if not self.db:
+            return {"success": False, "error": "Firebase not available"}
+
+        async with self._rebuild_lock:
+            print("🧮 Rebuilding cache statistics from prediction_cache...")
+            totals = await asyncio.to_thread(self._rebuild)
+            self.last_rebuild = totals
+            print(f"✅ Cache statistics rebuilt: {totals['total_cached_topics']} topics")
+            return {"success": True, **totals}
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"⚠️ Cache statistics reconciliation failed: {e}")
+
+    def start(self):
+        """Start periodic reconciliation (disabled when the interval is 0)"""
+        if self._task is None and self.reconcile_interval and self.db:
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+# Create global instance
+cache_stats_service = CacheStatsService()
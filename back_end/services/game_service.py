@@ -1,13 +1,25 @@
+import asyncio
 import uuid
 import base64
+import io
 from datetime import datetime, timezone
 from config.firebase_config import db, bucket
-from services.llama_service import llama_service
-from typing import Dict, List, Optional
+from config.settings import settings
+from services.llama_service import llama_service, GAME_KEYS
+from services.single_flight import single_flight
+from services.resource_governor import resource_governor
+from services.model_lifecycle import model_lifecycle
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from functools import partial
 
 print = partial(print, flush=True)
 
+def encode_preview(image) -> str:
+    """Small JPEG data URL for a preview frame"""
+    buffered = io.BytesIO()
+    image.convert("RGB").save(buffered, format="JPEG", quality=settings.PREVIEW_JPEG_QUALITY)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+
 class GameService:
     def __init__(self):
         self.db = db
@@ -166,6 +178,35 @@ class GameService:
             traceback.print_exc()
             return False
     
+    async def generate_gallery_images(self, gallery_game: Dict, topic: str,
+                                      progress_callback: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Generate the gallery images from the game's image prompts (empty list when unavailable).
+        
+        progress_callback receives tiny-VAE preview frames from the diffusion worker thread.
+        """
+        if "image_prompts" not in gallery_game:
+            return []
+        
+        try:
+            from image_generation_service import image_service
+        except ImportError:
+            print("❌ Image generation service not available")
+            return []
+        
+        print(f"🎨 Generating images for gallery game...")
+        prompts = gallery_game["image_prompts"]
+        image_result = await resource_governor.run(
+            "diffusion", model_lifecycle.call, "diffusion",
+            image_service.generate_images_from_prompts, prompts, topic, progress_callback=progress_callback
+        )
+        
+        if image_result.get("success") and image_result.get("images"):
+            print(f"✅ Generated {len(image_result['images'])} images")
+            return image_result["images"]
+        
+        print(f"❌ Image generation failed: {image_result.get('error', 'Unknown error')}")
+        return []
+    
     async def generate_games_with_images(self, topic: str, age_group: str, 
                                        domain: str = None, tags: List[str] = None) -> Dict:
         """Generate games and images for a topic"""
@@ -186,25 +227,35 @@ class GameService:
                 "source": "firebase_existing"
             }
         
+        # Concurrent duplicates (same normalized topic/age/domain/tags) share one generation
+        key = single_flight.make_key(topic, age_group, domain, tags)
+        async with single_flight.lead(key, lambda: self._poll_generated_games(topic, age_group)) as flight:
+            if not flight.shared:
+                flight.set_result(await self._generate_and_save_games(topic, age_group, domain, tags))
+        
+        return {**flight.result, "coalesced": flight.shared}
+    
+    async def _poll_generated_games(self, topic: str, age_group: str) -> Optional[Dict]:
+        """Return another worker's finished games once all game types are saved"""
+        games_exist, existing_games = await self.check_games_exist_in_firebase(topic, age_group)
+        if not games_exist or not all(game_type in existing_games for game_type in GAME_KEYS):
+            return None
+        
+        return {
+            "success": True,
+            "games": existing_games,
+            "images": existing_games.get("gallery", {}).get("images", []),
+            "source": "firebase_existing"
+        }
+    
+    async def _generate_and_save_games(self, topic: str, age_group: str,
+                                       domain: str = None, tags: List[str] = None) -> Dict:
+        """Generate games and images, save them and return the endpoint result"""
         # Generate new games using LLaMA service
-        games_data = llama_service.generate_games(topic, age_group, tags, domain)
+        games_data = await llama_service.generate_games_async(topic, age_group, tags, domain)
         
         # Generate images if available
-        images_data = []
-        try:
-            from image_generation_service import image_service
-            if "gallery" in games_data and "image_prompts" in games_data["gallery"]:
-                print(f"🎨 Generating images for gallery game...")
-                prompts = games_data["gallery"]["image_prompts"]
-                image_result = image_service.generate_images_from_prompts(prompts, topic)
-                
-                if image_result.get("success") and image_result.get("images"):
-                    images_data = image_result["images"]
-                    print(f"✅ Generated {len(images_data)} images")
-                else:
-                    print(f"❌ Image generation failed: {image_result.get('error', 'Unknown error')}")
-        except ImportError:
-            print("❌ Image generation service not available")
+        images_data = await self.generate_gallery_images(games_data.get("gallery", {}), topic)
         
         # Save games to Firebase
         saved = await self.save_games_to_firebase(topic, age_group, games_data, images_data, domain, tags)
@@ -223,5 +274,85 @@ class GameService:
             "source": "generated_new"
         }
 
+    async def stream_games_with_images(self, topic: str, age_group: str,
+                                       domain: str = None, tags: List[str] = None) -> AsyncIterator[Dict]:
+        """Generate games and images, yielding each game as soon as it is available.
+        
+        Events: {"type": "game"}, {"type": "preview"} with tiny-VAE frames while the gallery images
+        are denoised, then {"type": "images"} once they are ready, and a final {"type": "done"}.
+        Image generation starts as soon as the gallery game arrives, while the quiz is still being generated.
+        """
+        games_exist, existing_games = await self.check_games_exist_in_firebase(topic, age_group, domain, tags)
+        
+        if games_exist:
+            print("✅ Games already exist, streaming from Firebase")
+            for game_type, game in existing_games.items():
+                yield {"type": "game", "game_type": game_type, "game": game}
+            
+            gallery_images = existing_games.get("gallery", {}).get("images", [])
+            yield {"type": "done", "images": gallery_images, "source": "firebase_existing"}
+            return
+        
+        key = single_flight.make_key(topic, age_group, domain, tags)
+        async with single_flight.lead(key, lambda: self._poll_generated_games(topic, age_group)) as flight:
+            if flight.shared:
+                for game_type, game in flight.result["games"].items():
+                    yield {"type": "game", "game_type": game_type, "game": game}
+                yield {"type": "done", "images": flight.result.get("images", []),
+                       "source": flight.result.get("source"), "coalesced": True}
+                return
+            
+            games_data = {}
+            image_task = None
+            # Preview frames arrive from the diffusion worker thread
+            loop = asyncio.get_running_loop()
+            previews: asyncio.Queue = asyncio.Queue()
+            
+            def on_preview(progress: Dict):
+                event = {
+                    "type": "preview",
+                    "step": progress["step"],
+                    "total_steps": progress["total_steps"],
+                    "previews": [encode_preview(image) for image in progress["previews"]]
+                }
+                loop.call_soon_threadsafe(previews.put_nowait, event)
+            
+            async for game_type, game in llama_service.stream_games_async(topic, age_group, tags, domain):
+                games_data[game_type] = game
+                yield {"type": "game", "game_type": game_type, "game": game}
+                
+                if game_type == "gallery" and image_task is None:
+                    image_task = asyncio.create_task(self.generate_gallery_images(game, topic, on_preview))
+            
+            if image_task:
+                # Forward preview frames until the final images are decoded
+                while not image_task.done() or not previews.empty():
+                    next_preview = asyncio.ensure_future(previews.get())
+                    await asyncio.wait({next_preview, image_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if next_preview.done():
+                        yield next_preview.result()
+                    else:
+                        next_preview.cancel()
+            
+            images_data = await image_task if image_task else []
+            if images_data:
+                yield {"type": "images", "images": images_data, "source": "generated"}
+            
+            saved = await self.save_games_to_firebase(topic, age_group, games_data, images_data, domain, tags)
+            
+            _, updated_games = await self.check_games_exist_in_firebase(topic, age_group)
+            final_images = []
+            if updated_games and "gallery" in updated_games and "images" in updated_games["gallery"]:
+                final_images = updated_games["gallery"]["images"]
+            
+            flight.set_result({
+                "success": True,
+                "games": games_data,
+                "images": final_images,
+                "saved_games": saved,
+                "source": "generated_new"
+            })
+            yield {"type": "done", "images": final_images, "saved_games": saved, "source": "generated_new"}
+
 # Create global instance
 game_service = GameService()
\ No newline at end of file
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple
+from config.settings import settings
+from services.resource_governor import resource_governor
+from utils.ttl_cache import TTLCache
+
+print = partial(print, flush=True)
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+HASH_SIZE = 16  # 16x16 gradients = 256-bit dHash; 8x8 is too coarse for sparse line drawings
+BANDS = 16  # 256-bit hash split into 16-bit bands for near-duplicate candidate lookup
+INK_SIZE = 32  # Side of the thumbnail whose dark pixels are compared before a perceptual hit
+INK_THRESHOLD = 230  # Thumbnail pixels darker than this count as ink (thin strokes get averaged out)
+
+def _grayscale(image_data: bytes):
+    image = Image.open(io.BytesIO(image_data))
+    if image.format == "JPEG":
+        image.draft("L", (128, 128))
+    return image.convert("L")
+
+def difference_hash(image) -> int:
+    """256-bit dHash: sign of horizontal gradients on a 17x16 grayscale thumbnail"""
+    pixels = list(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            index = row * (HASH_SIZE + 1) + col
+            value = (value << 1) | (pixels[index] > pixels[index + 1])
+    return value
+
+def ink_mask(image) -> int:
+    """Bitmask of the dark cells of a 32x32 box-filtered thumbnail"""
+    value = 0
+    for pixel in image.resize((INK_SIZE, INK_SIZE), Image.BOX).getdata():
+        value = (value << 1) | (pixel < INK_THRESHOLD)
+    return value
+
+def ink_overlap(a: int, b: int) -> float:
+    """Intersection over union of two ink masks (1.0 when both are blank)"""
+    union = bin(a | b).count("1")
+    return bin(a & b).count("1") / union if union else 1.0
+
+def fingerprint(image_data: bytes) -> Tuple[str, Optional[int], Optional[int]]:
+    """(sha256, dHash, ink mask) of an upload; the perceptual parts are None when the image cannot be decoded"""
+    digest = hashlib.sha256(image_data).hexdigest()
+    if not PIL_AVAILABLE:
+        return digest, None, None
+    try:
+        image = _grayscale(image_data)
+        return digest, difference_hash(image), ink_mask(image)
+    except Exception:
+        return digest, None, None
+
+def bands(dhash: int) -> List[Tuple[int, int]]:
+    return [(band, (dhash >> (16 * band)) & 0xFFFF) for band in range(BANDS)]
+
+class ImageAnalysisCache:
+    """Caches Azure Vision results by image: exact sha256 first, then perceptual dHash within a Hamming tolerance.
+
+    Memory LRU in front of a sqlite tier. All known hashes are indexed in memory by 16-bit band,
+    so near-duplicate lookups only compare against images sharing a band. A perceptual candidate
+    only counts as a hit when its ink mask also overlaps enough, since different simple drawings
+    on white can still have close hashes and would otherwise get each other's tags.
+    """
+
+    def __init__(self):
+        self.enabled = settings.IMAGE_ANALYSIS_CACHE_ENABLED
+        self.max_distance = settings.IMAGE_ANALYSIS_HAMMING_TOLERANCE
+        self.min_ink_overlap = settings.IMAGE_ANALYSIS_MIN_INK_OVERLAP
+        self.max_entries = settings.IMAGE_ANALYSIS_CACHE_MAX_ENTRIES
+        self.memory = TTLCache(settings.IMAGE_ANALYSIS_CACHE_MEMORY_ENTRIES, 0)
+        self.hashes: Dict[str, int] = {}
+        self.inks: Dict[str, int] = {}
+        self.band_index: Dict[Tuple[int, int], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.conn = None
+        self.stats = {"lookups": 0, "exact_hits": 0, "perceptual_hits": 0, "perceptual_rejections": 0,
+                      "misses": 0, "stores": 0, "evictions": 0}
+
+        if self.enabled:
+            self._open()
+
+    def _open(self):
+        path = settings.IMAGE_ANALYSIS_CACHE_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_analysis (
+                sha256 TEXT PRIMARY KEY,
+                dhash TEXT,
+                azure_result TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                description TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_image_analysis_last_used ON image_analysis (last_used)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(image_analysis)")}
+        if "ink" not in columns:
+            self.conn.execute("ALTER TABLE image_analysis ADD COLUMN ink TEXT")
+        self.conn.commit()
+
+        # Rows from the earlier 64-bit hash have no ink mask; they still serve exact matches
+        for digest, dhash, ink in self.conn.execute(
+            "SELECT sha256, dhash, ink FROM image_analysis WHERE dhash IS NOT NULL AND ink IS NOT NULL"
+        ):
+            self._index(digest, int(dhash, 16), int(ink, 16))
+        print(f"🖼️ Image analysis cache: {len(self.hashes)} fingerprints loaded")
+
+    def _index(self, digest: str, dhash: int, ink: int):
+        self.hashes[digest] = dhash
+        self.inks[digest] = ink
+        for band in bands(dhash):
+            self.band_index.setdefault(band, set()).add(digest)
+
+    def _unindex(self, digest: str):
+        dhash = self.hashes.pop(digest, None)
+        self.inks.pop(digest, None)
+        if dhash is None:
+            return
+        for band in bands(dhash):
+            members = self.band_index.get(band)
+            if members:
+                members.discard(digest)
+                if not members:
+                    del self.band_index[band]
+
+    def _nearest(self, dhash: int, ink: int) -> Optional[str]:
+        """Closest stored image within the Hamming tolerance whose ink mask also overlaps enough"""
+        if self.max_distance < BANDS:
+            # Pigeonhole: hashes differing in fewer than BANDS bits share at least one exact band
+            candidates = set()
+            for band in bands(dhash):
+                candidates |= self.band_index.get(band, set())
+        else:
+            candidates = self.hashes.keys()
+
+        within = []
+        for digest in candidates:
+            distance = bin(self.hashes[digest] ^ dhash).count("1")
+            if distance <= self.max_distance:
+                within.append((distance, digest))
+
+        for _, digest in sorted(within):
+            if ink_overlap(self.inks[digest], ink) >= self.min_ink_overlap:
+                return digest
+            self.stats["perceptual_rejections"] += 1
+        return None
+
+    def _load(self, digest: str) -> Optional[Dict]:
+        entry = self.memory.get(digest)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT azure_result, tags, description FROM image_analysis WHERE sha256 = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE image_analysis SET last_used = ? WHERE sha256 = ?", (time.time(), digest))
+            self.conn.commit()
+
+        entry = {"azure_result": json.loads(row[0]), "tags": json.loads(row[1]), "description": row[2]}
+        self.memory.set(digest, entry)
+        return entry
+
+    def _lookup(self, digest: str, dhash: Optional[int], ink: Optional[int]) -> Optional[Dict]:
+        entry = self._load(digest)
+        if entry is not None:
+            self.stats["exact_hits"] += 1
+            return {**entry, "match": "exact"}
+
+        if dhash is not None and ink is not None:
+            with self._lock:
+                near = self._nearest(dhash, ink)
+            entry = self._load(near) if near else None
+            if entry is not None:
+                self.stats["perceptual_hits"] += 1
+                return {**entry, "match": "perceptual"}
+
+        self.stats["misses"] += 1
+        return None
+
+    def _store(self, digest: str, dhash: Optional[int], ink: Optional[int], azure_result: Dict,
+               tags: List[Dict], description: str):
+        now = time.time()
+        perceptual = dhash is not None and ink is not None
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO image_analysis (sha256, dhash, azure_result, tags, description, created_at, last_used, ink) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, f"{dhash:064x}" if perceptual else None,
+                 json.dumps(azure_result), json.dumps(tags), description, now, now,
+                 f"{ink:0{INK_SIZE * INK_SIZE // 4}x}" if perceptual else None)
+            )
+            overflow = self.conn.execute("SELECT COUNT(*) FROM image_analysis").fetchone()[0] - self.max_entries
+            evicted = []
+            if overflow > 0:
+                evicted = [row[0] for row in self.conn.execute(
+                    "SELECT sha256 FROM image_analysis ORDER BY last_used LIMIT ?", (overflow,)
+                )]
+                self.conn.executemany("DELETE FROM image_analysis WHERE sha256 = ?", [(d,) for d in evicted])
+            self.conn.commit()
+
+            for old_digest in evicted:
+                self._unindex(old_digest)
+                self.memory.delete(old_digest)
+            if perceptual:
+                self._index(digest, dhash, ink)
+
+        self.stats["evictions"] += len(evicted)
+        self.stats["stores"] += 1
+        self.memory.set(digest, {"azure_result": azure_result, "tags": tags, "description": description})
+
+    async def fingerprint(self, image_data: bytes) -> Tuple[str, Optional[int], Optional[int]]:
+        """Hash an upload on the image worker"""
+        return await resource_governor.run("image", fingerprint, image_data)
+
+    async def lookup(self, image_fingerprint: Tuple[str, Optional[int], Optional[int]]) -> Optional[Dict]:
+        """Cached {azure_result, tags, description, match} for this image or a near duplicate"""
+        if not self.enabled:
+            return None
+        self.stats["lookups"] += 1
+        return await asyncio.to_thread(self._lookup, *image_fingerprint)
+
+    async def store(self, image_fingerprint: Tuple[str, Optional[int], Optional[int]], azure_result: Dict,
+                    tags: List[Dict], description: str):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._store, *image_fingerprint, azure_result, tags, description)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not store image analysis: {e}")
+
+    def get_stats(self) -> Dict:
+        hits = self.stats["exact_hits"] + self.stats["perceptual_hits"]
+        return {
+            "enabled": self.enabled,
+            "hamming_tolerance": self.max_distance,
+            "min_ink_overlap": self.min_ink_overlap,
+            "fingerprints": len(self.hashes),
+            **self.stats,
+            "hit_rate": round(hits / self.stats["lookups"], 3) if self.stats["lookups"] else None,
+            "memory": self.memory.stats()
+        }
+
+# Create global instance
+image_analysis_cache = ImageAnalysisCache()
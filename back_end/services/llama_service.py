@@ -1,93 +1,444 @@
-from openai import OpenAI
+import asyncio
+import hashlib
 from config.settings import settings
-from utils.helpers import extract_json_from_response
-from typing import List, Dict, Optional
+from utils.helpers import extract_json_from_response, IncrementalJSONObjectParser
+from services.llm_cache import llm_cache
+from services.llm_providers import llm_providers
+from services.resilience import resilience_service
+from services.llm_scheduler import llm_scheduler
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from functools import partial
 
 print = partial(print, flush=True)
 
+GAME_KEYS = ["spelling", "drawing", "gallery", "quiz"]
+
+# Split-generation sections: the games each call produces and its response budget
+GAME_SECTIONS = {
+    "words": {"games": ["spelling", "drawing"], "max_tokens": 200},
+    "gallery": {"games": ["gallery"], "max_tokens": 400},
+    "quiz": {"games": ["quiz"], "max_tokens": 700},
+}
+
 class LlamaService:
     def __init__(self):
-        self.client = OpenAI(
-            base_url=settings.OPENROUTER_BASE_URL,
-            api_key=settings.OPENROUTER_API_KEY
-        ) if settings.OPENROUTER_API_KEY else None
+        self.model = settings.LLM_MODEL
+        self.token_stats = {
+            "calls": {},
+            "batch_prompt_tokens": 0,
+            "estimated_per_tag_prompt_tokens": 0,
+            "batched_subjects": 0
+        }
+        template_kinds = ["games", "domains", "domains_batch"] + [f"games_{section}" for section in GAME_SECTIONS]
+        self.template_versions = {kind: self._template_version(kind) for kind in template_kinds}
+        # Ordered OpenAI-compatible backends (local server, OpenRouter) with failover
+        self.providers = llm_providers
+    
+    @property
+    def available(self) -> bool:
+        return self.providers.available
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections"""
+        await self.providers.aclose()
     
-    def generate_games(self, topic: str, age_group: str, tags: List[str] = None, domain: str = None) -> Dict:
-        """Generate educational games using LLaMA API"""
+    async def _create(self, **request):
+        """Chat completion admitted by the rate-limit scheduler, then routed over the providers; returns (response, provider)"""
+        prompt_chars = sum(len(message["content"]) for message in request["messages"])
+        estimated_tokens = prompt_chars // 4 + request.get("max_tokens", 0)
+        await llm_scheduler.acquire(estimated_tokens)
+        response, provider = await self.providers.create(**request)
         
-        if not self.client:
-            print("❌ LLaMA client not available")
-            return self._create_fallback_games(topic, age_group)
+        usage = getattr(response, "usage", None)
+        llm_scheduler.settle(estimated_tokens, usage.total_tokens if usage else None)
+        return response, provider
+    
+    def _record_usage(self, kind: str, response) -> Optional[int]:
+        """Accumulate token usage per call kind; returns the prompt tokens of this call"""
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return None
+        
+        stats = self.token_stats["calls"].setdefault(kind, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += usage.prompt_tokens or 0
+        stats["completion_tokens"] += usage.completion_tokens or 0
+        return usage.prompt_tokens
+    
+    def get_token_stats(self) -> Dict:
+        """Token usage per call kind and the prompt tokens saved by batched domain prompts"""
+        batch_tokens = self.token_stats["batch_prompt_tokens"]
+        per_tag_tokens = self.token_stats["estimated_per_tag_prompt_tokens"]
+        return {
+            **self.token_stats,
+            "batch_prompt_token_savings": per_tag_tokens - batch_tokens,
+            "batch_prompt_token_savings_pct": round(100 * (1 - batch_tokens / per_tag_tokens), 1) if per_tag_tokens else None
+        }
+    
+    def _template_version(self, kind: str) -> str:
+        """Hash the prompt template rendered with placeholder arguments; any template edit changes it"""
+        if kind == "games":
+            template = self._build_game_generation_prompt("{topic}", "{age_group}", ["{tags}"], "{domain}")
+        elif kind.startswith("games_"):
+            template = self._build_section_generation_prompt(kind[len("games_"):], "{topic}", "{age_group}", ["{tags}"], "{domain}")
+        elif kind == "domains":
+            template = self._build_domain_generation_prompt("{subject}", "{description}", ["{tags}"])
+        else:
+            template = self._build_batch_domain_generation_prompt(["{subject}"], "{description}", ["{tags}"])
+        return hashlib.sha256(template.encode()).hexdigest()[:12]
+    
+    def _cache_key(self, kind: str, temperature: float, provider=None, **arguments) -> str:
+        """Cache key for the provider that serves (stores) or would serve next (lookups), so a failover
+        response is never returned while the preferred provider is healthy"""
+        provider = provider or self.providers.preferred()
+        model = f"{provider.name}:{provider.model}" if provider else self.model
+        return llm_cache.make_key(kind, model, self.template_versions[kind], temperature, **arguments)
+    
+    def _games_request(self, topic: str, age_group: str, tags: List[str], domain: str) -> Dict:
+        """Build the chat completion arguments for game generation"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": self._build_game_generation_prompt(topic, age_group, tags, domain)}],
+            "max_tokens": 1500,
+            "temperature": 0.7,
+            "timeout": settings.LLM_GAMES_TIMEOUT
+        }
+    
+    def _games_cache_key(self, topic: str, age_group: str, tags: List[str], domain: str, provider=None) -> str:
+        return self._cache_key("games", 0.7, provider, topic=topic, age_group=age_group, tags=tags, domain=domain)
+    
+    def _parse_games_response(self, raw_response: str) -> Optional[Dict]:
+        """Validate a game generation response; None when the structure is wrong"""
+        print(f"📝 LLaMA raw response: {raw_response[:200]}...")
+        
+        parsed_games = extract_json_from_response(raw_response)
+        
+        if parsed_games and all(key in parsed_games for key in GAME_KEYS):
+            print("✅ Successfully parsed sequential games from LLaMA")
+            if "gallery" in parsed_games and "image_prompts" in parsed_games["gallery"]:
+                print("🎨 Generated sequential image prompts:")
+                for i, prompt in enumerate(parsed_games["gallery"]["image_prompts"]):
+                    print(f"  {i+1}. {prompt}")
+            return parsed_games
         
-        prompt = self._build_game_generation_prompt(topic, age_group, tags, domain)
+        print("❌ Invalid games structure, using fallback")
+        return None
+    
+    async def generate_games_async(self, topic: str, age_group: str, tags: List[str] = None, domain: str = None) -> Dict:
+        """Generate educational games using LLaMA API without blocking the event loop"""
+        if settings.LLM_SPLIT_GAME_GENERATION:
+            sections = await asyncio.gather(*(
+                self._generate_section_async(section, topic, age_group, tags, domain) for section in GAME_SECTIONS
+            ))
+            return {game_type: game for section_games in sections for game_type, game in section_games.items()}
+        
+        cache_key = self._games_cache_key(topic, age_group, tags, domain)
+        cached_games = await llm_cache.get(cache_key)
+        if cached_games:
+            print(f"💾 LLM cache hit for games: {topic}")
+            return cached_games
+        
+        if not self.available:
+            print("❌ No LLM provider available")
+            return self._create_fallback_games(topic, age_group)
         
         try:
             print(f"🧠 Generating sequential games with LLaMA for: {topic}")
-            response = self.client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1500,
-                temperature=0.7
+            response, provider = await resilience_service.call(
+                "llm_games", lambda: self._create(**self._games_request(topic, age_group, tags, domain))
             )
-            
-            raw_response = response.choices[0].message.content
-            print(f"📝 LLaMA raw response: {raw_response[:200]}...")
-            
-            parsed_games = extract_json_from_response(raw_response)
-            
-            if parsed_games and all(key in parsed_games for key in ["spelling", "drawing", "gallery", "quiz"]):
-                print("✅ Successfully parsed sequential games from LLaMA")
-                if "gallery" in parsed_games and "image_prompts" in parsed_games["gallery"]:
-                    print("🎨 Generated sequential image prompts:")
-                    for i, prompt in enumerate(parsed_games["gallery"]["image_prompts"]):
-                        print(f"  {i+1}. {prompt}")
-                return parsed_games
-            else:
-                print("❌ Invalid games structure, using fallback")
+            self._record_usage("games", response)
+            parsed_games = self._parse_games_response(response.choices[0].message.content)
+            if parsed_games is None:
                 return self._create_fallback_games(topic, age_group)
+            
+            await llm_cache.set(self._games_cache_key(topic, age_group, tags, domain, provider), parsed_games)
+            return parsed_games
                 
         except Exception as e:
             print(f"❌ Error generating games with LLaMA: {e}")
             return self._create_fallback_games(topic, age_group)
     
-    def generate_domain_topics(self, description: str, tags: List[str], primary_label: str = None) -> Dict:
-        """Generate domain-specific topics using LLaMA"""
+    async def stream_games_async(self, topic: str, age_group: str, tags: List[str] = None,
+                                 domain: str = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Stream game generation, yielding (game_type, game) as soon as each game's JSON object closes.
         
-        if not self.client:
-            print("❌ LLaMA client not available for domain generation")
-            return self._create_fallback_domains(primary_label or "Unknown")
+        Games that never arrive (stream error or malformed output) are yielded from the fallback at the end.
+        In split mode each section is a separate call and its games are yielded as that call completes.
+        """
+        if settings.LLM_SPLIT_GAME_GENERATION:
+            for section_task in asyncio.as_completed([
+                self._generate_section_async(section, topic, age_group, tags, domain) for section in GAME_SECTIONS
+            ]):
+                for game_type, game in (await section_task).items():
+                    yield game_type, game
+            return
+        
+        cache_key = self._games_cache_key(topic, age_group, tags, domain)
+        cached_games = await llm_cache.get(cache_key)
+        if cached_games:
+            print(f"💾 LLM cache hit for games: {topic}")
+            for game_type in GAME_KEYS:
+                yield game_type, cached_games[game_type]
+            return
+        
+        streamed_games = {}
+        
+        if self.available:
+            try:
+                print(f"🧠 Streaming sequential games with LLaMA for: {topic}")
+                # Breaker and deadline cover opening the stream; a duplicate stream is never hedged, and
+                # time-to-first-byte is kept apart from full games calls so it does not shrink their hedge delay
+                stream, provider = await resilience_service.call(
+                    "llm_games",
+                    lambda: self._create(**self._games_request(topic, age_group, tags, domain), stream=True),
+                    hedge=False, kind="stream_open"
+                )
+                parser = IncrementalJSONObjectParser()
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    for game_type, game in parser.feed(delta):
+                        if game_type in GAME_KEYS and isinstance(game, dict) and game_type not in streamed_games:
+                            streamed_games[game_type] = game
+                            print(f"✅ Streamed {game_type} game")
+                            yield game_type, game
+            except Exception as e:
+                print(f"❌ Error streaming games with LLaMA: {e}")
+        else:
+            print("❌ No LLM provider available")
+        
+        missing = [game_type for game_type in GAME_KEYS if game_type not in streamed_games]
+        if missing:
+            print(f"⚠️ Using fallback for games missing from the stream: {', '.join(missing)}")
+            fallback_games = self._create_fallback_games(topic, age_group)
+            for game_type in missing:
+                yield game_type, fallback_games[game_type]
+        else:
+            await llm_cache.set(self._games_cache_key(topic, age_group, tags, domain, provider), streamed_games)
+    
+    def _section_request(self, section: str, topic: str, age_group: str, tags: List[str], domain: str) -> Dict:
+        """Build the chat completion arguments for one split-generation section"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": self._build_section_generation_prompt(section, topic, age_group, tags, domain)}],
+            "max_tokens": GAME_SECTIONS[section]["max_tokens"],
+            "temperature": 0.7,
+            "timeout": settings.LLM_GAMES_TIMEOUT
+        }
+    
+    def _parse_section_response(self, section: str, raw_response: str) -> Optional[Dict]:
+        """Validate one section's games; None when any of its games is malformed"""
+        parsed = extract_json_from_response(raw_response)
+        if not isinstance(parsed, dict) or not all(isinstance(parsed.get(key), dict) for key in GAME_SECTIONS[section]["games"]):
+            print(f"❌ Invalid {section} section structure")
+            return None
+        
+        if section == "words":
+            word = parsed["spelling"].get("word")
+            if not isinstance(word, str) or not word.strip():
+                print("❌ Spelling section is missing its word")
+                return None
+            # Both games come from one call, so force the drawing word to match
+            parsed["drawing"]["word"] = word
+        elif section == "gallery":
+            image_prompts = parsed["gallery"].get("image_prompts")
+            if not isinstance(image_prompts, list) or not image_prompts:
+                print("❌ Gallery section has no image prompts")
+                return None
+        elif section == "quiz":
+            questions = parsed["quiz"].get("questions")
+            if not isinstance(questions, list) or not questions or not all(
+                isinstance(q, dict) and {"question", "options", "correct_answer"} <= q.keys() for q in questions
+            ):
+                print("❌ Quiz section has malformed questions")
+                return None
+        
+        return {key: parsed[key] for key in GAME_SECTIONS[section]["games"]}
+    
+    async def _generate_section_async(self, section: str, topic: str, age_group: str,
+                                      tags: List[str] = None, domain: str = None) -> Dict:
+        """Generate one section's games; a failed section falls back on its own"""
+        kind = f"games_{section}"
+        cache_key = self._cache_key(kind, 0.7, topic=topic, age_group=age_group, tags=tags, domain=domain)
+        cached_section = await llm_cache.get(cache_key)
+        if cached_section:
+            print(f"💾 LLM cache hit for {section} section: {topic}")
+            return cached_section
+        
+        if self.available:
+            try:
+                print(f"🧠 Generating {section} section with LLaMA for: {topic}")
+                response, provider = await resilience_service.call(
+                    "llm_games", lambda: self._create(**self._section_request(section, topic, age_group, tags, domain)),
+                    kind=kind
+                )
+                self._record_usage(kind, response)
+                section_games = self._parse_section_response(section, response.choices[0].message.content)
+                if section_games is not None:
+                    print(f"✅ Generated {section} section")
+                    await llm_cache.set(self._cache_key(kind, 0.7, provider, topic=topic, age_group=age_group,
+                                                  tags=tags, domain=domain), section_games)
+                    return section_games
+            except Exception as e:
+                print(f"❌ Error generating {section} section with LLaMA: {e}")
+        else:
+            print("❌ No LLM provider available")
+        
+        print(f"⚠️ Using fallback for {section} section")
+        fallback_games = self._create_fallback_games(topic, age_group)
+        return {key: fallback_games[key] for key in GAME_SECTIONS[section]["games"]}
+    
+    def _domains_request(self, main_subject: str, description: str, tags: List[str]) -> Dict:
+        """Build the chat completion arguments for domain generation"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": self._build_domain_generation_prompt(main_subject, description, tags)}],
+            "max_tokens": 1200,
+            "temperature": 0.6,
+            "timeout": settings.LLM_DOMAINS_TIMEOUT
+        }
+    
+    def _domains_cache_key(self, main_subject: str, description: str, tags: List[str], provider=None) -> str:
+        return self._cache_key("domains", 0.6, provider, subject=main_subject, description=description, tags=tags)
+    
+    def _parse_domains_response(self, raw_response: str, main_subject: str) -> Optional[Dict]:
+        """Validate a domain generation response; None when the structure is wrong"""
+        parsed_response = extract_json_from_response(raw_response)
+        
+        if parsed_response and "domains" in parsed_response:
+            print(f"✅ Generated {len(parsed_response['domains'])} domains for {main_subject}")
+            for domain in parsed_response['domains']:
+                print(f"  📚 {domain['domain']}: {', '.join(domain['topics'])}")
+            return parsed_response
+        
+        print("❌ Failed to parse domain response, using fallback")
+        return None
+    
+    async def generate_domain_topics_async(self, description: str, tags: List[str], primary_label: str = None) -> Dict:
+        """Generate domain-specific topics using LLaMA without blocking the event loop"""
         
         main_subject = primary_label if primary_label else (tags[0] if tags else "the subject")
-        prompt = self._build_domain_generation_prompt(main_subject, description, tags)
+        cache_key = self._domains_cache_key(main_subject, description, tags)
+        cached_domains = await llm_cache.get(cache_key)
+        if cached_domains:
+            print(f"💾 LLM cache hit for domains: {main_subject}")
+            return cached_domains
+        
+        if not self.available:
+            print("❌ No LLM provider available for domain generation")
+            return self._create_fallback_domains(primary_label or "Unknown")
         
         try:
             print(f"🧠 Generating domain-specific topics for: {main_subject}")
-            response = self.client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1200,
-                temperature=0.6
+            response, provider = await resilience_service.call(
+                "llm_domains", lambda: self._create(**self._domains_request(main_subject, description, tags))
             )
-            
-            raw_response = response.choices[0].message.content
-            parsed_response = extract_json_from_response(raw_response)
-            
-            if parsed_response and "domains" in parsed_response:
-                print(f"✅ Generated {len(parsed_response['domains'])} domains for {main_subject}")
-                for domain in parsed_response['domains']:
-                    print(f"  📚 {domain['domain']}: {', '.join(domain['topics'])}")
-                return parsed_response
-            else:
-                print("❌ Failed to parse domain response, using fallback")
+            self._record_usage("domains", response)
+            parsed_response = self._parse_domains_response(response.choices[0].message.content, main_subject)
+            if parsed_response is None:
                 return self._create_fallback_domains(main_subject)
+            
+            await llm_cache.set(self._domains_cache_key(main_subject, description, tags, provider), parsed_response)
+            return parsed_response
                 
         except Exception as e:
             print(f"❌ Error generating domains with LLaMA: {e}")
             return self._create_fallback_domains(main_subject)
     
-    def _build_game_generation_prompt(self, topic: str, age_group: str, tags: List[str], domain: str) -> str:
-        """Build the game generation prompt"""
+    def _parse_batch_domains_response(self, raw_response: str, subjects: List[str]) -> Dict[str, Optional[Dict]]:
+        """Split a multi-subject response into per-subject domain dicts; None for missing subjects"""
+        parsed_response = extract_json_from_response(raw_response) or {}
+        by_subject = parsed_response.get("subjects", parsed_response)
+        if not isinstance(by_subject, dict):
+            by_subject = {}
+        
+        # Match keys case-insensitively; models sometimes change capitalisation
+        normalized = {str(key).strip().lower(): value for key, value in by_subject.items()}
+        
+        results = {}
+        for subject in subjects:
+            subject_data = normalized.get(subject.lower())
+            if isinstance(subject_data, list):
+                subject_data = {"domains": subject_data}
+            if isinstance(subject_data, dict) and subject_data.get("domains"):
+                subject_data["primary_subject"] = subject
+                results[subject] = subject_data
+                print(f"✅ Generated {len(subject_data['domains'])} domains for {subject} (batched)")
+            else:
+                print(f"⚠️ Batched response missing '{subject}'")
+                results[subject] = None
+        return results
+    
+    async def generate_domain_topics_batch_async(self, description: str, subjects: List[str],
+                                                 tags: List[str] = None) -> Dict[str, Dict]:
+        """Generate domains for several subjects in one structured call, keyed by subject.
+        
+        Subjects the response did not cover (malformed or partial output) are left out, so the
+        caller can retry just those one by one.
+        """
+        if not subjects:
+            return {}
+        
+        # Serve cached subjects locally and only ask the LLM about the rest
+        cache_keys = {
+            subject: self._cache_key("domains_batch", 0.6, subject=subject, description=description, tags=tags)
+            for subject in subjects
+        }
+        results = {}
+        for subject in subjects:
+            cached_domains = await llm_cache.get(cache_keys[subject])
+            if cached_domains:
+                results[subject] = cached_domains
+        pending = [subject for subject in subjects if subject not in results]
+        if results:
+            print(f"💾 LLM cache hit for domains: {', '.join(results)}")
+        if not pending:
+            return results
+        
+        if not self.available:
+            print("❌ No LLM provider available for domain generation")
+            return {**results, **{subject: self._create_fallback_domains(subject) for subject in pending}}
+        
+        prompt = self._build_batch_domain_generation_prompt(pending, description, tags)
+        
+        try:
+            print(f"🧠 Generating domain-specific topics for {len(pending)} subjects in one call: {', '.join(pending)}")
+            response, provider = await resilience_service.call("llm_domains", lambda: self._create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=min(4000, 400 * len(pending)),
+                temperature=0.6,
+                timeout=settings.LLM_DOMAINS_TIMEOUT
+            ), kind="domains_batch")
+            
+            prompt_tokens = self._record_usage("domains_batch", response)
+            if prompt_tokens:
+                # Estimate what the per-tag prompts would have cost from this call's tokens-per-character
+                per_tag_chars = sum(
+                    len(self._build_domain_generation_prompt(subject, description, [subject])) for subject in pending
+                )
+                self.token_stats["batch_prompt_tokens"] += prompt_tokens
+                self.token_stats["estimated_per_tag_prompt_tokens"] += round(prompt_tokens * per_tag_chars / len(prompt))
+                self.token_stats["batched_subjects"] += len(pending)
+            
+            parsed = self._parse_batch_domains_response(response.choices[0].message.content, pending)
+            for subject, subject_data in parsed.items():
+                if subject_data is not None:
+                    await llm_cache.set(self._cache_key("domains_batch", 0.6, provider, subject=subject,
+                                                  description=description, tags=tags), subject_data)
+                    results[subject] = subject_data
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error generating batched domains with LLaMA: {e}")
+            return {**results, **{subject: self._create_fallback_domains(subject) for subject in pending}}
+    
+    def _build_game_context(self, topic: str, age_group: str, tags: List[str], domain: str) -> str:
+        """Build the audience/topic preamble shared by the game prompts"""
         prompt = f"""
 You are an educational game creator for children aged {age_group}. 
 Create educational games for the topic: "{topic}"
@@ -101,6 +452,11 @@ The games must be focused on the educational domain of *{domain}*.
             prompt += f"""
 Ensure the game content incorporates the following keywords or concepts: *{tags_str}*.
 """
+        return prompt
+    
+    def _build_game_generation_prompt(self, topic: str, age_group: str, tags: List[str], domain: str) -> str:
+        """Build the game generation prompt"""
+        prompt = self._build_game_context(topic, age_group, tags, domain)
         
         prompt += f"""
 For the gallery game, create 4 *SEQUENTIAL* images that show a process, stages, or related aspects of the topic in logical order. Think of it as telling a visual story.
@@ -154,6 +510,75 @@ Generate games in this *EXACT JSON* format:
 
 *IMPORTANT*: Replace [first stage], [second stage], etc. with actual specific stages relevant to the topic. Make the image prompts describe a clear sequence or process related to {topic}.
 
+Return *ONLY* the JSON, nothing else.
+"""
+        return prompt
+    
+    def _build_section_generation_prompt(self, section: str, topic: str, age_group: str,
+                                         tags: List[str], domain: str) -> str:
+        """Build the prompt for one split-generation section"""
+        prompt = self._build_game_context(topic, age_group, tags, domain)
+        
+        if section == "words":
+            prompt += f"""
+Choose one word for a spelling game and a letter-drawing game.
+
+Generate games in this *EXACT JSON* format:
+
+{{
+  "spelling": {{
+    "word": "SINGLE_WORD_RELATED_TO_TOPIC_MAX_8_LETTERS",
+    "instructions": "Spell the word related to {topic}"
+  }},
+  "drawing": {{
+    "word": "SAME_WORD_AS_SPELLING_GAME",
+    "instructions": "Draw each letter of the word"
+  }}
+}}
+"""
+        elif section == "gallery":
+            prompt += f"""
+Create 4 *SEQUENTIAL* image prompts that show a process, stages, or related aspects of the topic in logical order. Think of it as telling a visual story.
+
+Examples:
+- If topic is "germination": [seed, sprouting seed, seedling, young plant]
+- If topic is "butterfly": [egg, caterpillar, chrysalis, butterfly] 
+
+Generate the game in this *EXACT JSON* format, replacing the brackets with actual specific stages:
+
+{{
+  "gallery": {{
+    "image_prompts": [
+      "Stage 1: [first stage of {topic} process]",
+      "Stage 2: [second stage of {topic} process]", 
+      "Stage 3: [third stage of {topic} process]",
+      "Stage 4: [final stage of {topic} process]"
+    ],
+    "instructions": "Explore the {topic} process step by step"
+  }}
+}}
+"""
+        else:
+            prompt += f"""
+Write 3 quiz questions about the stages or process of {topic}, in order from first to last, using the actual stage names as options.
+
+Generate the game in this *EXACT JSON* format:
+
+{{
+  "quiz": {{
+    "questions": [
+      {{
+        "question": "What happens first in {topic}?",
+        "options": ["Stage 1", "Stage 2", "Stage 3", "Stage 4"],
+        "correct_answer": "Stage 1"
+      }}
+    ],
+    "instructions": "Answer questions about the {topic} process"
+  }}
+}}
+"""
+        
+        prompt += """
 Return *ONLY* the JSON, nothing else.
 """
         return prompt
@@ -199,6 +624,49 @@ Return the response in this *EXACT JSON* format:
 }}
 
 Generate 3-4 relevant educational domains with specific topics all connected to "{main_subject}".
+"""
+    
+    def _build_batch_domain_generation_prompt(self, subjects: List[str], description: str, tags: List[str] = None) -> str:
+        """Build one domain generation prompt covering several subjects"""
+        subjects_str = ", ".join(f'"{subject}"' for subject in subjects)
+        tags_str = ", ".join(tags) if tags else ", ".join(subjects)
+        
+        return f"""
+You are an educational expert for children. The subjects identified from an image are: {subjects_str}.
+
+For EACH subject, generate educational domains and specific learning topics that are directly related to that subject.
+
+Context:
+- Description: "{description}"
+- Related tags: "{tags_str}"
+
+For each domain, suggest 2-3 specific, educational topics that are:
+1. Directly related to the subject
+2. Age-appropriate for children
+3. Educational and engaging
+4. Clickable and specific (not too broad)
+
+Return the response in this *EXACT JSON* format, with one entry per subject using the subject names exactly as given:
+
+{{
+  "subjects": {{
+    "{subjects[0]}": {{
+      "domains": [
+        {{
+          "domain": "Domain Name 1",
+          "topics": ["Topic 1a related to {subjects[0]}", "Topic 1b related to {subjects[0]}"]
+        }},
+        {{
+          "domain": "Domain Name 2",
+          "topics": ["Topic 2a related to {subjects[0]}", "Topic 2b related to {subjects[0]}"]
+        }}
+      ]
+    }}
+  }}
+}}
+
+Generate 3-4 relevant educational domains for every subject in: {subjects_str}.
+Return *ONLY* the JSON, nothing else.
 """
     
     def _create_fallback_games(self, topic: str, age_group: str) -> Dict:
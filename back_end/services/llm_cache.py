@@ -0,0 +1,175 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, Optional
+from config.settings import settings
+from utils.ttl_cache import TTLCache
+from utils.helpers import normalize_cache_argument
+
+print = partial(print, flush=True)
+
+class LLMResponseCache:
+    """Two-tier (memory + disk) cache of validated LLM responses.
+
+    Keys hash the model, prompt template version, temperature and normalized arguments,
+    so a template edit or model switch never serves stale output.
+    """
+
+    def __init__(self):
+        self.enabled = settings.LLM_CACHE_ENABLED
+        self.ttl_seconds = settings.LLM_CACHE_TTL_SECONDS
+        self.memory = TTLCache(settings.LLM_CACHE_MEMORY_ENTRIES, self.ttl_seconds)
+        self.cache_dir = settings.LLM_CACHE_DIR
+        self.max_disk_bytes = settings.LLM_CACHE_MAX_DISK_MB * 1024 * 1024
+        self._disk_lock = threading.Lock()
+        # Bytes held by the disk tier, kept up to date per write; None until the first scan
+        self.disk_bytes: Optional[int] = None
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.stores = 0
+
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, kind: str, model: str, template_version: str, temperature: float, **arguments) -> str:
+        payload = {
+            "kind": kind,
+            "model": model,
+            "template_version": template_version,
+            "temperature": temperature,
+            "arguments": {name: normalize_cache_argument(value) for name, value in arguments.items()}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look up a response in memory, then on disk; callers get their own copy to mutate"""
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is not None:
+            return copy.deepcopy(value)
+
+        path = self._path(key)
+        entry = await asyncio.to_thread(self._read, path)
+        if entry is None:
+            return None
+
+        age = time.time() - entry.get("created_at", 0)
+        if age > self.ttl_seconds:
+            await asyncio.to_thread(self._discard, path)
+            return None
+
+        self.disk_hits += 1
+        self.memory.set(key, entry["value"], ttl_seconds=self.ttl_seconds - age)
+        return copy.deepcopy(entry["value"])
+
+    async def set(self, key: str, value: Any):
+        """Store a validated response in both tiers"""
+        if not self.enabled:
+            return
+
+        # Stored by value: the caller keeps mutating its response afterwards
+        self.memory.set(key, copy.deepcopy(value))
+        payload = json.dumps({"created_at": time.time(), "value": value})
+        try:
+            await asyncio.to_thread(self._write, key, payload)
+            self.stores += 1
+        except OSError as e:
+            print(f"⚠️ Could not write LLM cache entry: {e}")
+
+    def _write(self, key: str, payload: str):
+        """Write an entry atomically (temp file + rename) and keep the disk tier within its cap"""
+        path = self._path(key)
+        # Not *.json, so a crash mid-write never leaves an entry that loads truncated
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(payload)
+            new_size = os.path.getsize(temp_path)
+            with self._disk_lock:
+                try:
+                    old_size = os.path.getsize(path)
+                except OSError:
+                    old_size = 0
+                os.replace(temp_path, path)
+                if self.disk_bytes is not None:
+                    self.disk_bytes += new_size - old_size
+        except OSError:
+            self._remove(temp_path)
+            raise
+
+        if self.disk_bytes is None or self.disk_bytes > self.max_disk_bytes:
+            self._enforce_disk_limit()
+
+    def _remove(self, path: str) -> int:
+        """Delete a file; returns the bytes freed"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _discard(self, path: str):
+        """Delete an entry outside a scan, keeping the running disk total"""
+        with self._disk_lock:
+            freed = self._remove(path)
+            if self.disk_bytes is not None:
+                self.disk_bytes -= freed
+
+    def _enforce_disk_limit(self):
+        """Drop expired entries, then the oldest ones, until the disk tier fits its size cap.
+
+        Scans the directory, so it only runs on the first write and when the running total is over the cap.
+        """
+        with self._disk_lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for entry in os.scandir(self.cache_dir):
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl_seconds:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total > self.max_disk_bytes:
+                for _, size, path in sorted(entries):
+                    self._remove(path)
+                    self.disk_evictions += 1
+                    total -= size
+                    if total <= self.max_disk_bytes:
+                        break
+            self.disk_bytes = total
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_evictions": self.disk_evictions,
+            "disk_bytes": self.disk_bytes,
+            "stores": self.stores
+        }
+
+# Create global instance
+llm_cache = LLMResponseCache()
@@ -0,0 +1,154 @@
+import time
+import httpx
+from openai import AsyncOpenAI
+from config.settings import settings
+from typing import Any, Dict, List, Optional, Tuple
+from functools import partial
+
+print = partial(print, flush=True)
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class LLMProvider:
+    """One OpenAI-compatible endpoint with its own connection pool and health record"""
+    def __init__(self, name: str, base_url: str, api_key: str, model: str):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+
+        # One shared keep-alive pool so concurrent calls reuse connections
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(settings.LLM_GAMES_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+        # No SDK-level retries: the resilience layer owns retries and hedging
+        self.async_client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout, http2=HTTP2_AVAILABLE)
+        )
+
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_success(self, latency: float):
+        alpha = settings.LLM_LATENCY_EWMA_ALPHA
+        self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.successes += 1
+
+    def record_failure(self, error: Exception):
+        self.consecutive_failures += 1
+        self.failures += 1
+        self.last_error = str(error)[:200]
+        if self.consecutive_failures >= settings.LLM_PROVIDER_FAILURE_THRESHOLD:
+            self.unhealthy_until = time.monotonic() + settings.LLM_PROVIDER_COOLDOWN_SECONDS
+            print(f"🚑 LLM provider '{self.name}' marked unhealthy for {settings.LLM_PROVIDER_COOLDOWN_SECONDS}s: {self.last_error}")
+
+    def status(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "latency_ewma_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+class LLMProviderRouter:
+    """Routes chat completions over an ordered list of providers with health tracking and failover"""
+
+    def __init__(self):
+        self.routing = settings.LLM_ROUTING
+        self.providers: List[LLMProvider] = []
+        for name in settings.LLM_PROVIDERS.split(","):
+            provider = self._build_provider(name.strip())
+            if provider:
+                self.providers.append(provider)
+
+        if self.providers:
+            names = ", ".join(f"{p.name} ({p.model})" for p in self.providers)
+            print(f"✅ LLM providers ready [{self.routing} routing, HTTP/2: {'on' if HTTP2_AVAILABLE else 'off'}]: {names}")
+        else:
+            print("⚠️ No LLM providers configured")
+
+    def _build_provider(self, name: str) -> Optional[LLMProvider]:
+        if name == "local":
+            return LLMProvider("local", settings.LOCAL_LLM_BASE_URL, settings.LOCAL_LLM_API_KEY, settings.LOCAL_LLM_MODEL)
+        if name == "openrouter":
+            if not settings.OPENROUTER_API_KEY:
+                print("⚠️ OpenRouter provider skipped: no API key")
+                return None
+            return LLMProvider("openrouter", settings.OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY, settings.LLM_MODEL)
+        if name:
+            print(f"⚠️ Unknown LLM provider '{name}' ignored")
+        return None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.providers)
+
+    def ordered(self) -> List[LLMProvider]:
+        """Healthy providers first (by latency or configured order), then unhealthy ones as a last resort"""
+        healthy = [p for p in self.providers if p.healthy]
+        unhealthy = sorted((p for p in self.providers if not p.healthy), key=lambda p: p.unhealthy_until)
+        if self.routing == "latency":
+            # Unmeasured providers sort first so every provider gets a latency sample
+            healthy.sort(key=lambda p: p.latency_ewma if p.latency_ewma is not None else 0.0)
+        return healthy + unhealthy
+
+    def preferred(self) -> Optional[LLMProvider]:
+        """The provider the next call will try first"""
+        ordered = self.ordered()
+        return ordered[0] if ordered else None
+
+    async def create(self, **request) -> Tuple[Any, LLMProvider]:
+        """Async chat completion, failing over to the next provider on error; returns (response, serving provider).
+
+        With stream=True, failover covers opening the stream only; errors mid-stream surface to the caller.
+        """
+        last_error = None
+        for provider in self.ordered():
+            start = time.perf_counter()
+            try:
+                response = await provider.async_client.chat.completions.create(**{**request, "model": provider.model})
+                provider.record_success(time.perf_counter() - start)
+                return response, provider
+            except Exception as e:
+                provider.record_failure(e)
+                last_error = e
+                print(f"⚠️ LLM provider '{provider.name}' failed, trying next: {e}")
+        raise last_error or RuntimeError("No LLM providers configured")
+
+    async def aclose(self):
+        """Close every provider's pooled HTTP connections"""
+        for provider in self.providers:
+            await provider.async_client.close()
+
+    def status(self) -> Dict:
+        return {
+            "routing": self.routing,
+            "order": [p.name for p in self.ordered()],
+            "providers": {p.name: p.status() for p in self.providers}
+        }
+
+# Create global instance
+llm_providers = LLMProviderRouter()
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Dict, Optional
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+PRIORITIES = ("interactive", "background")
+
+# Set per request (middleware) or per job; asyncio tasks inherit them
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+llm_client_id: ContextVar[str] = ContextVar("llm_client_id", default="anonymous")
+
+class TokenBucket:
+    """Refills continuously at capacity per minute"""
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.level
+
+    def take(self, amount: float):
+        """Debit the bucket; negative amounts refund and the level may go below zero after corrections"""
+        self.available()
+        self.level -= amount
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.available()) / self.rate)
+
+class Waiter:
+    def __init__(self, priority: str, client_id: str, tokens: int):
+        self.priority = priority
+        self.client_id = client_id
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+class LLMScheduler:
+    """Admits outbound LLM calls under requests-per-minute and tokens-per-minute budgets.
+
+    Interactive calls always go before background ones, and background calls may not dip into
+    the reserve kept for interactive traffic. Within a priority, clients take turns so one
+    busy client cannot starve the rest.
+    """
+
+    def __init__(self):
+        self.enabled = settings.LLM_SCHEDULER_ENABLED
+        self.requests = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+        self.background_reserve = settings.LLM_BACKGROUND_RESERVE_FRACTION
+        self.queues: Dict[str, "OrderedDict[str, deque]"] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = {
+            priority: {"admitted": 0, "queued": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for priority in PRIORITIES
+        }
+
+    @contextmanager
+    def context(self, priority: str = "interactive", client_id: Optional[str] = None):
+        """Tag LLM calls made inside the block with a priority class and client"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        priority_token = llm_priority.set(priority)
+        client_token = llm_client_id.set(client_id) if client_id else None
+        try:
+            yield
+        finally:
+            llm_priority.reset(priority_token)
+            if client_token:
+                llm_client_id.reset(client_token)
+
+    def _next_waiter(self) -> Optional[Waiter]:
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            if queue:
+                return queue[next(iter(queue))][0]
+        return None
+
+    def _pop(self, waiter: Waiter):
+        """Remove an admitted waiter and move its client to the back of the round-robin"""
+        queue = self.queues[waiter.priority]
+        client_waiters = queue.pop(waiter.client_id)
+        client_waiters.popleft()
+        if client_waiters:
+            queue[waiter.client_id] = client_waiters
+
+    def _shortfall(self, waiter: Waiter) -> float:
+        """Seconds until both buckets can admit the waiter (0 when it can go now)"""
+        reserve = self.background_reserve if waiter.priority == "background" else 0.0
+        # Calls larger than the whole bucket would never fit; admit them once it is full
+        tokens = min(waiter.tokens, self.tokens.capacity * (1 - reserve))
+        return max(
+            self.requests.seconds_until(1 + reserve * self.requests.capacity),
+            self.tokens.seconds_until(tokens + reserve * self.tokens.capacity)
+        )
+
+    def _dispatch(self):
+        self._wakeup = None
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+
+            wait = self._shortfall(waiter)
+            if wait > 0:
+                # Strict priority: nothing behind the head may overtake it
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            self._pop(waiter)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            waited = time.monotonic() - waiter.enqueued
+            stats = self.stats[waiter.priority]
+            stats["admitted"] += 1
+            stats["total_wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            waiter.future.set_result(None)
+
+    def _reschedule(self):
+        """Re-run admission now; the queue head may have changed"""
+        if self._wakeup:
+            self._wakeup.cancel()
+        self._dispatch()
+
+    async def acquire(self, estimated_tokens: int):
+        """Wait for a slot for one call of about estimated_tokens (prompt + max completion)"""
+        if not self.enabled:
+            return
+
+        waiter = Waiter(llm_priority.get(), llm_client_id.get(), estimated_tokens)
+        self.stats[waiter.priority]["queued"] += 1
+        self.queues[waiter.priority].setdefault(waiter.client_id, deque()).append(waiter)
+        self._reschedule()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # Caller gave up (deadline); drop the waiter if it was never admitted
+            client_waiters = self.queues[waiter.priority].get(waiter.client_id)
+            if client_waiters and waiter in client_waiters:
+                client_waiters.remove(waiter)
+                if not client_waiters:
+                    del self.queues[waiter.priority][waiter.client_id]
+                self._reschedule()
+            raise
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the token bucket once the real usage is known"""
+        if self.enabled and actual_tokens is not None:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "requests_per_minute": {"limit": self.requests.capacity, "available": round(self.requests.available(), 1)},
+            "tokens_per_minute": {"limit": self.tokens.capacity, "available": round(self.tokens.available())},
+            "background_reserve_fraction": self.background_reserve,
+            "queue_depth": {
+                priority: sum(len(waiters) for waiters in self.queues[priority].values()) for priority in PRIORITIES
+            },
+            "priorities": {
+                priority: {
+                    **stats,
+                    "avg_wait_ms": round(1000 * stats["total_wait_seconds"] / stats["admitted"]) if stats["admitted"] else None
+                }
+                for priority, stats in self.stats.items()
+            }
+        }
+
+# Create global instance
+llm_scheduler = LLMScheduler()
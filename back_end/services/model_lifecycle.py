@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Optional
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+def module_size_bytes(*modules) -> int:
+    """Approximate resident size of torch modules from their parameters and buffers"""
+    total = 0
+    for module in modules:
+        if module is None:
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+class ManagedModel:
+    """Bookkeeping for one model under lifecycle management"""
+    def __init__(self, name: str, load_fn: Callable, unload_fn: Callable,
+                 is_loaded_fn: Callable[[], bool], size_fn: Callable[[], int], idle_ttl: float):
+        self.name = name
+        self.load_fn = load_fn
+        self.unload_fn = unload_fn
+        self.is_loaded_fn = is_loaded_fn
+        self.size_fn = size_fn
+        self.idle_ttl = idle_ttl
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.size_bytes = 0
+        self.load_count = 0
+        self.unload_count = 0
+        self.last_load_time = None
+        self.total_load_time = 0.0
+
+    @property
+    def resident(self) -> bool:
+        return self.is_loaded_fn()
+
+class ModelLifecycleManager:
+    """Loads models on demand and unloads them when idle past their TTL or when the memory budget is exceeded"""
+
+    def __init__(self):
+        self.models: Dict[str, ManagedModel] = {}
+        self.memory_budget = settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+        self.eviction_interval = settings.MODEL_EVICTION_INTERVAL_SECONDS
+        self._lock = threading.Lock()
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, load_fn: Callable, unload_fn: Callable,
+                 is_loaded_fn: Callable[[], bool], size_fn: Callable[[], int], idle_ttl: float = 0):
+        """Put a model under management; idle_ttl of 0 keeps it resident until the budget needs the memory"""
+        model = ManagedModel(name, load_fn, unload_fn, is_loaded_fn, size_fn, idle_ttl)
+        if model.resident:
+            model.size_bytes = size_fn()
+            model.load_count = 1
+        self.models[name] = model
+
+    def _resident_bytes(self, exclude: Optional[str] = None) -> int:
+        return sum(m.size_bytes for m in self.models.values() if m.resident and m.name != exclude)
+
+    def _enforce_budget(self, incoming: ManagedModel):
+        """Unload least-recently-used idle models until the incoming model fits the budget"""
+        if not self.memory_budget:
+            return
+
+        with self._lock:
+            candidates = sorted(
+                (m for m in self.models.values() if m.resident and m.in_use == 0 and m is not incoming),
+                key=lambda m: m.last_used
+            )
+        for model in candidates:
+            if self._resident_bytes(exclude=incoming.name) + incoming.size_bytes <= self.memory_budget:
+                break
+            self._unload(model, reason="memory budget")
+
+    def _load(self, model: ManagedModel):
+        if model.resident:
+            return
+        # Evict before taking this model's lock so only one model lock is ever held at a time
+        self._enforce_budget(model)
+
+        with model.lock:
+            if model.resident:
+                return
+            print(f"🔄 Loading model '{model.name}' on demand...")
+            start = time.perf_counter()
+            model.load_fn()
+            elapsed = time.perf_counter() - start
+
+            model.size_bytes = model.size_fn()
+            model.load_count += 1
+            model.last_load_time = elapsed
+            model.total_load_time += elapsed
+            model.last_used = time.monotonic()
+            print(f"✅ Model '{model.name}' loaded in {elapsed:.1f}s ({model.size_bytes / 1024 ** 2:.0f} MB)")
+
+        # Actual size may be larger than the previous estimate
+        self._enforce_budget(model)
+
+    def _unload(self, model: ManagedModel, reason: str) -> bool:
+        with model.lock:
+            if not model.resident or model.in_use > 0:
+                return False
+            model.unload_fn()
+            model.unload_count += 1
+            print(f"🗑️ Unloaded model '{model.name}' ({reason}), freed ~{model.size_bytes / 1024 ** 2:.0f} MB")
+            return True
+
+    @contextmanager
+    def use(self, name: str):
+        """Keep a model loaded (loading it if needed) for the duration of the block"""
+        model = self.models.get(name)
+        if model is None:
+            yield
+            return
+
+        with model.lock:
+            model.in_use += 1
+        try:
+            self._load(model)
+            yield
+        finally:
+            with model.lock:
+                model.in_use -= 1
+                model.last_used = time.monotonic()
+
+    def call(self, name: str, fn: Callable, *args, **kwargs):
+        """Run a blocking model call with the model held resident"""
+        with self.use(name):
+            return fn(*args, **kwargs)
+
+    async def ensure_loaded(self, name: str):
+        """Load a model in a background thread without holding it"""
+        model = self.models.get(name)
+        if model is None:
+            raise ValueError(f"Unknown model: {name}")
+        await asyncio.to_thread(self._load, model)
+
+    async def unload(self, name: str) -> bool:
+        """Unload an idle model now"""
+        model = self.models.get(name)
+        if model is None:
+            raise ValueError(f"Unknown model: {name}")
+        return await asyncio.to_thread(self._unload, model, "manual")
+
+    def evict_idle(self) -> int:
+        """Unload models idle longer than their TTL"""
+        now = time.monotonic()
+        evicted = 0
+        for model in list(self.models.values()):
+            if model.idle_ttl and model.resident and model.in_use == 0 and now - model.last_used > model.idle_ttl:
+                if self._unload(model, reason=f"idle > {model.idle_ttl:.0f}s"):
+                    evicted += 1
+        return evicted
+
+    async def _eviction_loop(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            try:
+                await asyncio.to_thread(self.evict_idle)
+            except Exception as e:
+                print(f"⚠️ Model eviction pass failed: {e}")
+
+    def start(self):
+        """Start the background idle-eviction task"""
+        if self._eviction_task is None and self.models:
+            self._eviction_task = asyncio.create_task(self._eviction_loop())
+
+    async def stop(self):
+        if self._eviction_task:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+
+    def status(self) -> Dict:
+        """Residency, load counts and load durations per model"""
+        now = time.monotonic()
+        models = {}
+        for model in self.models.values():
+            models[model.name] = {
+                "resident": model.resident,
+                "in_use": model.in_use,
+                "size_mb": round(model.size_bytes / 1024 ** 2, 1),
+                "idle_seconds": round(now - model.last_used, 1),
+                "idle_ttl_seconds": model.idle_ttl,
+                "load_count": model.load_count,
+                "unload_count": model.unload_count,
+                "last_load_seconds": round(model.last_load_time, 2) if model.last_load_time is not None else None,
+                "total_load_seconds": round(model.total_load_time, 2)
+            }
+        return {
+            "memory_budget_mb": settings.MODEL_MEMORY_BUDGET_MB or None,
+            "resident_mb": round(self._resident_bytes() / 1024 ** 2, 1),
+            "models": models
+        }
+
+# Create global instance
+model_lifecycle = ModelLifecycleManager()
@@ -0,0 +1,194 @@
+import asyncio
+import random
+import time
+from collections import deque
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional
+from config.settings import settings
+from utils.helpers import percentile
+
+print = partial(print, flush=True)
+
+class CircuitOpenError(Exception):
+    """Raised without calling the dependency while its breaker is open"""
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open lets one trial call through after the reset timeout"""
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        # Incremented per granted trial, so a call only ever settles the trial it was given
+        self.trial_id = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self.trial_in_flight = False
+        if self.state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            self.trial_id += 1
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            print(f"🟢 Circuit '{self.name}' closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"🔴 Circuit '{self.name}' opened after {self.consecutive_failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class Dependency:
+    """Outbound-call policy and metrics for one upstream"""
+    def __init__(self, name: str, deadline: float, retries: int, hedge: bool):
+        self.name = name
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+        # Per request kind: a stream open or a small section call must not set the hedge delay of a full call
+        self.latencies: Dict[str, deque] = {}
+        self.metrics = {
+            "calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+            "retries": 0, "hedges": 0, "hedge_wins": 0, "short_circuits": 0
+        }
+
+    def record_latency(self, kind: str, seconds: float):
+        self.latencies.setdefault(kind, deque(maxlen=200)).append(seconds)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Observed p95 latency of this request kind, once there are enough samples to trust it"""
+        latencies = self.latencies.get(kind)
+        if not self.hedge or not latencies or len(latencies) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(list(latencies), 95)
+
+class ResilienceService:
+    """Deadlines, jittered retries, hedged requests and circuit breakers for outbound calls"""
+
+    def __init__(self):
+        self.dependencies: Dict[str, Dependency] = {
+            "azure_vision": Dependency("azure_vision", settings.AZURE_VISION_DEADLINE_SECONDS, settings.AZURE_VISION_RETRIES,
+                                       hedge=settings.AZURE_VISION_HEDGING_ENABLED),
+            "llm_games": Dependency("llm_games", settings.LLM_GAMES_TIMEOUT, settings.LLM_RETRIES, hedge=settings.LLM_HEDGING_ENABLED),
+            "llm_domains": Dependency("llm_domains", settings.LLM_DOMAINS_TIMEOUT, settings.LLM_RETRIES, hedge=settings.LLM_HEDGING_ENABLED),
+        }
+
+    async def _hedged_attempt(self, dependency: Dependency, kind: str, fn: Callable[[], Awaitable], hedge: bool):
+        """Run fn; if it is still pending after the p95 latency, race a duplicate and keep the first success"""
+        primary = asyncio.ensure_future(fn())
+        pending = {primary}
+        try:
+            delay = dependency.hedge_delay(kind) if hedge else None
+            if delay is not None:
+                _, pending = await asyncio.wait(pending, timeout=delay)
+                if not pending:
+                    return primary.result()
+                dependency.metrics["hedges"] += 1
+                pending.add(asyncio.ensure_future(fn()))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            dependency.metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Losers and, on deadline cancellation, every attempt
+            for task in pending:
+                task.cancel()
+
+    async def call(self, name: str, fn: Callable[[], Awaitable], hedge: bool = True, kind: Optional[str] = None):
+        """Call a dependency within its deadline; raises CircuitOpenError, TimeoutError or the last error.
+        
+        kind names the request shape (defaults to the dependency name); latencies and hedge delays are kept
+        per kind, since calls of different sizes or stream opens have very different timings.
+        """
+        dependency = self.dependencies[name]
+        kind = kind or name
+        dependency.metrics["calls"] += 1
+        breaker = dependency.breaker
+        if not breaker.allow():
+            dependency.metrics["short_circuits"] += 1
+            raise CircuitOpenError(f"Circuit '{name}' is open")
+        trial_id = breaker.trial_id if breaker.state == "half_open" else None
+
+        deadline = time.monotonic() + dependency.deadline
+        last_error: Exception = TimeoutError(f"{name} deadline exceeded")
+        settled = False
+        try:
+            for attempt in range(dependency.retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if attempt:
+                    dependency.metrics["retries"] += 1
+
+                start = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(self._hedged_attempt(dependency, kind, fn, hedge), timeout=remaining)
+                    dependency.record_latency(kind, time.monotonic() - start)
+                    dependency.metrics["successes"] += 1
+                    dependency.breaker.record_success()
+                    settled = True
+                    return result
+                except asyncio.TimeoutError:
+                    dependency.metrics["timeouts"] += 1
+                    last_error = TimeoutError(f"{name} deadline of {dependency.deadline}s exceeded")
+                    break
+                except Exception as e:
+                    last_error = e
+
+                # Full jitter: sleep a random slice of the exponential backoff, within the deadline
+                backoff = random.uniform(0, settings.RETRY_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                await asyncio.sleep(min(backoff, max(0.0, deadline - time.monotonic())))
+
+            dependency.metrics["failures"] += 1
+            dependency.breaker.record_failure()
+            settled = True
+            raise last_error
+        finally:
+            # Cancelled (hedge loser, client disconnect): the half-open trial this call owns must not
+            # stay in flight forever; one granted to another call is left to that call
+            if not settled and trial_id is not None and breaker.trial_in_flight and breaker.trial_id == trial_id:
+                breaker.record_failure()
+
+    def get_metrics(self) -> Dict:
+        """Breaker state, hedge counts and latency percentiles per dependency"""
+        metrics = {}
+        for name, dependency in self.dependencies.items():
+            metrics[name] = {
+                "breaker_state": dependency.breaker.state,
+                "deadline_seconds": dependency.deadline,
+                **dependency.metrics,
+                "latency_by_kind": {
+                    kind: {
+                        "p50_ms": round(percentile(list(latencies), 50) * 1000),
+                        "p95_ms": round(percentile(list(latencies), 95) * 1000)
+                    }
+                    for kind, latencies in dependency.latencies.items() if latencies
+                }
+            }
+        return metrics
+
+# Create global instance
+resilience_service = ResilienceService()
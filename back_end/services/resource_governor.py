@@ -0,0 +1,180 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Set
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+ENGINES = ("ocr", "diffusion", "image")
+PINNING_SUPPORTED = hasattr(os, "sched_setaffinity")
+
+def parse_cpu_list(cpu_list: str) -> Optional[Set[int]]:
+    """Parse a CPU list like "0-3,6" into a set of core ids"""
+    if not cpu_list or not cpu_list.strip():
+        return None
+
+    cpus = set()
+    for part in cpu_list.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus or None
+
+class ResourceGovernor:
+    """Gives each compute engine its own worker thread pinned to its CPU set.
+
+    Linux affinity set with pid 0 applies to the calling thread only, and the threads it spawns
+    inherit it, so pinning the engine's dedicated worker keeps a diffusion job from spreading over
+    the cores reserved for OCR. Engines without a configured CPU list get disjoint core ranges
+    sized by their thread budgets. The torch intra-op and OpenCV thread counts are process-wide, so
+    they are set once: torch to the largest budget among the torch engines (OCR, diffusion),
+    OpenCV to the image budget. Separation between engines comes from affinity, not from the counts,
+    and report() shows the values that actually apply.
+    """
+
+    def __init__(self):
+        self.enabled = settings.RESOURCE_GOVERNOR_ENABLED
+        self.cpu_count = os.cpu_count() or 1
+        self.budgets = self._build_budgets()
+        self.executors: Dict[str, ThreadPoolExecutor] = {}
+        self.global_settings = {}
+        if self.enabled:
+            self._apply_global_settings()
+
+    def _build_budgets(self) -> Dict[str, Dict]:
+        """Resolve per-engine thread counts and affinity sets from settings"""
+        budgets = {
+            "ocr": {"threads": settings.OCR_THREADS, "affinity": parse_cpu_list(settings.OCR_CPU_AFFINITY)},
+            "diffusion": {"threads": settings.DIFFUSION_THREADS, "affinity": parse_cpu_list(settings.DIFFUSION_CPU_AFFINITY)},
+            "image": {"threads": settings.IMAGE_ENCODE_THREADS, "affinity": parse_cpu_list(settings.IMAGE_ENCODE_CPU_AFFINITY)},
+        }
+
+        # Engines with 0 threads share whatever cores the others did not claim
+        claimed = sum(budget["threads"] for budget in budgets.values() if budget["threads"] > 0)
+        leftover = max(1, self.cpu_count - claimed)
+        for budget in budgets.values():
+            if budget["threads"] <= 0:
+                budget["threads"] = leftover
+            if budget["affinity"]:
+                budget["affinity"] = budget["affinity"] & set(range(self.cpu_count)) or None
+
+        if settings.RESOURCE_GOVERNOR_AUTO_AFFINITY:
+            self._assign_default_affinity(budgets)
+        return budgets
+
+    def _assign_default_affinity(self, budgets: Dict[str, Dict]):
+        """Give unpinned engines consecutive free cores, fixed budgets first and diffusion's leftover last"""
+        claimed = set().union(*(budget["affinity"] for budget in budgets.values() if budget["affinity"]))
+        # Cores this process may run on (a container or taskset can restrict them)
+        allowed = os.sched_getaffinity(0) if PINNING_SUPPORTED else range(self.cpu_count)
+        free = [cpu for cpu in sorted(allowed) if cpu not in claimed]
+        unpinned = [engine for engine in ("ocr", "image", "diffusion") if not budgets[engine]["affinity"]]
+        if not unpinned or sum(budgets[engine]["threads"] for engine in unpinned) > len(free):
+            # Not enough cores for disjoint ranges; those engines stay unpinned
+            return
+
+        for engine in unpinned:
+            threads = budgets[engine]["threads"]
+            budgets[engine]["affinity"] = set(free[:threads])
+            free = free[threads:]
+
+    def _apply_global_settings(self):
+        """Apply the process-wide knobs that cannot be set per thread"""
+        try:
+            import torch
+            # Shared by every thread; the last call wins, so never set it per engine worker
+            intra_op_threads = max(self.budgets["ocr"]["threads"], self.budgets["diffusion"]["threads"])
+            torch.set_num_threads(intra_op_threads)
+            self.global_settings["torch_intra_op_threads"] = intra_op_threads
+            torch.set_num_interop_threads(settings.TORCH_INTEROP_THREADS)
+            self.global_settings["torch_interop_threads"] = settings.TORCH_INTEROP_THREADS
+        except ImportError:
+            pass
+        except RuntimeError as e:
+            # Inter-op pool can only be sized before the first parallel op runs
+            print(f"⚠️ Could not set torch inter-op threads: {e}")
+
+        try:
+            import cv2
+            cv2.setNumThreads(self.budgets["image"]["threads"])
+            self.global_settings["opencv_threads"] = self.budgets["image"]["threads"]
+        except ImportError:
+            pass
+
+    def _pin_worker(self, engine: str):
+        """Executor initializer: pin the engine's worker thread to its CPU set"""
+        budget = self.budgets[engine]
+        if budget["affinity"] and PINNING_SUPPORTED:
+            try:
+                os.sched_setaffinity(0, budget["affinity"])
+            except OSError as e:
+                print(f"⚠️ Could not set CPU affinity for {engine}: {e}")
+
+    def get_executor(self, engine: str) -> ThreadPoolExecutor:
+        """Get (or lazily create) the dedicated executor for an engine"""
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+
+        if engine not in self.executors:
+            self.executors[engine] = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix=f"{engine}-engine",
+                initializer=self._pin_worker,
+                initargs=(engine,)
+            )
+        return self.executors[engine]
+
+    async def run(self, engine: str, fn: Callable, *args, **kwargs):
+        """Run a blocking engine call off the event loop within the engine's budget"""
+        loop = asyncio.get_running_loop()
+        if not self.enabled:
+            return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
+        return await loop.run_in_executor(self.get_executor(engine), partial(fn, *args, **kwargs))
+
+    def effective_threads(self, engine: str) -> int:
+        """Intra-op threads the engine actually runs with: the shared torch or OpenCV count once set"""
+        key = "opencv_threads" if engine == "image" else "torch_intra_op_threads"
+        return self.global_settings.get(key, self.budgets[engine]["threads"])
+
+    def report(self) -> Dict:
+        """Describe the thread counts and CPU sets in effect (the configured budget alongside)"""
+        return {
+            "enabled": self.enabled,
+            "cpu_count": self.cpu_count,
+            "engines": {
+                engine: {
+                    "budget_threads": budget["threads"],
+                    "threads": self.effective_threads(engine) if self.enabled else None,
+                    "affinity": sorted(budget["affinity"]) if self.enabled and budget["affinity"] and PINNING_SUPPORTED else None
+                }
+                for engine, budget in self.budgets.items()
+            },
+            "global": self.global_settings
+        }
+
+    def print_report(self):
+        """Print the thread budgets at startup"""
+        if not self.enabled:
+            print("⚙️ Resource governor disabled - engines share the default thread pools")
+            return
+        print(f"⚙️ Resource governor: {self.cpu_count} CPUs")
+        for engine, budget in self.report()["engines"].items():
+            print(f"   {engine}: {budget['threads']} threads (budget {budget['budget_threads']}), affinity: {budget['affinity'] or 'any'}")
+        if "torch_intra_op_threads" in self.global_settings:
+            print(f"   torch intra-op threads (process-wide): {self.global_settings['torch_intra_op_threads']}")
+
+    def shutdown(self):
+        """Stop engine workers"""
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+        self.executors.clear()
+
+# Create global instance
+resource_governor = ResourceGovernor()
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from config.firebase_config import db
+from config.settings import settings
+from utils.helpers import normalize_cache_argument
+
+print = partial(print, flush=True)
+
+class Flight:
+    """Outcome of joining a single-flight key: either a shared result or the duty to produce one"""
+    def __init__(self, key: str):
+        self.key = key
+        self.result: Any = None
+        self.shared = False
+
+    def set_result(self, result: Any):
+        self.result = result
+
+class SingleFlight:
+    """Coalesces duplicate generation work, in-process with futures and across workers with a Firestore lease"""
+
+    def __init__(self):
+        self.db = db
+        self.owner_id = uuid.uuid4().hex
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.lease_seconds = settings.GENERATION_LEASE_SECONDS
+        self.poll_seconds = settings.GENERATION_LEASE_POLL_SECONDS
+        self.stats = {"leaders": 0, "local_followers": 0, "remote_followers": 0, "lease_takeovers": 0}
+
+    @staticmethod
+    def make_key(topic: str, age_group: str, domain: Optional[str] = None, tags: Optional[list] = None) -> str:
+        """Key over normalized (topic, age_group, domain, tags)"""
+        payload = [normalize_cache_argument(value) for value in (topic, age_group, domain, tags)]
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:32]
+
+    def _lease_ref(self, key: str):
+        return self.db.collection("generation_leases").document(key)
+
+    def _try_create_lease(self, key: str) -> bool:
+        """Create the lease document; False if another live worker holds it"""
+        lease_ref = self._lease_ref(key)
+        lease = {
+            "owner": self.owner_id,
+            "expires_at": time.time() + self.lease_seconds,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            lease_ref.create(lease)
+            return True
+        except AlreadyExists:
+            existing = lease_ref.get()
+            if not existing.exists or existing.to_dict().get("expires_at", 0) > time.time():
+                # Live, or released just now (the next attempt creates it)
+                return False
+
+            # Stale lease from a crashed worker: take it over, unless another worker changed it since the read
+            try:
+                lease_ref.update(lease, option=self.db.write_option(last_update_time=existing.update_time))
+            except (FailedPrecondition, NotFound):
+                return False
+            self.stats["lease_takeovers"] += 1
+            return True
+
+    def _renew_lease(self, key: str) -> bool:
+        """Push our lease's expiry forward; False once it is no longer ours"""
+        lease_ref = self._lease_ref(key)
+        lease = lease_ref.get()
+        if not lease.exists or lease.to_dict().get("owner") != self.owner_id:
+            return False
+        try:
+            lease_ref.update({"expires_at": time.time() + self.lease_seconds},
+                             option=self.db.write_option(last_update_time=lease.update_time))
+            return True
+        except (FailedPrecondition, NotFound):
+            return False
+
+    async def _heartbeat(self, key: str):
+        """Keep the lease alive while the leader runs, however long generation takes"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self._renew_lease, key):
+                    print(f"⚠️ Lost generation lease ({key[:8]})")
+                    return
+            except Exception as e:
+                print(f"⚠️ Could not renew generation lease: {e}")
+
+    def _release_lease(self, key: str):
+        lease_ref = self._lease_ref(key)
+        lease = lease_ref.get()
+        if lease.exists and lease.to_dict().get("owner") == self.owner_id:
+            try:
+                lease_ref.delete(option=self.db.write_option(last_update_time=lease.update_time))
+            except (FailedPrecondition, NotFound):
+                pass
+
+    async def _wait_for_remote(self, key: str, poll_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Poll for another worker's result until it appears or its lease lapses and we take it over.
+
+        The holder renews its lease while it works, so a live lease means the result is still coming.
+        """
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            result = await poll_fn()
+            if result is not None:
+                return result
+            if await asyncio.to_thread(self._try_create_lease, key):
+                return None
+
+    @asynccontextmanager
+    async def lead(self, key: str, poll_fn: Callable[[], Awaitable[Any]]):
+        """Join the flight for a key.
+
+        If flight.result is set on entry, another request already produced it (flight.shared is True).
+        Otherwise this caller is the leader and must call flight.set_result() before leaving the block.
+        """
+        flight = Flight(key)
+
+        # Wait for a local leader; if it fails, try to lead ourselves
+        while key in self.in_flight:
+            try:
+                result = await asyncio.shield(self.in_flight[key])
+            except Exception:
+                continue
+            flight.result = result
+            flight.shared = True
+            self.stats["local_followers"] += 1
+            print(f"🔗 Joined in-flight generation ({key[:8]})")
+            yield flight
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        holds_lease = False
+        heartbeat = None
+        try:
+            if self.db:
+                holds_lease = await asyncio.to_thread(self._try_create_lease, key)
+                if not holds_lease:
+                    print(f"⏳ Another worker is generating ({key[:8]}), waiting for its result...")
+                    flight.result = await self._wait_for_remote(key, poll_fn)
+                    if flight.result is not None:
+                        flight.shared = True
+                        self.stats["remote_followers"] += 1
+                    else:
+                        # _wait_for_remote only returns empty-handed once it has acquired the lease
+                        holds_lease = True
+                if holds_lease:
+                    heartbeat = asyncio.create_task(self._heartbeat(key))
+
+            if not flight.shared:
+                self.stats["leaders"] += 1
+            yield flight
+
+            if flight.result is None:
+                raise RuntimeError("Single-flight leader finished without a result")
+            future.set_result(flight.result)
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("Generation cancelled"))
+                future.exception()  # mark retrieved; followers re-raise it themselves
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+            if heartbeat:
+                heartbeat.cancel()
+            if holds_lease:
+                try:
+                    await asyncio.to_thread(self._release_lease, key)
+                except Exception as e:
+                    print(f"⚠️ Could not release generation lease: {e}")
+
+    def status(self) -> Dict:
+        return {"in_flight": len(self.in_flight), **self.stats}
+
+# Create global instance
+single_flight = SingleFlight()
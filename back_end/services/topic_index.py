@@ -0,0 +1,244 @@
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple
+from config.firebase_config import db
+from config.settings import settings
+
+print = partial(print, flush=True)
+
+# Common child-drawing subjects that should share one cache entry
+DEFAULT_SYNONYMS = {
+    "puppy": "dog", "doggy": "dog", "hound": "dog",
+    "kitten": "cat", "kitty": "cat",
+    "automobile": "car", "vehicle": "car",
+    "bunny": "rabbit",
+    "aeroplane": "airplane", "plane": "airplane", "aircraft": "airplane",
+    "sea": "ocean",
+    "kid": "child", "children": "child",
+    "sun flower": "sunflower",
+    "bike": "bicycle",
+    "flower plant": "flower",
+}
+
+# Plural forms the suffix rules get wrong
+IRREGULAR_PLURALS = {
+    "mice": "mouse", "geese": "goose", "feet": "foot", "teeth": "tooth", "men": "man",
+    "women": "woman", "people": "person", "leaves": "leaf", "wolves": "wolf", "knives": "knife",
+    "fish": "fish", "sheep": "sheep", "deer": "deer", "bus": "bus", "glass": "glass", "grass": "grass",
+}
+
+def lemmatize_word(word: str) -> str:
+    """Rule-based singularization of an English noun"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+class TopicIndex:
+    """Maps labels to existing prediction_cache keys: lemmatize + synonyms, then character trigram TF-IDF nearest neighbour.
+
+    An inverted index from trigram to keys limits scoring to keys that share trigrams with the query,
+    so lookups stay bounded as the cache grows.
+    """
+
+    def __init__(self):
+        self.db = db
+        self.threshold = settings.TOPIC_SIMILARITY_THRESHOLD
+        self.max_candidates = settings.TOPIC_INDEX_MAX_CANDIDATES
+        self.synonyms = dict(DEFAULT_SYNONYMS)
+        if settings.TOPIC_SYNONYMS_PATH:
+            try:
+                with open(settings.TOPIC_SYNONYMS_PATH) as f:
+                    self.synonyms.update({k.lower(): v.lower() for k, v in json.load(f).items()})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not load topic synonyms: {e}")
+
+        self._lock = threading.Lock()
+        self.keys: Dict[str, str] = {}  # normalized label -> cache key
+        self.cache_keys: Set[str] = set()
+        self.vectors: Dict[str, Counter] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        # Adds and removes made while a reload is scanning, replayed onto the new index
+        self._changes: Optional[List[Tuple[str, str]]] = None
+        self.loaded = False
+        self.stats = {"lookups": 0, "exact_hits": 0, "normalized_hits": 0, "semantic_hits": 0,
+                      "misses": 0, "total_lookup_seconds": 0.0, "max_lookup_seconds": 0.0}
+
+    def normalize(self, label: str) -> str:
+        """Lowercase, strip punctuation, singularize each word and map synonyms"""
+        text = re.sub(r"[^a-z0-9]+", " ", label.lower()).strip()
+        text = self.synonyms.get(text, text)
+        words = [lemmatize_word(word) for word in text.split()]
+        words = [self.synonyms.get(word, word) for word in words]
+        return " ".join(words)
+
+    def _insert(self, cache_key: str, keys: Dict[str, str], cache_keys: Set[str],
+                vectors: Dict[str, Counter], postings: Dict[str, Set[str]]):
+        normalized = self.normalize(cache_key.replace("_", " "))
+        cache_keys.add(cache_key)
+        if normalized in keys:
+            return
+        keys[normalized] = cache_key
+        vector = char_ngrams(normalized)
+        vectors[normalized] = vector
+        for gram in vector:
+            postings.setdefault(gram, set()).add(normalized)
+
+    def _delete(self, cache_key: str):
+        self.cache_keys.discard(cache_key)
+        for normalized in [n for n, key in self.keys.items() if key == cache_key]:
+            del self.keys[normalized]
+            for gram in self.vectors.pop(normalized, ()):
+                members = self.postings.get(gram)
+                if members:
+                    members.discard(normalized)
+                    if not members:
+                        del self.postings[gram]
+
+    def add(self, cache_key: str):
+        with self._lock:
+            self._insert(cache_key, self.keys, self.cache_keys, self.vectors, self.postings)
+            if self._changes is not None:
+                self._changes.append(("add", cache_key))
+
+    def remove(self, cache_key: str):
+        with self._lock:
+            self._delete(cache_key)
+            if self._changes is not None:
+                self._changes.append(("remove", cache_key))
+
+    def remove_prefix(self, prefix: str):
+        """Drop every indexed key starting with prefix"""
+        with self._lock:
+            for cache_key in [key for key in self.cache_keys if key.startswith(prefix)]:
+                self._delete(cache_key)
+                if self._changes is not None:
+                    self._changes.append(("remove", cache_key))
+
+    def clear(self):
+        with self._lock:
+            self.keys.clear()
+            self.cache_keys.clear()
+            self.vectors.clear()
+            self.postings.clear()
+
+    def _idf(self, gram: str) -> float:
+        return math.log((1 + len(self.keys)) / (1 + len(self.postings.get(gram, ())))) + 1
+
+    def _weighted(self, vector: Counter) -> Dict[str, float]:
+        weights = {gram: count * self._idf(gram) for gram, count in vector.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {gram: w / norm for gram, w in weights.items()}
+
+    def _nearest(self, normalized: str) -> Tuple[Optional[str], float]:
+        query = char_ngrams(normalized)
+        with self._lock:
+            # Candidates: keys sharing the most trigrams with the query
+            overlap = Counter()
+            for gram in query:
+                overlap.update(self.postings.get(gram, ()))
+            candidates = [key for key, _ in overlap.most_common(self.max_candidates)]
+
+            query_weights = self._weighted(query)
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                candidate_weights = self._weighted(self.vectors[candidate])
+                score = sum(w * candidate_weights.get(gram, 0.0) for gram, w in query_weights.items())
+                if score > best_score:
+                    best, best_score = candidate, score
+            return (self.keys[best] if best else None), best_score
+
+    def resolve(self, label: str, literal_key: str) -> Tuple[str, str]:
+        """Pick the cache key for a label: (key, how) with how in exact / normalized / semantic / new"""
+        if not self.loaded:
+            # Until existing keys are indexed, normalized keys could split entries that already exist
+            return literal_key, "new"
+
+        start = time.perf_counter()
+        self.stats["lookups"] += 1
+        normalized = self.normalize(label)
+
+        if literal_key in self.cache_keys:
+            key, how = literal_key, "exact"
+        elif normalized in self.keys:
+            key, how = self.keys[normalized], "normalized"
+        else:
+            candidate, score = self._nearest(normalized)
+            if candidate and score >= self.threshold:
+                key, how = candidate, "semantic"
+                print(f"🧭 '{label}' matched cached topic '{candidate}' (similarity {score:.2f})")
+            else:
+                key, how = re.sub(r"[^a-z0-9]+", "_", normalized).strip("_") or literal_key, "new"
+
+        elapsed = time.perf_counter() - start
+        self.stats[{"exact": "exact_hits", "normalized": "normalized_hits",
+                    "semantic": "semantic_hits", "new": "misses"}[how]] += 1
+        self.stats["total_lookup_seconds"] += elapsed
+        self.stats["max_lookup_seconds"] = max(self.stats["max_lookup_seconds"], elapsed)
+        return key, how
+
+    def _load(self) -> int:
+        """Build a fresh index off to the side and swap it in, so lookups never see a partial one"""
+        with self._lock:
+            self._changes = []
+        try:
+            keys, cache_keys, vectors, postings = {}, set(), {}, {}
+            for doc in self.db.collection("prediction_cache").select([]).stream():
+                self._insert(doc.id, keys, cache_keys, vectors, postings)
+
+            with self._lock:
+                self.keys, self.cache_keys, self.vectors, self.postings = keys, cache_keys, vectors, postings
+                for change, cache_key in self._changes:
+                    if change == "add":
+                        self._insert(cache_key, self.keys, self.cache_keys, self.vectors, self.postings)
+                    else:
+                        self._delete(cache_key)
+            return len(cache_keys)
+        finally:
+            with self._lock:
+                self._changes = None
+
+    async def load(self):
+        """Index the ids of every existing prediction_cache document (also used to reload after clears)"""
+        if not self.db:
+            return
+        try:
+            count = await asyncio.to_thread(self._load)
+            self.loaded = True
+            print(f"🧭 Topic index loaded with {count} cached topics")
+        except Exception as e:
+            print(f"⚠️ Could not load topic index: {e}")
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["lookups"]
+        gained = self.stats["normalized_hits"] + self.stats["semantic_hits"]
+        return {
+            "indexed_topics": len(self.keys),
+            "loaded": self.loaded,
+            "similarity_threshold": self.threshold,
+            **{name: value for name, value in self.stats.items() if name != "total_lookup_seconds"},
+            # Hits a literal key lookup would have missed
+            "hit_rate_gain": round(gained / lookups, 3) if lookups else None,
+            "avg_lookup_ms": round(1000 * self.stats["total_lookup_seconds"] / lookups, 3) if lookups else None,
+            "max_lookup_seconds": round(self.stats["max_lookup_seconds"], 4)
+        }
+
+# Create global instance
+topic_index = TopicIndex()
@@ -1,6 +1,22 @@
 import json
 import re
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+
+def normalize_cache_argument(value):
+    """Normalize an argument so case, whitespace and list-order variants compare equal"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(normalize_cache_argument(item) for item in value)
+    return value
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty sample list"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
 
 def extract_json_from_response(response_text: str) -> Optional[Dict]:
     """Extract JSON from LLaMA response"""
@@ -21,6 +37,71 @@ def extract_json_from_response(response_text: str) -> Optional[Dict]:
         print(f"❌ JSON parsing failed: {e}")
         return None
 
+class IncrementalJSONObjectParser:
+    """Parse a streamed JSON object and emit each top-level member as soon as its value closes.
+
+    Only object and array values are emitted. Any text before the opening brace
+    (e.g. a code fence) is skipped.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.expect_key = False
+        self.current_key = None
+        self.value_start = None
+        self.done = False
+    
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of text and return the (key, value) pairs completed by it"""
+        self.buffer += chunk
+        completed = []
+        
+        while self.pos < len(self.buffer) and not self.done:
+            char = self.buffer[self.pos]
+            
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                    self.expect_key = True
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.expect_key:
+                        self.current_key = json.loads(self.buffer[self.string_start:self.pos + 1])
+                        self.expect_key = False
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif char in "{[":
+                if self.depth == 1:
+                    self.value_start = self.pos
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    try:
+                        value = json.loads(self.buffer[self.value_start:self.pos + 1])
+                        completed.append((self.current_key, value))
+                    except json.JSONDecodeError as e:
+                        print(f"❌ Could not parse streamed '{self.current_key}': {e}")
+                    self.value_start = None
+                elif self.depth == 0:
+                    self.done = True
+            elif char == "," and self.depth == 1:
+                self.expect_key = True
+            
+            self.pos += 1
+        
+        return completed
+
 def get_primary_label_from_tags(tags: List[Dict], description: str) -> str:
     """Extract the most relevant primary label from image analysis"""
     if not tags:
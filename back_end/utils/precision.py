@@ -0,0 +1,73 @@
+import contextlib
+from functools import partial
+from typing import Dict
+import torch
+
+print = partial(print, flush=True)
+
+PRECISION_MODES = ("auto", "fp32", "fp16", "bf16", "int8")
+
+_capabilities = None
+
+def detect_cpu_capabilities() -> Dict:
+    """Detect CPU features relevant to reduced-precision inference (cached)"""
+    global _capabilities
+    if _capabilities is not None:
+        return _capabilities
+
+    flags = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    break
+    except OSError:
+        pass
+
+    quantized_engines = list(torch.backends.quantized.supported_engines)
+    _capabilities = {
+        "avx512f": "avx512f" in flags,
+        "avx512_bf16": "avx512_bf16" in flags,
+        "avx512_vnni": "avx512_vnni" in flags,
+        "amx_bf16": "amx_bf16" in flags,
+        "amx_int8": "amx_int8" in flags,
+        "native_bf16": "avx512_bf16" in flags or "amx_bf16" in flags,
+        "mkldnn": torch.backends.mkldnn.is_available(),
+        "int8_dynamic_quantization": any(engine in quantized_engines for engine in ("x86", "fbgemm", "onednn", "qnnpack")),
+    }
+    return _capabilities
+
+def resolve_precision(requested: str, device: str) -> str:
+    """Turn a configured precision into the mode that will actually run on this device"""
+    requested = (requested or "auto").lower()
+    if requested not in PRECISION_MODES:
+        print(f"⚠️ Unknown precision '{requested}', using fp32")
+        return "fp32"
+
+    if device == "cuda":
+        # GPU keeps the existing half-precision path unless fp32 is requested explicitly (e.g. as a reference)
+        return "fp16" if requested in ("auto", "fp16", "bf16") else "fp32"
+
+    capabilities = detect_cpu_capabilities()
+    if requested == "auto":
+        return "bf16" if capabilities["native_bf16"] else "fp32"
+    if requested == "fp16":
+        print("⚠️ fp16 is not supported on CPU, using fp32")
+        return "fp32"
+    if requested == "bf16" and not capabilities["native_bf16"]:
+        print("⚠️ CPU has no AVX512-BF16/AMX, bf16 will be emulated and likely slower than fp32")
+    if requested == "int8" and not capabilities["int8_dynamic_quantization"]:
+        print("⚠️ No quantized engine available, using fp32")
+        return "fp32"
+    return requested
+
+def autocast_context(precision: str, device: str):
+    """Autocast context for bf16 mixed precision on CPU, a no-op otherwise"""
+    if precision == "bf16" and device == "cpu":
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def quantize_linear_int8(module: torch.nn.Module) -> torch.nn.Module:
+    """Dynamic int8 quantization of nn.Linear layers (weights int8, activations quantized on the fly)"""
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)